@@ -0,0 +1,233 @@
+import math, re, threading, time
+from collections import OrderedDict
+
+# ================= Admission Control =================
+# Requests are admitted in two places:
+#   - token buckets per budget ("generate", "auth", "read") and per key
+#     (client IP, username), checked before the view runs -> 429
+#   - a per-process limit on concurrent upstream model calls with a
+#     bounded wait queue -> 503 when the queue is full or the wait too long
+# Each budget has its own buckets, so a user hammering generation cannot
+# use up the allowance of /signin or the history routes.
+
+class Rejected(Exception):
+
+    def __init__(self, message, status, retry_after, limiter):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        self.limiter = limiter
+
+
+RATE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([smh]?)\s*$")
+UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+def parse_rate(text):
+    """"10/m", "100/30s", "5/1" -> (count, period seconds); empty or "0" -> None."""
+    if not text or text.strip() in ("0", "off"):
+        return None
+    match = RATE.match(text.lower())
+    if not match:
+        raise ValueError(f"Invalid rate {text!r}, expected e.g. 10/m or 100/30s")
+    count, amount, unit = match.groups()
+    return int(count), int(amount or 1) * UNITS[unit]
+
+
+class KeyedTokenBuckets:
+    """One token bucket per key; `count` requests per `period`, bursts up to `burst`."""
+
+    def __init__(self, count, period, burst=None, max_keys=10000):
+        self.rate = count / period
+        self.burst = burst or count
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()       # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def take(self, key, cost=1):
+        """Returns 0 if admitted, else seconds until `cost` tokens are available."""
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                self.allowed += 1
+                return 0
+            self.rejected += 1
+            return (cost - bucket[0]) / self.rate
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._buckets), "allowed": self.allowed, "rejected": self.rejected}
+
+
+class Slot:
+
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            if self._limiter is not None:
+                self._limiter._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ConcurrencyLimiter:
+    """At most `limit` holders; up to `max_waiting` callers wait at most `timeout` seconds."""
+
+    def __init__(self, limit, max_waiting=0, timeout=10.0, name="llm"):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.name = name
+        self._cond = threading.Condition()
+        self.in_use = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+
+    def acquire(self, bounded=True):
+        """Return a Slot. bounded=False waits as long as needed (background jobs)."""
+
+        start = time.monotonic()
+        with self._cond:
+            if self.in_use >= self.limit:
+                if bounded and self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise Rejected(f"Too many AI requests in progress ({self.limit} running, "
+                                   f"{self.waiting} waiting)", 503, self.timeout or 1, self.name)
+                self.waiting += 1
+                try:
+                    deadline = start + self.timeout if bounded else None
+                    while self.in_use >= self.limit:
+                        remaining = deadline - time.monotonic() if deadline else None
+                        if remaining is not None and remaining <= 0:
+                            self.rejected += 1
+                            raise Rejected("Timed out waiting for an AI slot", 503,
+                                           self.timeout or 1, self.name)
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_use += 1
+            self.admitted += 1
+            self.wait_total += time.monotonic() - start
+        return Slot(self)
+
+    def _release(self):
+        with self._cond:
+            self.in_use -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "wait_time_total": round(self.wait_total, 3),
+            }
+
+
+class AsyncConcurrencyLimiter:
+    """ConcurrencyLimiter for one event loop (the async serving mode)."""
+
+    def __init__(self, limit, max_waiting=0, timeout=10.0, name="llm"):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.name = name
+        self._cond = None
+        self.in_use = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+
+    async def acquire(self, bounded=True):
+        # asyncio is imported where it is used: the sync app never loads it
+        import asyncio
+        if self._cond is None:
+            # created on first use so it belongs to the serving loop
+            self._cond = asyncio.Condition()
+
+        start = time.monotonic()
+        async with self._cond:
+            if self.in_use >= self.limit:
+                if bounded and self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise Rejected(f"Too many AI requests in progress ({self.limit} running, "
+                                   f"{self.waiting} waiting)", 503, self.timeout or 1, self.name)
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        self._cond.wait_for(lambda: self.in_use < self.limit),
+                        self.timeout if bounded else None
+                    )
+                except asyncio.TimeoutError:
+                    self.rejected += 1
+                    raise Rejected("Timed out waiting for an AI slot", 503,
+                                   self.timeout or 1, self.name)
+                finally:
+                    self.waiting -= 1
+            self.in_use += 1
+            self.admitted += 1
+            self.wait_total += time.monotonic() - start
+        return AsyncSlot(self)
+
+    async def _release(self):
+        async with self._cond:
+            self.in_use -= 1
+            self._cond.notify()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_time_total": round(self.wait_total, 3),
+        }
+
+
+class AsyncSlot:
+
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._released = False
+
+    async def release(self):
+        if not self._released:
+            self._released = True
+            if self._limiter is not None:
+                await self._limiter._release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.release()
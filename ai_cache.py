@@ -0,0 +1,278 @@
+import hashlib, json, re, sqlite3, threading, time, traceback, uuid
+from collections import OrderedDict
+
+# ================= AI Response Cache =================
+# Two tiers: an in-process LRU with TTL, and an optional shared store
+# (SQLite file or MySQL table) so every gunicorn worker sees the same entries.
+
+KEY_FIELDS = ['topic','domain','age','time_available','context']
+# the prompt is addressed to the user, so answers stay theirs unless shared on purpose
+PERSONAL_FIELDS = ['username','name']
+
+def _normalize(value):
+    return re.sub(r"\s+", " ", str(value)).strip().lower()
+
+def make_key(params, recent_history_summary=None, personal=True):
+    """Hash the normalized prompt inputs; history is only part of the key if given.
+
+    personal=False leaves out the user and name, so users share answers."""
+
+    fields = KEY_FIELDS + (PERSONAL_FIELDS if personal else [])
+    parts = {field: _normalize(params.get(field,'')) for field in fields}
+    if recent_history_summary is not None:
+        parts['history'] = hashlib.sha256(_normalize(recent_history_summary).encode("utf-8")).hexdigest()
+
+    raw = json.dumps(parts, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+
+    def __init__(self, maxsize=256, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()      # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, expires_at or time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCacheStore:
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.evictions = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_cache ("
+                "cache_key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM ai_cache WHERE cache_key=? AND expires_at>?",
+                (key, time.time())
+            ).fetchone()
+        return row
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (cache_key, response, expires_at) VALUES (?,?,?)",
+                (key, value, expires_at)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                cur = self._conn.execute("DELETE FROM ai_cache WHERE expires_at<=?", (time.time(),))
+                self.evictions += cur.rowcount
+            self._conn.commit()
+
+    def replace(self, key, expected, value, expires_at):
+        """Compare-and-set: write only if the row is still `expected` (a get() result)."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE ai_cache SET response=?, expires_at=? WHERE cache_key=? AND response=? AND expires_at=?",
+                (value, expires_at, key, expected[0], expected[1])
+            )
+            self._conn.commit()
+        return cur.rowcount == 1
+
+
+class MySQLCacheStore:
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, get_connection):
+        self.get_connection = get_connection
+        self._writes = 0
+        self.evictions = 0
+
+    def _run(self, sql, args, fetch=False):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, args)
+            if fetch:
+                return cursor.fetchone()
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get(self, key):
+        return self._run(
+            "SELECT response, expires_at FROM ai_cache WHERE cache_key=%s AND expires_at>%s",
+            (key, time.time()), fetch=True
+        )
+
+    def set(self, key, value, expires_at):
+        self._run(
+            """
+            INSERT INTO ai_cache (cache_key,response,expires_at) VALUES (%s,%s,%s)
+            ON DUPLICATE KEY UPDATE response=VALUES(response), expires_at=VALUES(expires_at)
+            """,
+            (key, value, expires_at)
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.evictions += self._run("DELETE FROM ai_cache WHERE expires_at<=%s", (time.time(),))
+
+    def replace(self, key, expected, value, expires_at):
+        """Compare-and-set: write only if the row is still `expected` (a get() result)."""
+        # expires_at is rewritten on every set, so it doubles as a version
+        return self._run(
+            """
+            UPDATE ai_cache SET response=%s, expires_at=%s
+            WHERE cache_key=%s AND response=%s AND expires_at=%s
+            """,
+            (value, expires_at, key, expected[0], expected[1])
+        ) == 1
+
+
+class ResponseCache:
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._epochs = {}               # owner -> (epoch, expires_at)
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    # Entries of one owner (a user) can't be listed, the keys are hashes.
+    # clear_owner() gives the owner a new epoch instead; owned_key() mixes
+    # it into their keys, so everything stored before is never read again
+    # and simply expires. Epochs sit in the shared tier when there is one,
+    # so a clear in one worker reaches every worker.
+
+    @staticmethod
+    def _epoch_key(owner):
+        return hashlib.sha256(f"epoch|{owner}".encode("utf-8")).hexdigest()
+
+    def _epoch(self, owner):
+        if self.shared is not None:
+            try:
+                row = self.shared.get(self._epoch_key(owner))
+            except Exception:
+                traceback.print_exc()
+                self._count('errors')
+                row = None
+            if row:
+                return row[0]
+        with self._lock:
+            epoch, expires_at = self._epochs.get(owner, (None, 0))
+        return epoch if expires_at > time.time() else None
+
+    def owned_key(self, key, owner):
+        epoch = self._epoch(owner)
+        if not epoch:
+            return key
+        return hashlib.sha256(f"{key}|{epoch}".encode("utf-8")).hexdigest()
+
+    def clear_owner(self, owner):
+        """Make every entry stored under owned_key(..., owner) unreachable."""
+
+        epoch = uuid.uuid4().hex
+        # outlives every entry written under the old epoch
+        expires_at = time.time() + self.local.ttl
+        with self._lock:
+            self._epochs = {k: v for k, v in self._epochs.items() if v[1] > time.time()}
+            self._epochs[owner] = (epoch, expires_at)
+
+        if self.shared is not None:
+            self.shared.set(self._epoch_key(owner), epoch, expires_at)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        if self.shared is not None:
+            try:
+                row = self.shared.get(key)
+            except Exception:
+                traceback.print_exc()
+                self._count('errors')
+                row = None
+            if row:
+                value, expires_at = row
+                self.local.set(key, value, expires_at)
+                self._count('hits')
+                self._count('shared_hits')
+                return value
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        expires_at = time.time() + self.local.ttl
+        self.local.set(key, value, expires_at)
+
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, expires_at)
+            except Exception:
+                traceback.print_exc()
+                self._count('errors')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.local.evictions,
+            "expirations": self.local.expirations,
+            "shared_evictions": getattr(self.shared, 'evictions', 0),
+            "errors": self.errors,
+            "size": len(self.local),
+            "maxsize": self.local.maxsize,
+            "ttl": self.local.ttl,
+            "shared": type(self.shared).__name__ if self.shared is not None else None,
+        }
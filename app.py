@@ -1,42 +1,271 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import os, traceback, time, re
+import os, traceback, time, json, zlib
+from datetime import datetime
 from dotenv import load_dotenv
-from openai import OpenAI
-import mysql.connector
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from db_pool import ConnectionPool, PoolTimeout, connect_from_env
+import ai_cache
+from model_router import ModelRouter, ModelUnavailable
+import jobs
+import pagination
+import prompts
+import history_storage
+from task_parser import parse_tasks, extract_titles
+import metrics
+from metrics import phase
+import http_encoding
+import llm_telemetry
+import write_behind
+import coalesce
+import admission
+import recent_titles
+import search
+import retention
+import warmup
 
 # ================= Load ENV =================
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
+# Routes live on a blueprint; create_app() (bottom of the file) builds the
+# Flask app around it.
+api = Blueprint('api', __name__)
+
+# plain: full prompt/response text per ai_history row
+# compact: template id + parameters and a compressed response (run migrations first)
+COMPACT_HISTORY = os.getenv("AI_HISTORY_STORAGE", "plain").lower() == "compact"
 
 # ================= MySQL Connection =================
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    connect_from_env,
+                    size=int(os.getenv("MYSQL_POOL_SIZE", 5)),
+                    timeout=float(os.getenv("MYSQL_POOL_TIMEOUT", 5)),
+                    ping_interval=float(os.getenv("MYSQL_POOL_PING_INTERVAL", 30))
+                )
+    return _pool
+
 def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("MYSQL_HOST"),
-        user=os.getenv("MYSQL_USER"),
-        password=os.getenv("MYSQL_PASSWORD"),
-        database=os.getenv("MYSQL_DATABASE"),
-        port=int(os.getenv("MYSQL_PORT", 3306))
-    )
+    # conn.close() returns the connection to the pool
+    with phase("db_connect"):
+        return get_pool().acquire()
+
+# ================= AI Response Cache =================
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Shared response cache, or None when AI_CACHE_SIZE=0."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                size = int(os.getenv("AI_CACHE_SIZE", 256))
+                if size <= 0:
+                    return None
+
+                shared = None
+                backend = os.getenv("AI_CACHE_SHARED", "").lower()
+                if backend == "sqlite":
+                    shared = ai_cache.SQLiteCacheStore(os.getenv("AI_CACHE_SQLITE_PATH", "ai_cache.sqlite3"))
+                elif backend == "mysql":
+                    shared = ai_cache.MySQLCacheStore(get_db_connection)
+
+                _cache = ai_cache.ResponseCache(
+                    ai_cache.LRUCache(size, ttl=int(os.getenv("AI_CACHE_TTL", 3600))),
+                    shared
+                )
+    return _cache
+
+def cache_key_for(params):
+    # The "previously learned" block is left out: every saved generation
+    # changes it, so a key including it would never repeat. A user asking
+    # again for the same topic gets their earlier answer.
+    # AI_CACHE_SCOPE=shared also reuses it for other users with the same
+    # topic/age/domain, dropping the name personalisation.
+    # Personal keys carry the user's cache epoch, which clearing all of
+    # their history renews.
+    if os.getenv("AI_CACHE_SCOPE", "user").lower() == "shared":
+        return ai_cache.make_key(params, personal=False)
+    key = ai_cache.make_key(params)
+    cache = get_cache()
+    return cache.owned_key(key, params['username']) if cache else key
 
 # ================= OpenRouter Client =================
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY")
-)
-
-# ================= Utilities =================
-def extract_titles(response_text):
-    titles = []
-    titles += re.findall(r"### Task \d+ – (.+)", response_text)
-    titles += re.findall(r"\*\*Task\s*\d+\s*–\s*(.+?)\*\*", response_text)
-    return [t.strip() for t in titles if t.strip()]
+# Built on first use: importing openai and creating its HTTP client are
+# most of a cold start. `app.client` still resolves (module __getattr__).
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(
+                    base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+                    api_key=os.getenv("OPENROUTER_API_KEY")
+                )
+    return _client
+
+def __getattr__(name):
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ================= Admission Control =================
+# Token buckets per budget, keyed by client IP and username:
+#   RATE_LIMIT_<BUDGET>_IP / RATE_LIMIT_<BUDGET>_USER = "<count>/<period>", e.g. 10/m, 0 = off
+# Routes outside BUDGETS (/api/health, stats, /metrics) are never limited.
+
+BUDGETS = {
+    'process_data':'generate',
+    'process_data_batch':'generate',
+    'signin':'auth',
+    'signup':'auth',
+    'get_history':'read',
+    'get_ai_history':'read',
+    'search_ai_history':'read',
+    'delete_history':'write',
+    'get_job':'read',
+    'export_ai_history':'export',
+}
+
+RATE_DEFAULTS = {
+    ('generate','ip'):'60/m', ('generate','user'):'10/m',
+    ('auth','ip'):'30/m', ('auth','user'):'10/m',
+    ('read','ip'):'600/m', ('read','user'):'300/m',
+    ('write','ip'):'60/m', ('write','user'):'20/m',
+    ('export','ip'):'20/m', ('export','user'):'5/m',
+}
+
+_limits = None
+_limits_lock = threading.Lock()
+
+def get_limits():
+    """(budget, kind) -> KeyedTokenBuckets, only for the limits that are on."""
+    global _limits
+    if _limits is None:
+        with _limits_lock:
+            if _limits is None:
+                limits = {}
+                for (budget, kind), default in RATE_DEFAULTS.items():
+                    rate = admission.parse_rate(
+                        os.getenv(f"RATE_LIMIT_{budget.upper()}_{kind.upper()}", default)
+                    )
+                    if rate:
+                        limits[(budget, kind)] = admission.KeyedTokenBuckets(*rate)
+                _limits = limits
+    return _limits
+
+_llm_limiter = None
+_llm_limiter_lock = threading.Lock()
+
+def get_llm_limiter():
+    """Per-process cap on concurrent generations that call the model, or None (LLM_CONCURRENCY=0)."""
+    global _llm_limiter
+    if _llm_limiter is None:
+        with _llm_limiter_lock:
+            if _llm_limiter is None:
+                limit = int(os.getenv("LLM_CONCURRENCY", 16))
+                if limit <= 0:
+                    return None
+                _llm_limiter = admission.ConcurrencyLimiter(
+                    limit,
+                    max_waiting=int(os.getenv("LLM_QUEUE", 32)),
+                    timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", 15))
+                )
+    return _llm_limiter
+
+def acquire_llm_slot(bounded=True):
+    limiter = get_llm_limiter()
+    if limiter is None:
+        return admission.Slot(None)
+    with phase("llm_wait"):
+        return limiter.acquire(bounded)
+
+def client_ip():
+    if os.getenv("TRUST_PROXY_HEADERS", "0") == "1":
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.remote_addr or "unknown"
+
+def request_username():
+    if request.view_args and request.view_args.get("username"):
+        return request.view_args["username"]
+    data = request.get_json(silent=True) if request.is_json else None
+    if isinstance(data, dict) and isinstance(data.get("username"), str):
+        return data["username"].strip() or None
+    return None
+
+def view_name():
+    # "api.process_data" -> "process_data"
+    return (request.endpoint or '').rpartition('.')[2]
+
+def request_cost():
+    """Tokens a request takes from its buckets: one per generated topic for batches."""
+    if view_name() == 'process_data_batch':
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else None
+        if isinstance(items, list) and items:
+            return len(items)
+    return 1
+
+def rejection_response(e):
+    metrics.registry.inc("admission_rejected_total", {"limiter":e.limiter},
+                         help="Requests turned away by rate or concurrency limits")
+    response = jsonify({'error':str(e)})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response,e.status
+
+def check_rate_limits(budget, ip, username, cost=1):
+    """Take `cost` tokens from the budget's IP and user buckets; the Rejected to send, or None."""
+
+    limits = get_limits()
+    for kind, key in (('ip', ip), ('user', username)):
+        buckets = limits.get((budget, kind))
+        if buckets is None or key is None:
+            continue
+        wait = buckets.take(key, cost)
+        if wait:
+            return admission.Rejected(
+                f"Rate limit exceeded for {budget} requests, retry later",
+                429, wait, f"{budget}_{kind}"
+            )
+    return None
+
+@api.before_app_request
+def admit_request():
+    # CORS preflights are not the request itself; a 429 here would make
+    # the browser drop the real call
+    if request.method == 'OPTIONS':
+        return None
+    budget = BUDGETS.get(view_name())
+    if budget is None:
+        return None
+
+    rejected = check_rate_limits(budget, client_ip(), request_username(), request_cost())
+    if rejected:
+        return rejection_response(rejected)
+    return None
+
+@api.app_errorhandler(admission.Rejected)
+def handle_rejected(e):
+    return rejection_response(e)
 
 # ================= Auth Routes =================
 
-@app.route("/signup", methods=["POST"])
+@api.route("/signup", methods=["POST"])
 def signup():
     conn = None
     cursor = None
@@ -53,19 +282,25 @@ def signup():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("SELECT id FROM users WHERE username=%s", (username,))
-        if cursor.fetchone():
+        with phase("db_query"):
+            cursor.execute("SELECT id FROM users WHERE username=%s", (username,))
+            existing = cursor.fetchone()
+        if existing:
             return jsonify({"message": "User already exists!"}), 400
 
-        cursor.execute(
-            "INSERT INTO users (username, name, password) VALUES (%s,%s,%s)",
-            (username, name, password)
-        )
+        with phase("db_write"):
+            cursor.execute(
+                "INSERT INTO users (username, name, password) VALUES (%s,%s,%s)",
+                (username, name, password)
+            )
 
-        conn.commit()
+            conn.commit()
 
         return jsonify({"message": "Signup successful!"}), 201
 
+    except PoolTimeout as e:
+        return jsonify({"error": str(e)}), 503
+
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
@@ -77,7 +312,7 @@ def signup():
             conn.close()
 
 
-@app.route("/signin", methods=["POST"])
+@api.route("/signin", methods=["POST"])
 def signin():
 
     conn = None
@@ -94,12 +329,13 @@ def signin():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute(
-            "SELECT name,password FROM users WHERE username=%s",
-            (username,)
-        )
+        with phase("db_query"):
+            cursor.execute(
+                "SELECT name,password FROM users WHERE username=%s",
+                (username,)
+            )
 
-        user = cursor.fetchone()
+            user = cursor.fetchone()
 
         if user and user["password"] == password:
             return jsonify({
@@ -109,6 +345,9 @@ def signin():
 
         return jsonify({"message": "Invalid credentials!"}), 401
 
+    except PoolTimeout as e:
+        return jsonify({"error": str(e)}), 503
+
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
@@ -121,226 +360,1374 @@ def signin():
 
 # ================= Smart Free Time Utilizer =================
 
-@app.route('/api/process-data', methods=['POST'])
-def process_data():
+MODELS = [
+    m.strip() for m in os.getenv(
+        "AI_MODELS",
+        "mistralai/mistral-7b-instruct:free,nvidia/nemotron-3-nano-30b-a3b:free"
+    ).split(",") if m.strip()
+]
+
+SYSTEM_PROMPT = "You are a helpful AI tutor who provides structured learning tasks."
+
+EXTRA_HEADERS = {
+    "HTTP-Referer": "https://flask-smartfreetimeutilizer.onrender.com/",
+    "X-Title": "SmartFreeTimeUtilizer"
+}
+
+def build_user_prompt(name, age, domain, time_available, topic, context, recent_history_summary):
+
+    # ===== STRICT AI FORMAT PROMPT =====
+    return prompts.render(prompts.CURRENT_VERSION, {
+        "name": name,
+        "age": age,
+        "domain": domain,
+        "time_available": time_available,
+        "topic": topic,
+        "context": context,
+        "recent_history_summary": recent_history_summary
+    })
 
-    conn = None
-    cursor = None
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+def get_telemetry():
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = llm_telemetry.writer_from_env(get_db_connection) or False
+    return _telemetry or None
 
+def record_llm_call(model, kind, reason, prompt, started_at, **details):
+    """Queue one telemetry record; never raises into the request."""
     try:
+        telemetry = get_telemetry()
+        if telemetry:
+            telemetry.record(llm_telemetry.make_record(model, kind, reason, prompt, started_at, **details))
+    except Exception:
+        traceback.print_exc()
 
-        data = request.json or {}
+def get_ai_response(user_prompt, model, timeout=None, reason="primary"):
 
-        if not data:
-            return jsonify({'error': 'No JSON data provided'}), 400
+    start = time.monotonic()
+    try:
+        completion = get_client().chat.completions.create(
 
-        for field in ['username','name','age','topic']:
-            if not str(data.get(field,'')).strip():
-                return jsonify({'error': f'Missing field: {field}'}), 400
+            extra_headers=EXTRA_HEADERS,
 
-        username = data['username']
-        name = data['name']
-        age = data['age']
-        topic = data['topic']
-        domain = data.get('domain','general learner')
-        time_available = data.get('time_available','Not specified')
-        context = data.get('context','Not provided')
+            model=model,
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+            messages=[
+                {"role":"system","content":SYSTEM_PROMPT},
+                {"role":"user","content":user_prompt}
+            ],
+
+            timeout=timeout
+
+        )
+        content = completion.choices[0].message.content.strip()
+    except Exception as e:
+        record_llm_call(model, "sync", reason, user_prompt, start, error=e)
+        raise
+
+    record_llm_call(model, "sync", reason, user_prompt, start,
+                    usage=getattr(completion, "usage", None),
+                    outcome="ok" if content else "empty")
+    return content
+
+def stream_ai_response(user_prompt, model):
+
+    return get_client().chat.completions.create(
+        extra_headers=EXTRA_HEADERS,
+        model=model,
+        messages=[
+            {"role":"system","content":SYSTEM_PROMPT},
+            {"role":"user","content":user_prompt}
+        ],
+        stream=True,
+        # final chunk carries token usage for telemetry
+        stream_options={"include_usage": True}
+    )
 
-        # ===== Fetch previous titles =====
-        cursor.execute(
-            "SELECT title FROM history WHERE username=%s ORDER BY timestamp DESC LIMIT 3",
-            (username,)
+_router = None
+_router_lock = threading.Lock()
+
+def router_workers():
+    """Threads for model calls: one per attempt a generation can have running.
+
+    Every sync generation holds an LLM_CONCURRENCY slot and runs at most one
+    attempt per model, so that product never queues. AI_ROUTER_WORKERS overrides."""
+    configured = int(os.getenv("AI_ROUTER_WORKERS", 0))
+    if configured > 0:
+        return configured
+    limit = int(os.getenv("LLM_CONCURRENCY", 16))
+    return limit * max(1, len(MODELS)) if limit > 0 else 64
+
+def get_router():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter(
+                    # looked up per call so tests can patch get_ai_response
+                    lambda prompt, model, timeout, reason: get_ai_response(prompt, model, timeout, reason),
+                    MODELS,
+                    deadline=float(os.getenv("AI_DEADLINE", 60)),
+                    hedge_percentile=float(os.getenv("AI_HEDGE_PERCENTILE", 95)),
+                    hedge_min_delay=float(os.getenv("AI_HEDGE_MIN_DELAY", 2)),
+                    hedge_default_delay=float(os.getenv("AI_HEDGE_DEFAULT_DELAY", 10)),
+                    breaker_threshold=int(os.getenv("AI_BREAKER_THRESHOLD", 3)),
+                    breaker_cooldown=float(os.getenv("AI_BREAKER_COOLDOWN", 60)),
+                    max_workers=router_workers()
+                )
+    return _router
+
+def parse_generation_request(data):
+    """Validate a /api/process-data body. Returns (params, error)."""
+
+    if not data:
+        return None, 'No JSON data provided'
+
+    for field in ['username','name','age','topic']:
+        if not str(data.get(field,'')).strip():
+            return None, f'Missing field: {field}'
+
+    return {
+        'username': data['username'],
+        'name': data['name'],
+        'age': data['age'],
+        'topic': data['topic'],
+        'domain': data.get('domain','general learner'),
+        'time_available': data.get('time_available','Not specified'),
+        'context': data.get('context','Not provided')
+    }, None
+
+# ================= Recent Titles =================
+# Off unless RECENT_TITLES_SHARED is set: sqlite|mysql share it between
+# workers through the ai_cache store; local keeps a copy per worker, which
+# is only right with a single worker (a delete served by one worker does
+# not clear the others). RECENT_TITLES_CACHE_USERS=0 also turns it off.
+
+RECENT_TITLES = 3
+RECENT_TITLES_SQL = "SELECT title FROM history WHERE username=%s ORDER BY timestamp DESC, id DESC LIMIT %s"
+
+_titles_cache = None
+_titles_cache_lock = threading.Lock()
+
+def get_titles_cache():
+    global _titles_cache
+    if _titles_cache is None:
+        with _titles_cache_lock:
+            if _titles_cache is None:
+                users = int(os.getenv("RECENT_TITLES_CACHE_USERS", 10000))
+                backend = os.getenv("RECENT_TITLES_SHARED", "").lower()
+                if users <= 0 or backend not in ("local", "sqlite", "mysql"):
+                    return None
+
+                shared = None
+                if backend == "sqlite":
+                    shared = ai_cache.SQLiteCacheStore(os.getenv("AI_CACHE_SQLITE_PATH", "ai_cache.sqlite3"))
+                elif backend == "mysql":
+                    shared = ai_cache.MySQLCacheStore(get_db_connection)
+
+                _titles_cache = recent_titles.RecentTitlesCache(
+                    RECENT_TITLES, users, int(os.getenv("RECENT_TITLES_TTL", 300)), shared
+                )
+    return _titles_cache
+
+def fetch_recent_titles(cursor, username):
+
+    cursor.execute(RECENT_TITLES_SQL, (username, RECENT_TITLES))
+
+    return [r['title'] for r in cursor.fetchall()]
+
+def get_recent_titles(username):
+    """Newest-first recent titles, from the cache when possible."""
+
+    cache = get_titles_cache()
+    if cache:
+        titles = cache.get(username)
+        if titles is not None:
+            return titles
+        version = cache.version()
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        with phase("history_select"):
+            titles = fetch_recent_titles(cursor, username)
+    finally:
+        # Not held across the model call
+        cursor.close()
+        conn.close()
+
+    if cache:
+        cache.fill(username, titles, version)
+    return titles
+
+def summarize_titles(titles):
+
+    return (
+        "\n".join(f"- {title}" for title in titles)
+        if titles else "No prior history."
+    )
+
+def save_ai_statements(items):
+    """The inserts for generation items as (sql, args, many) tuples.
+
+    A generator so sync and async drivers share the SQL: send() each
+    single-row insert's lastrowid back in; executemany statements need nothing.
+    """
+
+    task_rows = []
+    title_rows = []
+
+    for item in items:
+        username = item['username']
+
+        # ===== Save FULL AI conversation =====
+        # one statement per row: its id links the ai_tasks rows
+        if COMPACT_HISTORY:
+            row = history_storage.encode(item['user_prompt'], item['ai_response'])
+            ai_history_id = yield (
+                """
+                INSERT INTO ai_history
+                    (username,user_prompt,prompt_template,prompt_params,ai_response,response_z)
+                VALUES (%s,%s,%s,%s,%s,%s)
+                """,
+                (username,row['user_prompt'],row['prompt_template'],row['prompt_params'],
+                 row['ai_response'],row['response_z']),
+                False
+            )
+        else:
+            ai_history_id = yield (
+                """
+                INSERT INTO ai_history (username,user_prompt,ai_response)
+                VALUES (%s,%s,%s)
+                """,
+                (username,item['user_prompt'],item['ai_response']),
+                False
+            )
+
+        for i, t in enumerate(item['tasks']):
+            task_rows.append((ai_history_id,username,i,t['title'],t['description'],json.dumps(t['tips'])))
+            title_rows.append((username,t['title'],item['timestamp']))
+
+    # ===== Save parsed tasks =====
+    if task_rows:
+        yield (
+            """
+            INSERT INTO ai_tasks (ai_history_id,username,position,title,description,tips)
+            VALUES (%s,%s,%s,%s,%s,%s)
+            """,
+            task_rows,
+            True
+        )
+
+    # ===== Save titles only =====
+    if title_rows:
+        yield (
+            "INSERT INTO history (username,title,timestamp) VALUES (%s,%s,%s)",
+            title_rows,
+            True
         )
 
-        rows = cursor.fetchall()
+def save_ai_results(cursor, items):
+    """Insert generations given as {username,user_prompt,ai_response,tasks,timestamp}; no commit."""
+
+    statements = save_ai_statements(items)
+    lastrowid = None
+    try:
+        while True:
+            sql, args, many = statements.send(lastrowid)
+            if many:
+                cursor.executemany(sql, args)
+                lastrowid = None
+            else:
+                cursor.execute(sql, args)
+                lastrowid = cursor.lastrowid
+    except StopIteration:
+        pass
+
+def generation_item(username, user_prompt, ai_response):
+    return {
+        "username":username,
+        "user_prompt":user_prompt,
+        "ai_response":ai_response,
+        "tasks":parse_tasks(ai_response),
+        "timestamp":int(time.time())
+    }
+
+# ================= Write-Behind =================
+# AI_WRITE_MODE=inline  - write and commit in the request (default)
+#               commit  - queue for the background writer, respond after its group commit
+#               enqueue - queue for the background writer, respond immediately
+
+WRITE_MODE = os.getenv("AI_WRITE_MODE", "inline").lower()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                # looked up per batch so tests can patch get_db_connection
+                _writer = write_behind.writer_from_env(
+                    lambda: get_db_connection(),
+                    lambda cursor, items: save_ai_results(cursor, items)
+                )
+    return _writer
+
+def wants_stream():
+    return (
+        request.args.get('stream') in ('1','true')
+        or 'text/event-stream' in request.headers.get('Accept','')
+    )
+
+def sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def prepare_generation(params):
+    """Read recent history and build the prompt. Returns (user_prompt, cache_key, cached_response)."""
+
+    # ===== Fetch previous titles =====
+    recent_history_summary = summarize_titles(get_recent_titles(params['username']))
 
-        recent_history_summary = (
-            "\n".join(f"- {r['title']}" for r in rows)
-            if rows else "No prior history."
+    with phase("prompt_build"):
+        user_prompt = build_user_prompt(
+            params['name'], params['age'], params['domain'],
+            params['time_available'], params['topic'], params['context'],
+            recent_history_summary
         )
 
-        # ===== STRICT AI FORMAT PROMPT =====
-        user_prompt = f"""
-I'm {name}, a {age}-year-old {domain}.
+    # ===== Cache lookup =====
+    with phase("cache_lookup"):
+        cache = get_cache()
+        cache_key = cache_key_for(params)
+        cached_response = cache.get(cache_key) if cache else None
 
-I have {time_available} available to learn about {topic}.
+    return user_prompt, cache_key, cached_response
 
-Context: {context}
+def persist_items(username, items):
+    """Save generation items for one user (one transaction when written inline)."""
 
-Previously learned:
-{recent_history_summary}
+    if WRITE_MODE in ("commit", "enqueue"):
+        with phase("db_write"):
+            get_writer().submit_many(items, wait=WRITE_MODE == "commit")
+    else:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
 
-Generate EXACTLY 3 learning micro-tasks.
+        try:
+            with phase("db_write"):
+                save_ai_results(cursor, items)
+            with phase("db_commit"):
+                conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
 
-STRICT FORMAT:
+    cache = get_titles_cache()
+    titles = [task['title'] for item in items for task in item['tasks']]
+    if cache and titles:
+        cache.add(username, titles)
 
-### Task 1 – <Title>
+def persist_generation(username, user_prompt, ai_response):
 
-**Detailed Description**
-Write 4–6 sentences explaining the task clearly.
+    item = generation_item(username, user_prompt, ai_response)
+    persist_items(username, [item])
+    return item['tasks']
 
-**Small Tips**
-- Tip 1
-- Tip 2
-- Tip 3
+def run_generation(params, bounded=True):
+    """The whole /api/process-data pipeline; returns the JSON response body.
 
----
+    bounded=False waits for a model slot however long it takes (background jobs)."""
 
-### Task 2 – <Title>
+    user_prompt, cache_key, cached_response = prepare_generation(params)
 
-**Detailed Description**
-Write 4–6 sentences explaining the task clearly.
+    # ===== AI Call =====
+    if cached_response is not None:
+        ai_response = cached_response
+    else:
+        with acquire_llm_slot(bounded), phase("llm"):
+            ai_response, _ = get_router().generate(user_prompt)
 
-**Small Tips**
-- Tip 1
-- Tip 2
-- Tip 3
+        cache = get_cache()
+        if cache:
+            cache.set(cache_key, ai_response)
 
----
+    tasks = persist_generation(params['username'], user_prompt, ai_response)
 
-### Task 3 – <Title>
+    return {
+        "success":True,
+        "response":ai_response,
+        "tasks":tasks,
+        "cached":cached_response is not None
+    }
 
-**Detailed Description**
-Write 4–6 sentences explaining the task clearly.
+# ================= Coalescing & Idempotency =================
+# REQUEST_COALESCING=0 turns off sharing of identical in-flight requests.
+# IDEMPOTENCY_TTL=0 turns off Idempotency-Key replay.
 
-**Small Tips**
-- Tip 1
-- Tip 2
-- Tip 3
+COALESCING = os.getenv("REQUEST_COALESCING", "1") != "0"
 
-Rules:
-- Use headings exactly like above
-- Use bullet points
-- Do not add extra sections
-"""
+_flights = coalesce.SingleFlight()
 
-        def get_ai_response(model):
+_idempotency = None
+_idempotency_lock = threading.Lock()
 
-            return client.chat.completions.create(
+def get_idempotency():
+    global _idempotency
+    if _idempotency is None:
+        with _idempotency_lock:
+            if _idempotency is None:
+                ttl = int(os.getenv("IDEMPOTENCY_TTL", 300))
+                if ttl <= 0:
+                    return None
 
-                extra_headers={
-                    "HTTP-Referer": "https://flask-smartfreetimeutilizer.onrender.com/",
-                    "X-Title": "SmartFreeTimeUtilizer"
-                },
+                shared = None
+                backend = os.getenv("IDEMPOTENCY_SHARED", "").lower()
+                if backend == "sqlite":
+                    shared = ai_cache.SQLiteCacheStore(os.getenv("AI_CACHE_SQLITE_PATH", "ai_cache.sqlite3"))
+                elif backend == "mysql":
+                    shared = ai_cache.MySQLCacheStore(get_db_connection)
 
-                model=model,
+                _idempotency = coalesce.IdempotencyStore(
+                    ttl, int(os.getenv("IDEMPOTENCY_SIZE", 1024)), shared
+                )
+    return _idempotency
 
-                messages=[
-                    {"role":"system","content":"You are a helpful AI tutor who provides structured learning tasks."},
-                    {"role":"user","content":user_prompt}
-                ]
+def coalesced_generation(params, idempotency_key=None):
+    """run_generation() shared with identical in-flight requests, replayed for repeated keys."""
 
-            ).choices[0].message.content.strip()
+    fingerprint = coalesce.request_key(params)
+    store = get_idempotency() if idempotency_key else None
 
-        # ===== AI Call =====
-        try:
-            ai_response = get_ai_response("mistralai/mistral-7b-instruct:free")
-        except Exception as e:
-            print("Fallback model used:", e)
-            ai_response = get_ai_response("nvidia/nemotron-3-nano-30b-a3b:free")
+    if store:
+        result = store.get(params['username'], idempotency_key, fingerprint)
+        if result is not None:
+            response = jsonify(result)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
 
-        # ===== Save FULL AI conversation =====
-        cursor.execute(
-            """
-            INSERT INTO ai_history (username,user_prompt,ai_response)
-            VALUES (%s,%s,%s)
-            """,
-            (username,user_prompt,ai_response)
-        )
+    if COALESCING:
+        result, shared = _flights.do(fingerprint, lambda: run_generation(params))
+    else:
+        result, shared = run_generation(params), False
 
-        # ===== Save titles only =====
-        titles = extract_titles(ai_response)
+    if store:
+        store.set(params['username'], idempotency_key, fingerprint, result)
 
-        for title in titles:
-            cursor.execute(
-                "INSERT INTO history (username,title,timestamp) VALUES (%s,%s,%s)",
-                (username,title,int(time.time()))
-            )
+    response = jsonify(result)
+    if shared:
+        response.headers['X-Coalesced'] = 'true'
+    return response
+
+@api.route('/api/process-data', methods=['POST'])
+def process_data():
+
+    try:
+
+        params, error = parse_generation_request(request.json or {})
+
+        if error:
+            return jsonify({'error': error}), 400
+
+        if request.args.get('async') in ('1','true'):
+            return submit_generation_job(params)
+
+        if wants_stream():
+            user_prompt, cache_key, cached_response = prepare_generation(params)
+            slot = acquire_llm_slot() if cached_response is None else None
+            return stream_process_data(params['username'], user_prompt, cache_key, cached_response, slot)
+
+        return coalesced_generation(params, request.headers.get('Idempotency-Key'))
 
-        conn.commit()
+    except coalesce.KeyConflict as e:
+        return jsonify({'error':str(e)}),422
 
+    except admission.Rejected as e:
+        return rejection_response(e)
+
+    except (PoolTimeout, ModelUnavailable) as e:
+        return jsonify({'error':str(e)}),503
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error':str(e)}),500
+
+def stream_process_data(username, user_prompt, cache_key=None, cached_response=None, slot=None):
+
+    def generate():
+
+        upstream = None
+        parts = []
+
+        try:
+            if cached_response is not None:
+                parts.append(cached_response)
+                yield sse("delta", {"content": cached_response})
+
+            # ===== AI Call (fallback only if nothing was emitted yet) =====
+            # Streams are not hedged, but they honour and feed the breakers.
+            router = get_router()
+            queue = router.candidates() if cached_response is None else iter(())
+            model = next(queue, None)
+            reason = "primary"
+            while model is not None:
+                start = time.monotonic()
+                first_token = None
+                usage = None
+                try:
+                    upstream = stream_ai_response(user_prompt, model)
+                    for chunk in upstream:
+                        usage = getattr(chunk, "usage", None) or usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if first_token is None:
+                                first_token = time.monotonic()
+                            parts.append(delta)
+                            yield sse("delta", {"content": delta})
+                    router.record(model, time.monotonic() - start, True)
+                    record_llm_call(model, "stream", reason, user_prompt, start,
+                                    first_token_at=first_token, usage=usage)
+                    break
+                except GeneratorExit:
+                    record_llm_call(model, "stream", reason, user_prompt, start,
+                                    first_token_at=first_token, usage=usage, outcome="cancelled")
+                    raise
+                except Exception as e:
+                    router.record(model, time.monotonic() - start, False, f"{type(e).__name__}: {e}")
+                    record_llm_call(model, "stream", reason, user_prompt, start,
+                                    first_token_at=first_token, usage=usage, error=e)
+                    # the next model is taken only now, so a half-open
+                    # breaker's trial is spent only on a model that is called
+                    upcoming = None if parts else next(queue, None)
+                    if upcoming is None:
+                        raise
+                    print("Fallback model used:", e)
+                    if upstream is not None:
+                        upstream.close()
+                        upstream = None
+                model = upcoming
+                reason = "fallback"
+
+            ai_response = "".join(parts).strip()
+
+            cache = get_cache()
+            if cache and cached_response is None:
+                cache.set(cache_key, ai_response)
+
+            tasks = persist_generation(username, user_prompt, ai_response)
+
+            yield sse("done", {
+                "success": True,
+                "response": ai_response,
+                "tasks": tasks,
+                "cached": cached_response is not None
+            })
+
+        except GeneratorExit:
+            # Client went away: stop paying for tokens, keep no partial rows
+            print("Client disconnected mid-stream for", username)
+
+        except Exception as e:
+            traceback.print_exc()
+            yield sse("error", {"error": str(e)})
+
+        finally:
+            if upstream is not None:
+                upstream.close()
+            if slot is not None:
+                slot.release()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    if slot is not None:
+        # also covers a client that leaves before the body starts
+        response.call_on_close(slot.release)
+    return response
+
+# ================= Batch Generation =================
+# One user, several topics: the recent-titles read happens once, model
+# calls run concurrently on a bounded pool (so the batch takes about as
+# long as its slowest item) and every result is saved in one transaction.
+# No DB connection is held while the models run.
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 10))
+BATCH_SHARED_FIELDS = ['username','name','age','domain','time_available','context']
+
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+def get_batch_pool():
+    global _batch_pool
+    if _batch_pool is None:
+        with _batch_pool_lock:
+            if _batch_pool is None:
+                _batch_pool = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("BATCH_WORKERS", 8)),
+                    thread_name_prefix="batch"
+                )
+    return _batch_pool
+
+def parse_batch_request(data):
+    """Returns ([(params, error, topic)] per item, error)."""
+
+    if not data:
+        return None, 'No JSON data provided'
+    if not isinstance(data, dict):
+        return None, 'Request body must be a JSON object'
+
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return None, 'items must be a non-empty list'
+    if len(items) > BATCH_MAX_ITEMS:
+        return None, f'At most {BATCH_MAX_ITEMS} items per batch'
+
+    shared = {k: data[k] for k in BATCH_SHARED_FIELDS if k in data}
+    parsed = []
+    for item in items:
+        if isinstance(item, str):
+            item = {'topic': item}
+        if not isinstance(item, dict):
+            parsed.append((None, 'Each item must be an object or a topic string', None))
+            continue
+        # items may override the shared fields, except the user the batch belongs to
+        overrides = {k: v for k, v in item.items() if k != 'username'}
+        params, error = parse_generation_request(dict(shared, **overrides))
+        parsed.append((params, error, item.get('topic')))
+    return parsed, None
+
+def batch_result(index, topic, ai_response, cached):
+    return {
+        "index":index,
+        "topic":topic,
+        "success":True,
+        "response":ai_response,
+        "tasks":parse_tasks(ai_response),
+        "cached":cached
+    }
+
+def batch_error(index, topic, e, status=None):
+    if status is None:
+        if isinstance(e, admission.Rejected):
+            status = e.status
+        elif isinstance(e, (ModelUnavailable, PoolTimeout)):
+            status = 503
+        else:
+            traceback.print_exc()
+            status = 500
+    return {"index":index,"topic":topic,"success":False,"error":str(e),"status":status}
+
+def batch_generate(user_prompt):
+    with acquire_llm_slot():
+        ai_response, _ = get_router().generate(user_prompt)
+    return ai_response
+
+def run_batch(username, parsed):
+    """Yield each item's result as it finishes, then save all successful ones.
+
+    The last value is the list of results in request order, once saved."""
+
+    results = [None] * len(parsed)
+    prompts_by_index = {}
+    pending = {}
+
+    summary = summarize_titles(get_recent_titles(username))
+    cache = get_cache()
+
+    for index, (params, error, topic) in enumerate(parsed):
+        if error:
+            results[index] = batch_error(index, topic, error, 400)
+            yield results[index]
+            continue
+
+        user_prompt = build_user_prompt(
+            params['name'], params['age'], params['domain'],
+            params['time_available'], params['topic'], params['context'], summary
+        )
+        prompts_by_index[index] = user_prompt
+        cache_key = cache_key_for(params)
+        cached_response = cache.get(cache_key) if cache else None
+
+        if cached_response is not None:
+            results[index] = batch_result(index, topic, cached_response, True)
+            yield results[index]
+        else:
+            pending[get_batch_pool().submit(batch_generate, user_prompt)] = (index, topic, cache_key)
+
+    with phase("llm"):
+        for future in as_completed(pending):
+            index, topic, cache_key = pending[future]
+            try:
+                ai_response = future.result()
+            except Exception as e:
+                results[index] = batch_error(index, topic, e)
+            else:
+                if cache:
+                    cache.set(cache_key, ai_response)
+                results[index] = batch_result(index, topic, ai_response, False)
+            yield results[index]
+
+    # ===== Save everything in one transaction =====
+    items = [
+        generation_item(username, prompts_by_index[r['index']], r['response'])
+        for r in results if r['success']
+    ]
+    if items:
+        persist_items(username, items)
+
+    yield results
+
+@api.route('/api/process-data/batch', methods=['POST'])
+def process_data_batch():
+
+    parsed, error = parse_batch_request(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'error':error}),400
+
+    username = next((params['username'] for params, _, _ in parsed if params), None)
+    if username is None:
         return jsonify({
-            "success":True,
-            "response":ai_response
-        })
+            'error':'No valid items',
+            'results':[batch_error(i, topic, err, 400) for i, (_, err, topic) in enumerate(parsed)]
+        }),400
 
+    if wants_stream():
+        return stream_batch(username, parsed)
+
+    try:
+        *_, results = run_batch(username, parsed)
+    except (PoolTimeout, ModelUnavailable) as e:
+        return jsonify({'error':str(e)}),503
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error':str(e)}),500
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+    return jsonify({
+        "success":all(r['success'] for r in results),
+        "results":results
+    })
+
+def stream_batch(username, parsed):
+
+    def generate():
+        try:
+            for value in run_batch(username, parsed):
+                if isinstance(value, dict):
+                    yield sse("result", value)
+                else:
+                    # sent once every successful item is saved
+                    yield sse("done", {
+                        "success":all(r['success'] for r in value),
+                        "results":value
+                    })
+        except GeneratorExit:
+            print("Client disconnected mid-batch for", username)
+        except Exception as e:
+            traceback.print_exc()
+            yield sse("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# ================= Background Jobs =================
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+def get_jobs():
+    global _jobs
+    if _jobs is None:
+        with _jobs_lock:
+            if _jobs is None:
+                if os.getenv("JOBS_STORE", "mysql").lower() == "memory":
+                    store = jobs.MemoryJobStore()
+                else:
+                    store = jobs.MySQLJobStore(get_db_connection)
+
+                _jobs = jobs.JobQueue(
+                    lambda params: run_generation(params, bounded=False),
+                    store,
+                    workers=int(os.getenv("JOBS_WORKERS", 4)),
+                    max_queue=int(os.getenv("JOBS_MAX_QUEUE", 32)),
+                    ttl=int(os.getenv("JOBS_TTL", 3600)),
+                    heartbeat_interval=float(os.getenv("JOBS_HEARTBEAT", 30))
+                )
+    return _jobs
+
+def submit_generation_job(params):
+
+    try:
+        job_id = get_jobs().submit(params['username'], params)
+    except jobs.QueueFull as e:
+        response = jsonify({'error':str(e)})
+        response.headers['Retry-After'] = '5'
+        return response,429
+
+    status_url = f"/api/jobs/{job_id}"
+    response = jsonify({"job_id":job_id,"status":"queued","status_url":status_url})
+    response.headers['Location'] = status_url
+    return response,202
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+
+    job = get_jobs().get(job_id)
+
+    if not job:
+        return jsonify({'error':'Job not found or expired'}),404
+
+    return jsonify({
+        "job_id":job["job_id"],
+        "status":job["status"],
+        "result":job["result"],
+        "error":job["error"]
+    })
 
 # ================= AI HISTORY =================
 
-@app.route('/api/ai-history/<username>', methods=['GET'])
-def get_ai_history(username):
+AI_HISTORY_FIELDS = ['id','user_prompt','ai_response','created_at','tasks']
+TITLE_HISTORY_FIELDS = ['id','title','timestamp']
+
+def history_page_query(args, username, table, sort_column, allowed_fields, default_fields):
+    """SQL for one keyset page from limit/cursor/fields query args.
+
+    Returns (sql, sql_args, limit, fields); raises ValueError on bad query args.
+    """
+
+    limit, after, fields = pagination.parse_page_args(
+        args, allowed_fields, default_fields,
+        default_limit=int(os.getenv("HISTORY_DEFAULT_LIMIT", 0)),
+        max_limit=int(os.getenv("HISTORY_MAX_LIMIT", 100))
+    )
+
+    # id and the sort column are always read so the next cursor can be built
+    columns = [f for f in fields if f != 'tasks']
+    columns += [c for c in ('id',sort_column) if c not in columns]
+    if COMPACT_HISTORY and table == 'ai_history':
+        columns = history_storage.storage_columns(columns)
+
+    sql = f"SELECT {','.join(columns)} FROM {table} WHERE username=%s"
+    sql_args = [username]
+
+    if after:
+        sql += f" AND ({sort_column} < %s OR ({sort_column} = %s AND id < %s))"
+        sql_args += [after[0], after[0], after[1]]
+
+    sql += f" ORDER BY {sort_column} DESC, id DESC"
+
+    if limit:
+        # one extra row tells us whether another page exists
+        sql += " LIMIT %s"
+        sql_args.append(limit + 1)
+
+    return sql, tuple(sql_args), limit, fields
+
+def split_page(rows, limit, sort_column):
+    """Drop the look-ahead row. Returns (rows, next_cursor)."""
+
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, pagination.encode_cursor(rows[-1][sort_column], rows[-1]['id'])
+    return rows, None
+
+def finish_history_rows(rows, table, sort_column, fields):
+    for row in rows:
+        if COMPACT_HISTORY and table == 'ai_history':
+            history_storage.decode(row)
+        for column in ('id',sort_column):
+            if column not in fields:
+                row.pop(column, None)
+    return rows
+
+def fetch_history_page(username, table, sort_column, allowed_fields, default_fields):
+    """One keyset page of a per-user table for the current request's limit/cursor/fields args.
+
+    Returns (rows, next_cursor); raises ValueError on bad query args.
+    """
+
+    sql, args, limit, fields = history_page_query(
+        request.args, username, table, sort_column, allowed_fields, default_fields
+    )
 
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
 
-    cursor.execute(
-        """
-        SELECT user_prompt,ai_response,created_at
-        FROM ai_history
-        WHERE username=%s
-        ORDER BY created_at DESC
+    try:
+        with phase("db_query"):
+            cursor.execute(sql, args)
+            rows = cursor.fetchall()
+
+        rows, next_cursor = split_page(rows, limit, sort_column)
+
+        if 'tasks' in fields:
+            with phase("tasks_query"):
+                attach_tasks(cursor, rows)
+    finally:
+        cursor.close()
+        conn.close()
+
+    return finish_history_rows(rows, table, sort_column, fields), next_cursor
+
+def tasks_query(ids):
+    return (
+        f"""
+        SELECT ai_history_id,title,description,tips FROM ai_tasks
+        WHERE ai_history_id IN ({','.join(['%s'] * len(ids))})
+        ORDER BY ai_history_id, position
         """,
-        (username,)
+        tuple(ids)
     )
 
-    history = cursor.fetchall()
+def group_tasks(rows, task_rows):
+    by_id = {row['id']: [] for row in rows}
+    for task in task_rows:
+        by_id[task['ai_history_id']].append({
+            "title": task['title'],
+            "description": task['description'],
+            "tips": json.loads(task['tips'] or "[]")
+        })
+
+    for row in rows:
+        row['tasks'] = by_id[row['id']]
 
-    cursor.close()
-    conn.close()
+def attach_tasks(cursor, rows):
+    """Add the parsed tasks stored for each ai_history row."""
 
-    return jsonify({"history":history})
+    task_rows = []
+    if rows:
+        cursor.execute(*tasks_query([row['id'] for row in rows]))
+        task_rows = cursor.fetchall()
+    group_tasks(rows, task_rows)
 
-# ================= TITLE HISTORY =================
+@api.route('/api/ai-history/<username>', methods=['GET'])
+def get_ai_history(username):
 
-@app.route('/api/history/<username>', methods=['GET'])
-def get_history(username):
+    try:
+        history, next_cursor = fetch_history_page(
+            username, 'ai_history', 'created_at',
+            AI_HISTORY_FIELDS, ['user_prompt','ai_response','created_at']
+        )
+    except ValueError as e:
+        return jsonify({"error":str(e)}),400
+
+    return jsonify({"history":history,"next_cursor":next_cursor})
+
+# ================= AI HISTORY EXPORT =================
+# Whole history as NDJSON, oldest first, streamed from an unbuffered
+# cursor in EXPORT_BATCH-row chunks so memory stays flat. gzip is applied
+# on the fly when the client accepts it.
+#
+# A stream holds its connection for as long as the client takes to read
+# it, so exports draw from their own small pool (EXPORT_CONCURRENCY per
+# worker) instead of the request pool, and a stream is cut off after
+# EXPORT_MAX_SECONDS.
+
+EXPORT_FIELDS = ['user_prompt','ai_response']
+
+_export_pool = None
+_export_pool_lock = threading.Lock()
+
+def get_export_pool():
+    global _export_pool
+    if _export_pool is None:
+        with _export_pool_lock:
+            if _export_pool is None:
+                _export_pool = ConnectionPool(
+                    connect_from_env,
+                    size=int(os.getenv("EXPORT_CONCURRENCY", 2)),
+                    timeout=float(os.getenv("EXPORT_POOL_TIMEOUT", 1)),
+                    ping_interval=float(os.getenv("MYSQL_POOL_PING_INTERVAL", 30))
+                )
+    return _export_pool
+
+def get_export_connection():
+    with phase("db_connect"):
+        return get_export_pool().acquire()
+
+def parse_since(value):
+    """ISO 8601 datetime or epoch seconds -> naive datetime. Raises ValueError."""
+    error = ValueError("since must be an ISO 8601 datetime or epoch seconds")
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise error
+    try:
+        return datetime.fromtimestamp(seconds)
+    except (ValueError, OverflowError, OSError):
+        # inf, nan and timestamps outside the platform's datetime range
+        raise error
+
+def export_line(row):
+    return json.dumps(row, default=lambda o: o.isoformat() if isinstance(o, datetime) else str(o)) + "\n"
+
+@api.route('/api/ai-history/<username>/export', methods=['GET'])
+def export_ai_history(username):
+
+    fields = request.args.get('fields')
+    fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(EXPORT_FIELDS)
+    unknown = [f for f in fields if f not in EXPORT_FIELDS]
+    if unknown:
+        return jsonify({"error":f"Unknown field(s): {', '.join(unknown)}"}),400
+
+    since = request.args.get('since')
+    try:
+        since = parse_since(since) if since else None
+    except ValueError as e:
+        return jsonify({"error":str(e)}),400
+
+    columns = ['id','created_at'] + fields
+    if COMPACT_HISTORY:
+        columns = history_storage.storage_columns(columns)
+
+    # since is inclusive: rows from the same second as the last export come again, dedupe by id
+    sql = f"SELECT {','.join(columns)} FROM ai_history WHERE username=%s"
+    args = [username]
+    if since:
+        sql += " AND created_at >= %s"
+        args.append(since)
+    sql += " ORDER BY created_at, id"
+
+    batch_size = int(os.getenv("EXPORT_BATCH", 500))
+    max_seconds = float(os.getenv("EXPORT_MAX_SECONDS", 600))
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+
+    conn = get_export_connection()
+    try:
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        with phase("db_query"):
+            cursor.execute(sql, tuple(args))
+    except Exception:
+        conn.close()
+        raise
+
+    state = {"finished": False, "closed": False}
+
+    def close():
+        if state["closed"]:
+            return
+        state["closed"] = True
+        if state["finished"]:
+            cursor.close()
+            conn.close()
+        else:
+            # rows are still pending on the wire: the connection cannot be reused
+            conn.discard()
+
+    def generate():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+        deadline = time.monotonic() + max_seconds
+        try:
+            while True:
+                if time.monotonic() > deadline:
+                    # a slow reader must not pin the connection forever; the
+                    # stream ends without its last lines (and gzip trailer)
+                    print("Export time limit reached for", username)
+                    return
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if COMPACT_HISTORY:
+                    for row in rows:
+                        history_storage.decode(row)
+                chunk = "".join(export_line(row) for row in rows).encode("utf-8")
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else chunk
+            if compressor:
+                yield compressor.flush()
+            state["finished"] = True
+        except GeneratorExit:
+            print("Client disconnected mid-export for", username)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            close()
+
+    headers = {
+        'Content-Disposition': f'attachment; filename="ai-history-{username}.ndjson"',
+        'X-Accel-Buffering': 'no',
+        'Vary': 'Accept-Encoding'
+    }
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+
+    response = Response(generate(), mimetype='application/x-ndjson', headers=headers)
+    response.call_on_close(close)
+    return response
+
+# ================= AI HISTORY SEARCH =================
+# Ranked matches over a user's parsed tasks from the ai_tasks FULLTEXT index
+# (migration 7). Each result is one task with a snippet; pages continue
+# after the (score, task id) of the last result.
+
+TASK_MATCH = "MATCH(t.title,t.description,t.tips) AGAINST (%s IN BOOLEAN MODE)"
+
+@api.route('/api/ai-history/<username>/search', methods=['GET'])
+def search_ai_history(username):
+
+    terms = search.search_terms(request.args.get('q'))
+    if not terms:
+        return jsonify({"error":"q must contain at least one word"}),400
+
+    try:
+        limit, after, _ = pagination.parse_page_args(
+            request.args, [], [], max_limit=int(os.getenv("HISTORY_MAX_LIMIT", 100))
+        )
+        since = parse_since(request.args['since']) if request.args.get('since') else None
+    except ValueError as e:
+        return jsonify({"error":str(e)}),400
+
+    limit = limit or int(os.getenv("SEARCH_DEFAULT_LIMIT", 20))
+    query = search.boolean_query(terms)
+
+    sql = f"""
+        SELECT t.id,t.ai_history_id,t.position,t.title,t.description,t.tips,h.created_at,
+               {TASK_MATCH} AS score
+        FROM ai_tasks t JOIN ai_history h ON h.id=t.ai_history_id
+        WHERE t.username=%s AND {TASK_MATCH}
+    """
+    args = [query, username, query]
+
+    if since:
+        sql += " AND h.created_at >= %s"
+        args.append(since)
+    if after:
+        sql += f" AND ({TASK_MATCH} < %s OR ({TASK_MATCH} = %s AND t.id < %s))"
+        args += [query, after[0], query, after[0], after[1]]
+
+    sql += " ORDER BY score DESC, t.id DESC LIMIT %s"
+    args.append(limit + 1)
 
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
 
-    cursor.execute("""
-        SELECT ai_response, created_at
-        FROM ai_history
-        WHERE username=%s
-        ORDER BY created_at DESC
-    """, (username,))
+    try:
+        with phase("search_query"):
+            cursor.execute(sql, tuple(args))
+            rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = pagination.encode_cursor(rows[-1]['score'], rows[-1]['id'])
+
+    results = [{
+        "ai_history_id":row['ai_history_id'],
+        "position":row['position'],
+        "title":row['title'],
+        "snippet":search.snippet(search.task_text(row), terms),
+        "score":round(row['score'], 4),
+        "created_at":row['created_at'],
+    } for row in rows]
 
-    rows = cursor.fetchall()
+    return jsonify({"query":" ".join(terms),"results":results,"next_cursor":next_cursor})
 
-    cursor.close()
-    conn.close()
+# ================= TITLE HISTORY =================
 
-    return jsonify({"history": rows})
+@api.route('/api/history/<username>', methods=['GET'])
+def get_history(username):
 
-@app.route('/api/history/<username>', methods=['DELETE'])
+    try:
+        rows, next_cursor = fetch_history_page(
+            username, 'history', 'timestamp',
+            TITLE_HISTORY_FIELDS, ['title','timestamp']
+        )
+    except ValueError as e:
+        return jsonify({"error":str(e)}),400
+
+    return jsonify({"history": rows, "next_cursor": next_cursor})
+
+@api.route('/api/history/<username>', methods=['DELETE'])
 def delete_history(username):
+    """Titles only; ?all=1 also deletes the user's ai_history, ai_tasks and ai_jobs
+    rows and their cached answers and Idempotency-Key results."""
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    clear_all = request.args.get('all') in ('1','true')
 
-    cursor.execute("DELETE FROM history WHERE username=%s",(username,))
-    conn.commit()
+    # queued and in-flight generations would otherwise be written after the delete
+    if _writer is not None:
+        try:
+            _writer.flush()
+        except TimeoutError as e:
+            response = jsonify({'error':str(e)})
+            response.headers['Retry-After'] = '5'
+            return response,503
 
-    cursor.close()
-    conn.close()
+    conn = get_db_connection()
+    deleted = None
 
+    try:
+        with phase("db_write"):
+            if clear_all:
+                deleted = retention.delete_user(
+                    conn, username, batch_size=int(os.getenv("RETENTION_BATCH", 500))
+                )
+            else:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM history WHERE username=%s",(username,))
+                conn.commit()
+                cursor.close()
+    finally:
+        conn.close()
+
+    cache = get_titles_cache()
+    if cache:
+        cache.invalidate(username)
+
+    if clear_all:
+        # cached answers, Idempotency-Key replays and job results repeat the
+        # deleted generations, so they go too
+        cache = get_cache()
+        if cache:
+            cache.clear_owner(username)
+        idempotency = get_idempotency()
+        if idempotency:
+            idempotency.clear_user(username)
+        get_jobs().store.delete_user(username)
+        return jsonify({"message":"All history cleared","deleted":deleted})
     return jsonify({"message":"History cleared"})
 
+# ================= Retention =================
+# RETENTION_<TABLE>_DAYS / RETENTION_<TABLE>_MAX_ROWS policies for ai_history
+# and history (see retention.py). With RETENTION_INTERVAL set, every worker
+# runs a background pruner; a MySQL named lock lets one run at a time.
+
+_retention = None
+_retention_lock = threading.Lock()
+
+def get_retention():
+    """The background pruner, or None when RETENTION_INTERVAL or the policies are unset."""
+    global _retention
+    if _retention is None:
+        with _retention_lock:
+            if _retention is None:
+                interval = float(os.getenv("RETENTION_INTERVAL", 0))
+                policies = retention.policies_from_env()
+                if interval <= 0 or not policies:
+                    return None
+                _retention = retention.RetentionWorker(
+                    lambda: get_db_connection(), policies, interval, **retention.options_from_env()
+                )
+    return _retention
+
 # ================= Health =================
 
-@app.route('/api/health', methods=['GET'])
+def collect_worker_gauges():
+    """This worker's pool/cache/job state for /metrics (summed across workers)."""
+
+    gauges = []
+    if _pool is not None:
+        stats = _pool.stats()
+        for key in ('in_use','idle','checkouts','timeouts','wait_time_total'):
+            gauges.append((f"db_pool_{key}", {}, stats[key]))
+    if _cache is not None:
+        stats = _cache.stats()
+        for key in ('hits','misses','evictions','size'):
+            gauges.append((f"ai_cache_{key}", {}, stats[key]))
+    if _jobs is not None:
+        stats = _jobs.stats()
+        for key in ('queue_depth','running','rejected','completed','failed'):
+            gauges.append((f"jobs_{key}", {}, stats[key]))
+    if _writer is not None:
+        stats = _writer.stats()
+        for key in ('queue_depth','written','failed','batches','overflow'):
+            gauges.append((f"write_behind_{key}", {}, stats[key]))
+    if _telemetry:
+        stats = _telemetry.stats()
+        for key in ('queued','written','dropped','write_errors'):
+            gauges.append((f"llm_telemetry_{key}", {}, stats[key]))
+    if _titles_cache:
+        stats = _titles_cache.stats()
+        for key in ('hits','misses','stale_fills','invalidations'):
+            gauges.append((f"recent_titles_{key}", {}, stats[key]))
+    if _llm_limiter is not None:
+        stats = _llm_limiter.stats()
+        for key in ('in_use','waiting','rejected'):
+            gauges.append((f"llm_slots_{key}", {}, stats[key]))
+    for (budget, kind), buckets in (_limits or {}).items():
+        stats = buckets.stats()
+        for key in ('keys','rejected'):
+            gauges.append((f"rate_limit_{key}", {"budget":budget,"key":kind}, stats[key]))
+    return gauges
+
+metrics.registry.add_collector(collect_worker_gauges)
+
+@api.app_errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    return jsonify({"error":str(e)}),503
+
+@api.route('/api/db-stats', methods=['GET'])
+def db_stats():
+
+    return jsonify({
+        "pool":get_pool().stats(),
+        "export_pool":_export_pool.stats() if _export_pool is not None else None,
+        "write_behind":_writer.stats() if _writer is not None else None,
+        "retention":_retention.stats() if _retention is not None else None
+    })
+
+@api.route('/api/model-stats', methods=['GET'])
+def model_stats():
+
+    return jsonify({"models":get_router().snapshot()})
+
+@api.route('/api/llm-stats', methods=['GET'])
+def llm_stats():
+
+    try:
+        window = llm_telemetry.parse_window(request.args.get('window', '1h'))
+    except ValueError as e:
+        return jsonify({"error":str(e)}),400
+
+    telemetry = get_telemetry()
+    if not telemetry:
+        return jsonify({"error":"LLM telemetry is disabled"}),404
+
+    with phase("telemetry_read"):
+        rows = telemetry.read(time.time() - window)
+
+    return jsonify({
+        "window_seconds":window,
+        "models":llm_telemetry.summarize(rows),
+        "writer":telemetry.stats()
+    })
+
+@api.route('/api/job-stats', methods=['GET'])
+def job_stats():
+
+    return jsonify({"jobs":get_jobs().stats()})
+
+@api.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+
+    cache = get_cache()
+    idempotency = get_idempotency()
+    return jsonify({
+        "cache":cache.stats() if cache else None,
+        "coalescing":_flights.stats(),
+        "recent_titles":_titles_cache.stats() if _titles_cache else None,
+        "idempotency":idempotency.stats() if idempotency else None
+    })
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
 
     return jsonify({
@@ -348,7 +1735,47 @@ def health_check():
         "message":"Backend running correctly"
     })
 
-@app.route('/')
+# ================= Readiness =================
+# /api/health says the process answers; /api/ready says it can serve a
+# generation without building the model client or opening the first DB
+# connection on a user's request.
+#   WARMUP=off    nothing is warmed ahead of time, always ready
+#   WARMUP=probe  the first probe (or ?warm=1) starts warming -> 503 until done
+#   WARMUP=start  warming starts in create_app()
+
+WARMUP = os.getenv("WARMUP", "off").lower()
+
+def warm_pool():
+    get_db_connection().close()
+
+_warmup = None
+_warmup_lock = threading.Lock()
+
+def get_warmup():
+    global _warmup
+    if _warmup is None:
+        with _warmup_lock:
+            if _warmup is None:
+                _warmup = warmup.Warmup([
+                    ("model_client", get_client),
+                    ("db_pool", warm_pool),
+                    ("response_cache", get_cache),
+                ])
+    return _warmup
+
+@api.route('/api/ready', methods=['GET'])
+def readiness_check():
+
+    warm = get_warmup()
+    if WARMUP != "off" or request.args.get('warm') == '1':
+        warm.start()
+
+    result = warm.state()
+    ready = result["ready"] or WARMUP == "off"
+    result["ready"] = ready
+    return jsonify(result), 200 if ready else 503
+
+@api.route('/')
 def home():
 
     return jsonify({
@@ -362,6 +1789,29 @@ def home():
         ]
     })
 
+# ================= App Factory =================
+
+def create_app():
+    """The Flask app around the `api` blueprint.
+
+    Heavy work (model client, DB pool, caches) stays lazy, so this is cheap
+    and a cold start only pays for Flask and the modules above."""
+
+    flask_app = Flask(__name__)
+    CORS(flask_app)
+    metrics.init_app(flask_app)
+    http_encoding.init_app(flask_app)
+    flask_app.register_blueprint(api)
+
+    if WARMUP == "start":
+        get_warmup().start()
+    pruner = get_retention()
+    if pruner:
+        pruner.start()
+    return flask_app
+
+app = create_app()
+
 # ================= Run =================
 
 if __name__ == '__main__':
@@ -0,0 +1,671 @@
+import asyncio, contextvars, functools, io, os, threading, time, traceback
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import request, jsonify, request_started, Response
+from werkzeug.exceptions import HTTPException
+import admission
+import coalesce
+from db_pool import AsyncConnectionPool, PoolTimeout, async_connect_from_env
+from metrics import phase
+from model_router import ModelUnavailable
+import app as sync_app
+
+# ================= Async Serving Mode =================
+# The same API as app.py, served over ASGI so a worker holds hundreds of
+# in-flight generations on one event loop instead of one thread each:
+#
+#   uvicorn asgi_app:app --workers 2          (pip install uvicorn asgiref)
+#
+# POST /api/process-data (JSON and SSE), GET /api/history/<username> and
+# GET /api/ai-history/<username> run as coroutines with AsyncOpenAI and
+# mysql.connector.aio. They run inside a Flask request context, so the
+# app's before/after hooks (rate limits, CORS, metrics and Server-Timing,
+# ETag/gzip) and jsonify() output are the ones the sync routes get.
+# Every other route goes to the Flask app through asgiref's WsgiToAsgi.
+#
+# ASYNC_LLM_CONCURRENCY  model calls in flight per worker (LLM_QUEUE and
+#                        LLM_QUEUE_TIMEOUT apply as in sync mode), 0 = no cap
+# ASYNC_MYSQL_POOL_SIZE  async DB connections per worker
+# ASGI_THREADS           bridged requests at once, and threads for shared-cache calls
+
+flask_app = sync_app.app
+
+# ================= Thread Pool =================
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("ASGI_THREADS", 32)), thread_name_prefix="asgi"
+                )
+    return _executor
+
+def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call on the thread pool, inside the current request context."""
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(
+        get_executor(), functools.partial(context.run, fn, *args, **kwargs)
+    )
+
+def has_shared_tier(store):
+    entries = getattr(store, "entries", store)
+    return getattr(entries, "shared", None) is not None
+
+async def store_call(store, fn, *args):
+    # memory-only caches answer straight away; SQLite/MySQL tiers block
+    if has_shared_tier(store):
+        return await run_blocking(fn, *args)
+    return fn(*args)
+
+# ================= Async MySQL =================
+_async_pool = None
+
+def get_async_pool():
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = AsyncConnectionPool(
+            # looked up per connection so benchmarks can swap the driver
+            lambda: async_connect_from_env(),
+            size=int(os.getenv("ASYNC_MYSQL_POOL_SIZE", 20)),
+            timeout=float(os.getenv("MYSQL_POOL_TIMEOUT", 5)),
+            ping_interval=float(os.getenv("MYSQL_POOL_PING_INTERVAL", 30))
+        )
+    return _async_pool
+
+async def get_db_connection():
+    with phase("db_connect"):
+        return await get_async_pool().acquire()
+
+# ================= Async OpenRouter Client =================
+_async_client = None
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        _async_client = AsyncOpenAI(
+            base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+            api_key=os.getenv("OPENROUTER_API_KEY")
+        )
+    return _async_client
+
+def messages_for(user_prompt):
+    return [
+        {"role":"system","content":sync_app.SYSTEM_PROMPT},
+        {"role":"user","content":user_prompt}
+    ]
+
+async def get_ai_response(user_prompt, model, timeout=None, reason="primary"):
+
+    start = time.monotonic()
+    try:
+        completion = await get_async_client().chat.completions.create(
+            extra_headers=sync_app.EXTRA_HEADERS,
+            model=model,
+            messages=messages_for(user_prompt),
+            timeout=timeout
+        )
+        content = completion.choices[0].message.content.strip()
+    except asyncio.CancelledError:
+        # lost a hedge race or the deadline passed
+        sync_app.record_llm_call(model, "sync", reason, user_prompt, start, outcome="cancelled")
+        raise
+    except Exception as e:
+        sync_app.record_llm_call(model, "sync", reason, user_prompt, start, error=e)
+        raise
+
+    sync_app.record_llm_call(model, "sync", reason, user_prompt, start,
+                             usage=getattr(completion, "usage", None),
+                             outcome="ok" if content else "empty")
+    return content
+
+async def stream_ai_response(user_prompt, model):
+
+    return await get_async_client().chat.completions.create(
+        extra_headers=sync_app.EXTRA_HEADERS,
+        model=model,
+        messages=messages_for(user_prompt),
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+
+async def call_model(prompt, model, timeout, reason):
+    # looked up per call so tests can patch get_ai_response
+    return await get_ai_response(prompt, model, timeout, reason)
+
+# ================= Admission Control =================
+_llm_limiter = None
+
+def get_llm_limiter():
+    """Per-worker cap on concurrent model calls, or None (ASYNC_LLM_CONCURRENCY=0)."""
+    global _llm_limiter
+    if _llm_limiter is None:
+        limit = int(os.getenv("ASYNC_LLM_CONCURRENCY", 256))
+        if limit <= 0:
+            return None
+        _llm_limiter = admission.AsyncConcurrencyLimiter(
+            limit,
+            max_waiting=int(os.getenv("LLM_QUEUE", 32)),
+            timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", 15))
+        )
+    return _llm_limiter
+
+async def acquire_llm_slot(bounded=True):
+    limiter = get_llm_limiter()
+    if limiter is None:
+        return admission.AsyncSlot(None)
+    with phase("llm_wait"):
+        return await limiter.acquire(bounded)
+
+# ================= Generation =================
+
+async def get_recent_titles(username):
+
+    cache = sync_app.get_titles_cache()
+    if cache:
+        titles = await store_call(cache, cache.get, username)
+        if titles is not None:
+            return titles
+        version = cache.version()
+
+    conn = await get_db_connection()
+    try:
+        cursor = await conn.cursor(dictionary=True)
+        try:
+            with phase("history_select"):
+                await cursor.execute(sync_app.RECENT_TITLES_SQL, (username, sync_app.RECENT_TITLES))
+                titles = [r['title'] for r in await cursor.fetchall()]
+        finally:
+            await cursor.close()
+    finally:
+        # Not held across the model call
+        await conn.close()
+
+    if cache:
+        await store_call(cache, cache.fill, username, titles, version)
+    return titles
+
+async def prepare_generation(params):
+
+    recent_history_summary = sync_app.summarize_titles(await get_recent_titles(params['username']))
+
+    with phase("prompt_build"):
+        user_prompt = sync_app.build_user_prompt(
+            params['name'], params['age'], params['domain'],
+            params['time_available'], params['topic'], params['context'],
+            recent_history_summary
+        )
+
+    with phase("cache_lookup"):
+        cache = sync_app.get_cache()
+        cache_key = await store_call(cache, sync_app.cache_key_for, params)
+        cached_response = await store_call(cache, cache.get, cache_key) if cache else None
+
+    return user_prompt, cache_key, cached_response
+
+async def save_ai_results(cursor, items):
+    """app.save_ai_results() for an async cursor; no commit."""
+
+    statements = sync_app.save_ai_statements(items)
+    lastrowid = None
+    try:
+        while True:
+            sql, args, many = statements.send(lastrowid)
+            if many:
+                await cursor.executemany(sql, args)
+                lastrowid = None
+            else:
+                await cursor.execute(sql, args)
+                lastrowid = cursor.lastrowid
+    except StopIteration:
+        pass
+
+async def persist_items(username, items):
+
+    if sync_app.WRITE_MODE in ("commit", "enqueue"):
+        with phase("db_write"):
+            await run_blocking(sync_app.get_writer().submit_many, items,
+                               wait=sync_app.WRITE_MODE == "commit")
+    else:
+        conn = await get_db_connection()
+        try:
+            cursor = await conn.cursor(dictionary=True)
+            try:
+                with phase("db_write"):
+                    await save_ai_results(cursor, items)
+                with phase("db_commit"):
+                    await conn.commit()
+            finally:
+                await cursor.close()
+        finally:
+            await conn.close()
+
+    cache = sync_app.get_titles_cache()
+    titles = [task['title'] for item in items for task in item['tasks']]
+    if cache and titles:
+        await store_call(cache, cache.add, username, titles)
+
+async def persist_generation(username, user_prompt, ai_response):
+
+    item = sync_app.generation_item(username, user_prompt, ai_response)
+    await persist_items(username, [item])
+    return item['tasks']
+
+async def run_generation(params, bounded=True):
+
+    user_prompt, cache_key, cached_response = await prepare_generation(params)
+
+    if cached_response is not None:
+        ai_response = cached_response
+    else:
+        async with await acquire_llm_slot(bounded):
+            with phase("llm"):
+                ai_response, _ = await sync_app.get_router().agenerate(user_prompt, call_model)
+
+        cache = sync_app.get_cache()
+        if cache:
+            await store_call(cache, cache.set, cache_key, ai_response)
+
+    tasks = await persist_generation(params['username'], user_prompt, ai_response)
+
+    return {
+        "success":True,
+        "response":ai_response,
+        "tasks":tasks,
+        "cached":cached_response is not None
+    }
+
+_flights = coalesce.AsyncSingleFlight()
+
+async def coalesced_generation(params, idempotency_key=None):
+
+    fingerprint = coalesce.request_key(params)
+    store = sync_app.get_idempotency() if idempotency_key else None
+
+    if store:
+        result = await store_call(store, store.get, params['username'], idempotency_key, fingerprint)
+        if result is not None:
+            response = jsonify(result)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+    if sync_app.COALESCING:
+        result, shared = await _flights.do(fingerprint, lambda: run_generation(params))
+    else:
+        result, shared = await run_generation(params), False
+
+    if store:
+        await store_call(store, store.set, params['username'], idempotency_key, fingerprint, result)
+
+    response = jsonify(result)
+    if shared:
+        response.headers['X-Coalesced'] = 'true'
+    return response
+
+async def process_data():
+
+    try:
+
+        params, error = sync_app.parse_generation_request(request.json or {})
+
+        if error:
+            return jsonify({'error': error}), 400
+
+        if request.args.get('async') in ('1','true'):
+            return await run_blocking(sync_app.submit_generation_job, params)
+
+        if sync_app.wants_stream():
+            user_prompt, cache_key, cached_response = await prepare_generation(params)
+            slot = await acquire_llm_slot() if cached_response is None else None
+            return stream_process_data(params['username'], user_prompt, cache_key, cached_response, slot)
+
+        return await coalesced_generation(params, request.headers.get('Idempotency-Key'))
+
+    except coalesce.KeyConflict as e:
+        return jsonify({'error':str(e)}),422
+
+    except admission.Rejected as e:
+        return sync_app.rejection_response(e)
+
+    except (PoolTimeout, ModelUnavailable) as e:
+        return jsonify({'error':str(e)}),503
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error':str(e)}),500
+
+def stream_process_data(username, user_prompt, cache_key=None, cached_response=None, slot=None):
+    """app.stream_process_data() over the async client; the body is sent by send_response()."""
+
+    sse = sync_app.sse
+
+    async def generate():
+
+        upstream = None
+        parts = []
+
+        try:
+            if cached_response is not None:
+                parts.append(cached_response)
+                yield sse("delta", {"content": cached_response})
+
+            router = sync_app.get_router()
+            queue = router.candidates() if cached_response is None else iter(())
+            model = next(queue, None)
+            reason = "primary"
+            while model is not None:
+                start = time.monotonic()
+                first_token = None
+                usage = None
+                try:
+                    upstream = await stream_ai_response(user_prompt, model)
+                    async for chunk in upstream:
+                        usage = getattr(chunk, "usage", None) or usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if first_token is None:
+                                first_token = time.monotonic()
+                            parts.append(delta)
+                            yield sse("delta", {"content": delta})
+                    router.record(model, time.monotonic() - start, True)
+                    sync_app.record_llm_call(model, "stream", reason, user_prompt, start,
+                                             first_token_at=first_token, usage=usage)
+                    break
+                except (asyncio.CancelledError, GeneratorExit):
+                    sync_app.record_llm_call(model, "stream", reason, user_prompt, start,
+                                             first_token_at=first_token, usage=usage, outcome="cancelled")
+                    raise
+                except Exception as e:
+                    router.record(model, time.monotonic() - start, False, f"{type(e).__name__}: {e}")
+                    sync_app.record_llm_call(model, "stream", reason, user_prompt, start,
+                                             first_token_at=first_token, usage=usage, error=e)
+                    # the next model is taken only now, so a half-open
+                    # breaker's trial is spent only on a model that is called
+                    upcoming = None if parts else next(queue, None)
+                    if upcoming is None:
+                        raise
+                    print("Fallback model used:", e)
+                    if upstream is not None:
+                        await upstream.close()
+                        upstream = None
+                model = upcoming
+                reason = "fallback"
+
+            ai_response = "".join(parts).strip()
+
+            cache = sync_app.get_cache()
+            if cache and cached_response is None:
+                await store_call(cache, cache.set, cache_key, ai_response)
+
+            tasks = await persist_generation(username, user_prompt, ai_response)
+
+            yield sse("done", {
+                "success": True,
+                "response": ai_response,
+                "tasks": tasks,
+                "cached": cached_response is not None
+            })
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client went away: stop paying for tokens, keep no partial rows
+            print("Client disconnected mid-stream for", username)
+            raise
+
+        except Exception as e:
+            traceback.print_exc()
+            yield sse("error", {"error": str(e)})
+
+        finally:
+            if upstream is not None:
+                await upstream.close()
+            if slot is not None:
+                await slot.release()
+
+    response = Response(
+        iter(()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.async_body = generate()
+    # also covers a client that leaves before the body starts
+    response.async_on_close = slot.release if slot is not None else None
+    return response
+
+# ================= History =================
+
+async def fetch_history_page(username, table, sort_column, allowed_fields, default_fields):
+
+    sql, args, limit, fields = sync_app.history_page_query(
+        request.args, username, table, sort_column, allowed_fields, default_fields
+    )
+
+    conn = await get_db_connection()
+    try:
+        cursor = await conn.cursor(dictionary=True)
+        try:
+            with phase("db_query"):
+                await cursor.execute(sql, args)
+                rows = await cursor.fetchall()
+
+            rows, next_cursor = sync_app.split_page(rows, limit, sort_column)
+
+            if 'tasks' in fields:
+                with phase("tasks_query"):
+                    task_rows = []
+                    if rows:
+                        await cursor.execute(*sync_app.tasks_query([row['id'] for row in rows]))
+                        task_rows = await cursor.fetchall()
+                    sync_app.group_tasks(rows, task_rows)
+        finally:
+            await cursor.close()
+    finally:
+        await conn.close()
+
+    return sync_app.finish_history_rows(rows, table, sort_column, fields), next_cursor
+
+async def get_ai_history(username):
+
+    try:
+        history, next_cursor = await fetch_history_page(
+            username, 'ai_history', 'created_at',
+            sync_app.AI_HISTORY_FIELDS, ['user_prompt','ai_response','created_at']
+        )
+    except ValueError as e:
+        return jsonify({"error":str(e)}),400
+
+    return jsonify({"history":history,"next_cursor":next_cursor})
+
+async def get_history(username):
+
+    try:
+        rows, next_cursor = await fetch_history_page(
+            username, 'history', 'timestamp',
+            sync_app.TITLE_HISTORY_FIELDS, ['title','timestamp']
+        )
+    except ValueError as e:
+        return jsonify({"error":str(e)}),400
+
+    return jsonify({"history": rows, "next_cursor": next_cursor})
+
+# Flask endpoint -> coroutine serving it
+ASYNC_VIEWS = {
+    'api.process_data': process_data,
+    'api.get_history': get_history,
+    'api.get_ai_history': get_ai_history,
+}
+
+# ================= ASGI Adapter =================
+# Routes in ASYNC_VIEWS are dispatched here; everything else goes to the
+# Flask app through asgiref's WsgiToAsgi.
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+def wsgi_environ(scope, body):
+    """The environ WsgiToAsgi would build, so both paths see the same request."""
+    bridge = WsgiToAsgiInstance(flask_app)
+    bridge.scope = scope
+    environ = bridge.build_environ(scope, io.BytesIO(body))
+    # the body is already read: a chunked upload has no Content-Length header
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+def start_message(status, headers):
+    return {
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    }
+
+def watch_disconnect(receive):
+    gone = asyncio.Event()
+
+    async def watch():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        gone.set()
+
+    return gone, asyncio.ensure_future(watch())
+
+async def send_response(response, environ, send, receive):
+    body = getattr(response, "async_body", None)
+    try:
+        headers = response.get_wsgi_headers(environ)
+        await send(start_message(response.status_code, headers.to_wsgi_list()))
+
+        if body is None or environ["REQUEST_METHOD"] == "HEAD":
+            await send({"type": "http.response.body", "body": b"".join(response.get_app_iter(environ))})
+            return
+
+        async def pump():
+            async for chunk in body:
+                await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        # cancel the stream (and its model call) when the client leaves
+        gone, watcher = watch_disconnect(receive)
+        pumping = asyncio.ensure_future(pump())
+        try:
+            await asyncio.wait({pumping, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if gone.is_set():
+                pumping.cancel()
+            try:
+                await pumping
+            except asyncio.CancelledError:
+                pass
+        finally:
+            watcher.cancel()
+    finally:
+        if body is not None:
+            await body.aclose()
+        on_close = getattr(response, "async_on_close", None)
+        if on_close is not None:
+            await on_close()
+        response.close()
+
+async def full_dispatch(view, view_args):
+    """Flask.full_dispatch_request() with a coroutine view."""
+    try:
+        request_started.send(flask_app, _async_wrapper=flask_app.ensure_sync)
+        rv = flask_app.preprocess_request()
+        if rv is None:
+            rv = await view(**view_args)
+    except Exception as e:
+        rv = flask_app.handle_user_exception(e)
+    return flask_app.finalize_request(rv)
+
+async def dispatch(view, view_args, environ, send, receive):
+    """Flask.wsgi_app() for an async view: the same hooks, signals, error
+    handling and request/app-context teardown as the sync routes."""
+
+    ctx = flask_app.request_context(environ)
+    error = None
+    try:
+        try:
+            ctx.push()
+            response = await full_dispatch(view, view_args)
+        except Exception as e:
+            error = e
+            response = flask_app.handle_exception(e)
+        await send_response(response, environ, send, receive)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if error is not None and flask_app.should_ignore_error(error):
+            error = None
+        ctx.pop(error)
+
+_wsgi_app = WsgiToAsgi(flask_app)
+_wsgi_slots = None
+
+async def call_wsgi(scope, receive, send):
+    global _wsgi_slots
+    if _wsgi_slots is None:
+        # created on first use so it belongs to the serving loop
+        _wsgi_slots = asyncio.Semaphore(int(os.getenv("ASGI_THREADS", 32)))
+    async with _wsgi_slots:
+        # without a context of its own asgiref runs every WSGI call on one
+        # shared thread; this gives each bridged request its own
+        async with ThreadSensitiveContext():
+            await _wsgi_app(scope, receive, send)
+
+def match_view(scope):
+    if scope["method"] == "OPTIONS":
+        # CORS preflights get Flask's automatic OPTIONS response
+        return None, None
+    try:
+        endpoint, view_args = flask_app.url_map.bind("localhost").match(scope["path"], scope["method"])
+    except HTTPException:
+        return None, None
+    return ASYNC_VIEWS.get(endpoint), view_args
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def shutdown():
+    global _async_pool, _async_client, _llm_limiter, _executor, _wsgi_slots
+    pool, client, executor = _async_pool, _async_client, _executor
+    _async_pool = _async_client = _llm_limiter = _executor = _wsgi_slots = None
+    if pool is not None:
+        await pool.close_all()
+    if client is not None:
+        await client.close()
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    view, view_args = match_view(scope)
+    if view is None:
+        return await call_wsgi(scope, receive, send)
+
+    body = await read_body(receive)
+    if body is None:
+        return
+    await dispatch(view, view_args, wsgi_environ(scope, body), send, receive)
@@ -0,0 +1,20 @@
+"""ASGI entry point used by bench_async.py.
+
+    uvicorn benchmarks.bench_asgi:app --workers 1
+
+Same setup as bench_wsgi.py (BENCH_SQLITE, OPENROUTER_BASE_URL) for the
+async serving mode in asgi_app.py.
+"""
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_wsgi
+import asgi_app
+
+if os.getenv("BENCH_SQLITE"):
+    import sqlite_db
+    asgi_app.async_connect_from_env = sqlite_db.async_connector(os.environ["BENCH_SQLITE"])
+
+app = asgi_app.app
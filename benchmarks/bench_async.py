@@ -0,0 +1,243 @@
+"""In-flight capacity and memory per request: sync (gunicorn) vs async (uvicorn) serving.
+
+    python benchmarks/bench_async.py --requests 300 --llm-latency 2
+    python benchmarks/bench_async.py --modes sync --threads 32
+
+Fires --requests concurrent POST /api/process-data calls (unique topics,
+response cache, coalescing and rate limits off, so each one is a model
+call) at the app under gunicorn (benchmarks.bench_wsgi:app, --workers x
+--threads) and under uvicorn (benchmarks.bench_asgi:app, --workers). The
+stub LLM counts how many model calls were waiting on it at once; that
+peak is the number of requests the deployment really held in flight.
+Memory is the RSS of the server's process tree sampled from /proc, and
+"per in-flight" divides its growth under load by that peak.
+
+uvicorn comes with requirements.txt; without it the async mode is
+skipped. Results are also written as JSON (--out).
+"""
+import argparse, asyncio, importlib.util, json, os, subprocess, sys, tempfile, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import stub_llm
+from loadtest import percentile
+
+# ----- process memory -----
+
+def children(pid):
+    kids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            kids.append(int(entry))
+    return kids
+
+def tree_rss_kb(pid):
+    total = 0
+    for p in [pid] + children(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+# ----- servers -----
+
+def server_env(args, db_path):
+    env = dict(os.environ)
+    env.update({
+        "OPENROUTER_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+        "OPENROUTER_API_KEY": env.get("OPENROUTER_API_KEY", "bench"),
+        "PYTHONPATH": ROOT,
+        "BENCH_SQLITE": db_path,
+        "AI_CACHE_SIZE": "0",
+        "REQUEST_COALESCING": "0",
+        "RATE_LIMIT_GENERATE_IP": "0",
+        "RATE_LIMIT_GENERATE_USER": "0",
+        # measure what the serving model holds, not the admission caps
+        "LLM_CONCURRENCY": "0",
+        "ASYNC_LLM_CONCURRENCY": "0",
+        # the sync router's attempt pool would otherwise cap in-flight calls at 64
+        "AI_ROUTER_WORKERS": str(args.requests),
+        "MYSQL_POOL_SIZE": str(args.threads),
+        "AI_DEADLINE": str(args.timeout),
+        "AI_HEDGE_DEFAULT_DELAY": str(args.timeout),
+        "WARMUP": "off",
+    })
+    env.update(dict(kv.split("=", 1) for kv in args.env))
+    return env
+
+def start_server(mode, args, db_path):
+    if mode == "sync":
+        cmd = [
+            sys.executable, "-m", "gunicorn",
+            "-w", str(args.workers), "--threads", str(args.threads), "-k", "gthread",
+            "-b", f"127.0.0.1:{args.port}", "--backlog", "2048",
+            "--timeout", str(int(args.timeout) + 30), "--log-level", "warning",
+            "benchmarks.bench_wsgi:app",
+        ]
+    else:
+        cmd = [
+            sys.executable, "-m", "uvicorn", "benchmarks.bench_asgi:app",
+            "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(args.workers),
+            "--backlog", "2048", "--log-level", "warning", "--no-access-log",
+        ]
+    return subprocess.Popen(cmd, cwd=ROOT, env=server_env(args, db_path))
+
+# ----- client -----
+
+async def http_request(host, port, method, path, body, timeout):
+    """One request on its own connection; returns (status, seconds)."""
+
+    start = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        data = json.dumps(body).encode() if body is not None else b""
+        writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        status = int(response.split(b" ", 2)[1]) if response else 0
+        return status, time.perf_counter() - start
+    finally:
+        writer.close()
+
+async def wait_until_up(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            status, _ = await http_request(host, port, "GET", "/api/health", None, 2)
+            if status == 200:
+                return True
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    return False
+
+async def sample_rss(pid, samples, stop):
+    while not stop.is_set():
+        samples.append(tree_rss_kb(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), 0.1)
+        except asyncio.TimeoutError:
+            pass
+
+async def load(args, pid):
+    host, port = "127.0.0.1", args.port
+
+    async def one(i):
+        body = {"username": f"bench{i % 50}", "name": "Bench", "age": 30,
+                "topic": f"Topic {i} {time.time()}"}
+        try:
+            return await http_request(host, port, "POST", "/api/process-data", body, args.timeout)
+        except Exception as e:
+            return type(e).__name__, None
+
+    baseline = tree_rss_kb(pid)
+    samples, stop = [], asyncio.Event()
+    sampler = asyncio.ensure_future(sample_rss(pid, samples, stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+    return results, elapsed, baseline, max(samples + [baseline])
+
+# ----- report -----
+
+def run_mode(mode, args, llm):
+    tmpdir = tempfile.TemporaryDirectory()
+    server = start_server(mode, args, os.path.join(tmpdir.name, "bench.sqlite3"))
+    try:
+        if not asyncio.run(wait_until_up("127.0.0.1", args.port)):
+            print(f"{mode}: app did not come up", file=sys.stderr)
+            return None
+
+        llm.config.peak_in_flight = 0
+        results, elapsed, baseline, peak = asyncio.run(load(args, server.pid))
+
+        latencies = [t for status, t in results if status == 200]
+        errors = {}
+        for status, _ in results:
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+        in_flight = llm.config.peak_in_flight
+
+        return {
+            "completed": len(latencies),
+            "errors": errors,
+            "elapsed_s": round(elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            "peak_in_flight": in_flight,
+            "rss_idle_mb": round(baseline / 1024, 1),
+            "rss_peak_mb": round(peak / 1024, 1),
+            "kb_per_in_flight": round((peak - baseline) / in_flight, 1) if in_flight else None,
+        }
+    finally:
+        server.terminate()
+        try:
+            server.wait(15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        tmpdir.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--requests", type=int, default=200, help="concurrent requests")
+    parser.add_argument("--port", type=int, default=8097)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=16, help="gunicorn threads per worker (sync)")
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the app")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--llm-port", type=int, default=8099)
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    parser.add_argument("--out", default="bench_async_results.json")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    if "async" in modes and importlib.util.find_spec("uvicorn") is None:
+        print("uvicorn is not installed (pip install uvicorn): skipping the async mode")
+        modes.remove("async")
+
+    llm = stub_llm.serve(args.llm_port, background=True, latency=args.llm_latency)
+    report = {"config": {"requests": args.requests, "workers": args.workers, "threads": args.threads,
+                         "llm_latency": args.llm_latency, "env": args.env}}
+    try:
+        for mode in modes:
+            report[mode] = run_mode(mode, args, llm)
+    finally:
+        llm.shutdown()
+
+    print(f"{args.requests} concurrent requests, model latency {args.llm_latency}s, {args.workers} worker(s)")
+    print(f"{'mode':6} {'ok':>5} {'err':>5} {'in-flight':>9} {'p50':>9} {'p95':>9} "
+          f"{'RSS idle':>9} {'RSS peak':>9} {'KB/req':>8}")
+    for mode in modes:
+        row = report[mode]
+        if row is None:
+            continue
+        print(f"{mode:6} {row['completed']:>5} {sum(row['errors'].values()):>5} {row['peak_in_flight']:>9} "
+              f"{row['p50_ms']!s:>9} {row['p95_ms']!s:>9} {row['rss_idle_mb']:>9} {row['rss_peak_mb']:>9} "
+              f"{row['kb_per_in_flight']!s:>8}")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+    return 0 if all(report[m] for m in modes) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
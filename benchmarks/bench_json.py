@@ -0,0 +1,91 @@
+"""Micro-benchmark: history payload serialization and compression.
+
+    python benchmarks/bench_json.py [--rows 50] [--n 200]
+
+Builds a /api/ai-history page of `rows` realistic entries (full prompt,
+three-task answer, parsed tasks, created_at) and times jsonify() with
+Flask's stdlib provider vs. FastJSONProvider, then the size and CPU cost
+of each content encoding applied to the body.
+"""
+import argparse, os, random, sys, timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+import http_encoding
+from metrics import TimedJSONProvider
+from task_parser import parse_tasks
+from benchmarks.stub_llm import ANSWER
+
+PROMPT = """You are an expert personal productivity and learning assistant.
+User name: Alice, age 25, domain: Software, time available: 1 hour.
+Topic: Python decorators. Context: preparing for an interview next week.
+Previously studied: Closures in depth; Generators and iterators; Context managers.
+Suggest exactly 3 focused tasks with a detailed description and small tips."""
+
+def varied(text, rng):
+    # same shape as a real answer, but no two rows share their wording
+    lines = []
+    for line in text.split("\n"):
+        words = line.split(" ")
+        head, tail = words[:2], words[2:]
+        rng.shuffle(tail)
+        lines.append(" ".join(head + tail))
+    return "\n".join(lines)
+
+def history_page(rows):
+    rng = random.Random(7)
+    start = datetime(2024, 5, 1, 9, 0, 0)
+    history = []
+    for i in range(rows):
+        answer = varied(ANSWER, rng)
+        history.append({
+            "id": 1000 + i,
+            "user_prompt": varied(PROMPT, rng),
+            "ai_response": answer,
+            "tasks": parse_tasks(answer),
+            "created_at": start + timedelta(minutes=17 * i),
+        })
+    return {
+        "history": history,
+        "next_cursor": "MjAyNC0wNS0wMVQwOTowMDowMHwxMDAw",
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--n", type=int, default=200)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    page = history_page(args.rows)
+    providers = {"stdlib": TimedJSONProvider(app)}
+    if http_encoding.orjson is not None:
+        providers["orjson"] = http_encoding.FastJSONProvider(app)
+    else:
+        print("orjson not installed; only the stdlib provider is measured")
+
+    print(f"{args.rows} history rows, {args.n} iterations")
+    body = None
+    with app.app_context():
+        for name, provider in providers.items():
+            total = timeit.timeit(lambda: provider.response(page), number=args.n)
+            body = provider.response(page).get_data()
+            print(f"  jsonify {name:8} {total / args.n * 1e3:8.3f} ms/response  {len(body):>9} bytes")
+
+    encodings = [("gzip", {"level": 1}), ("gzip", {"level": 6})]
+    if http_encoding.brotli is not None:
+        encodings += [("br", {"brotli_quality": 4}), ("br", {"brotli_quality": 11})]
+    else:
+        print("brotli not installed; only gzip is measured")
+
+    for encoding, options in encodings:
+        total = timeit.timeit(lambda: http_encoding.compress(body, encoding, **options), number=args.n)
+        size = len(http_encoding.compress(body, encoding, **options))
+        label = f"{encoding} {list(options.values())[0]}"
+        print(f"  {label:16} {total / args.n * 1e3:8.3f} ms/response  {size:>9} bytes"
+              f"  ({size / len(body):.1%} of the body)")
+
+if __name__ == '__main__':
+    main()
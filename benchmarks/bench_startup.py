@@ -0,0 +1,95 @@
+"""Cold-start benchmark: `import app` and the first request, in fresh interpreters.
+
+    python benchmarks/bench_startup.py [--runs 5] [--max-import-ms 800]
+
+Each run starts a new `python -X importtime -c "import app"` and reads the
+cumulative import time of `app` and of its direct imports from stderr,
+then times import + first /api/health request separately. Exits 1 when
+the median import exceeds --max-import-ms or when a module listed in
+--forbid (heavy imports that must stay lazy) is loaded by `import app`.
+"""
+import argparse, os, statistics, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUEST = """
+import sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get('/api/health')
+done = time.perf_counter()
+forbidden = [name for name in sys.argv[1].split(',') if name and name in sys.modules]
+print(imported - start, done - start, ','.join(forbidden))
+"""
+
+def env():
+    # the key only has to be present; no request reaches the model
+    return dict(os.environ, OPENROUTER_API_KEY=os.getenv("OPENROUTER_API_KEY", "bench"),
+                WARMUP="off", PYTHONDONTWRITEBYTECODE="")
+
+def import_profile():
+    """{module: cumulative microseconds} for `app` and its direct imports."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                            cwd=ROOT, env=env(), capture_output=True, text=True, check=True)
+    modules, children = {}, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # a module's line comes after its imports' lines, one level less indented
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            children[name.strip()] = int(cumulative)
+        elif depth == 0:
+            if name.strip() == "app":
+                modules = dict(children, app=int(cumulative))
+            children = {}
+    return modules
+
+def first_request(forbid):
+    result = subprocess.run([sys.executable, "-c", FIRST_REQUEST, ",".join(forbid)],
+                            cwd=ROOT, env=env(), capture_output=True, text=True, check=True)
+    imported, done, forbidden = (result.stdout.strip().split(" ") + [""])[:3]
+    return float(imported), float(done), [name for name in forbidden.split(",") if name]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=800)
+    parser.add_argument("--forbid", default="openai,mysql.connector,httpx")
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+    forbid = [name for name in args.forbid.split(",") if name]
+
+    # the first run also fills __pycache__, so it is not counted
+    import_profile()
+    profiles = [import_profile() for _ in range(args.runs)]
+    requests = [first_request(forbid) for _ in range(args.runs)]
+
+    import_ms = statistics.median(p["app"] for p in profiles) / 1000
+    print(f"{args.runs} runs, median of each")
+    print(f"  import app (-X importtime)  {import_ms:8.1f} ms")
+    print(f"  import app (wall)           {statistics.median(r[0] for r in requests) * 1000:8.1f} ms")
+    print(f"  import + first request      {statistics.median(r[1] for r in requests) * 1000:8.1f} ms")
+
+    print("  heaviest direct imports:")
+    names = sorted((n for n in profiles[0] if n != "app"),
+                   key=lambda n: -statistics.median(p.get(n, 0) for p in profiles))
+    for name in names[:args.top]:
+        print(f"    {name:24} {statistics.median(p.get(name, 0) for p in profiles) / 1000:8.1f} ms")
+
+    failures = []
+    if import_ms > args.max_import_ms:
+        failures.append(f"import app took {import_ms:.1f} ms (limit {args.max_import_ms:.0f} ms)")
+    loaded = sorted({name for r in requests for name in r[2]})
+    if loaded:
+        failures.append(f"modules that should load lazily were imported: {', '.join(loaded)}")
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Micro-benchmark: single-pass task parser vs. the old two-regex title extraction.
+
+    python benchmarks/bench_task_parser.py [--n 20000]
+
+The old extract_titles only found titles; the parser also returns
+descriptions and tips, which clients previously re-parsed on every
+history view.
+"""
+import argparse, os, re, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_parser import parse_tasks, extract_titles
+
+RESPONSE = "\n\n---\n\n".join(
+    f"""### Task {i} – Topic number {i}
+
+**Detailed Description**
+Sentence one about the task. Sentence two adds detail. Sentence three
+gives an example. Sentence four wraps it up.
+
+**Small Tips**
+- Tip one for task {i}
+- Tip two for task {i}
+- Tip three for task {i}"""
+    for i in range(1, 4)
+)
+
+def regex_titles(response_text):
+    # extract_titles() as it was before the parser
+    titles = []
+    titles += re.findall(r"### Task \d+ – (.+)", response_text)
+    titles += re.findall(r"\*\*Task\s*\d+\s*–\s*(.+?)\*\*", response_text)
+    return [t.strip() for t in titles if t.strip()]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=20000)
+    n = parser.parse_args().n
+
+    assert regex_titles(RESPONSE) == extract_titles(RESPONSE)
+
+    results = {
+        "regex titles only": timeit.timeit(lambda: regex_titles(RESPONSE), number=n),
+        "parser titles": timeit.timeit(lambda: extract_titles(RESPONSE), number=n),
+        "parser full tasks": timeit.timeit(lambda: parse_tasks(RESPONSE), number=n),
+    }
+
+    print(f"{n} iterations, {len(RESPONSE)} byte response")
+    for name, total in results.items():
+        print(f"  {name:20} {total / n * 1e6:8.2f} us/call")
+
+if __name__ == '__main__':
+    main()
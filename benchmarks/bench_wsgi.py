@@ -0,0 +1,21 @@
+"""WSGI entry point used by loadtest.py.
+
+    gunicorn -w 2 --threads 8 benchmarks.bench_wsgi:app
+
+With BENCH_SQLITE=<path> the app's connections go to the SQLite stand-in
+instead of MySQL. Point OPENROUTER_BASE_URL at benchmarks/stub_llm.py to
+keep model calls offline.
+"""
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as app_module
+
+if os.getenv("BENCH_SQLITE"):
+    import sqlite_db
+    sqlite_db.create_schema(os.environ["BENCH_SQLITE"])
+    app_module.connect_from_env = sqlite_db.connector(os.environ["BENCH_SQLITE"])
+
+app = app_module.app
@@ -0,0 +1,300 @@
+"""Offline load test: real app under gunicorn, stub LLM, local database.
+
+    python benchmarks/loadtest.py --workers 2 --threads 8 --users 20 --duration 30
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000   # already running app
+
+Starts benchmarks/stub_llm.py in-process and gunicorn on
+benchmarks.bench_wsgi:app. By default the app uses the SQLite stand-in;
+pass --mysql to use the MYSQL_* settings from the environment instead
+(run migrations.py against that database first). Each virtual user signs
+up once, then loops over a weighted mix of requests. The report gives
+requests/s and p50/p95/p99 latency of answered requests per endpoint,
+with 4xx and 5xx counted separately, and is also written as JSON (--out)
+so runs can be compared. Rate limits and the LLM concurrency cap are off
+(override with --env).
+"""
+import argparse, http.client, json, os, random, signal, subprocess, sys, tempfile, threading, time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import stub_llm
+
+DEFAULT_MIX = "signin=3,process-data=1,history=4,ai-history=2,health=1"
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    index = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+    return samples[index]
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class Client:
+
+    def __init__(self, base_url, timeout):
+        url = urlparse(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            self.conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = self.conn.getresponse()
+            data = response.read()
+            if response.getheader("Connection", "").lower() == "close":
+                self.close()
+            return response.status, data
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Recorder:
+    """Latency percentiles cover answered requests (2xx/3xx) only; 4xx
+    (e.g. 429 from the rate limits) and 5xx/connection errors are counted
+    on their own so rejections never pass for fast successes."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.counts = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def record(self, name, latency, status):
+        with self.lock:
+            self.counts[name] += 1
+            self.statuses[name][status] += 1
+            if not status or status >= 500:
+                self.errors[name] += 1
+            elif status >= 400:
+                self.rejected[name] += 1
+            else:
+                self.latencies[name].append(latency)
+
+    def report(self, elapsed):
+        endpoints = {}
+        for name, count in sorted(self.counts.items()):
+            samples = self.latencies[name]
+
+            def ms(value):
+                return round(value * 1000, 2) if samples else None
+
+            endpoints[name] = {
+                "count": count,
+                "ok": len(samples),
+                "rejected": self.rejected[name],
+                "errors": self.errors[name],
+                "rps": round(len(samples) / elapsed, 2),
+                "mean_ms": ms(sum(samples) / len(samples)) if samples else None,
+                "p50_ms": ms(percentile(samples, 50)),
+                "p95_ms": ms(percentile(samples, 95)),
+                "p99_ms": ms(percentile(samples, 99)),
+                "max_ms": ms(max(samples)) if samples else None,
+                "statuses": dict(self.statuses[name]),
+            }
+        total = sum(self.counts.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "total_requests": total,
+            "total_rps": round(total / elapsed, 2) if elapsed else 0,
+            "endpoints": endpoints,
+        }
+
+
+def virtual_user(index, args, mix, recorder, stop_at):
+    client = Client(args.url, args.timeout)
+    rng = random.Random(args.seed + index)
+    username = f"bench{args.seed}_{index}"
+    password = "bench-password"
+    names, weights = list(mix), list(mix.values())
+
+    def call(name, method, path, body=None):
+        start = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, body)
+        except Exception:
+            status = 0
+        recorder.record(name, time.perf_counter() - start, status)
+
+    call("signup", "POST", "/signup", {"username": username, "password": password, "name": username})
+
+    while time.time() < stop_at:
+        name = rng.choices(names, weights)[0]
+        if name == "signin":
+            call(name, "POST", "/signin", {"username": username, "password": password})
+        elif name == "process-data":
+            stream = rng.random() < args.stream_fraction
+            body = {
+                "username": username, "name": username, "age": 20 + index % 30,
+                "topic": rng.choice(args.topics), "time_available": "30 minutes"
+            }
+            call("process-data-stream" if stream else name, "POST",
+                 "/api/process-data" + ("?stream=1" if stream else ""), body)
+        elif name == "history":
+            call(name, "GET", f"/api/history/{username}?limit=20")
+        elif name == "ai-history":
+            call(name, "GET", f"/api/ai-history/{username}?limit=10")
+        elif name == "health":
+            call(name, "GET", "/api/health")
+
+    client.close()
+
+
+def wait_until_up(url, timeout=30):
+    client = Client(url, 2)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            status, _ = client.request("GET", "/api/health")
+            if status == 200:
+                return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def start_gunicorn(args, llm_port, db_path):
+    env = dict(os.environ)
+    env.update({
+        "OPENROUTER_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "OPENROUTER_API_KEY": env.get("OPENROUTER_API_KEY", "bench"),
+        "PYTHONPATH": ROOT,
+        # measure the serving path, not the admission caps
+        "RATE_LIMIT_GENERATE_IP": "0",
+        "RATE_LIMIT_GENERATE_USER": "0",
+        "RATE_LIMIT_AUTH_IP": "0",
+        "RATE_LIMIT_AUTH_USER": "0",
+        "RATE_LIMIT_READ_IP": "0",
+        "RATE_LIMIT_READ_USER": "0",
+        "RATE_LIMIT_WRITE_IP": "0",
+        "RATE_LIMIT_WRITE_USER": "0",
+        "RATE_LIMIT_EXPORT_IP": "0",
+        "RATE_LIMIT_EXPORT_USER": "0",
+        "LLM_CONCURRENCY": "0",
+    })
+    if db_path:
+        env["BENCH_SQLITE"] = db_path
+    env.update(dict(kv.split("=", 1) for kv in args.env))
+
+    cmd = [
+        sys.executable, "-m", "gunicorn",
+        "-w", str(args.workers), "--threads", str(args.threads),
+        "-k", args.worker_class, "-b", f"127.0.0.1:{args.port}",
+        "--timeout", "120", "--log-level", "warning",
+        "benchmarks.bench_wsgi:app",
+    ]
+    return subprocess.Popen(cmd, cwd=ROOT, env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark an already running app instead of starting gunicorn")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--mysql", action="store_true", help="use MYSQL_* instead of the SQLite stand-in")
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the app")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--stream-fraction", type=float, default=0.0)
+    parser.add_argument("--topics", nargs="+", default=["Python", "SQL", "Statistics", "Git", "Rust"])
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=int(time.time()))
+    parser.add_argument("--llm-port", type=int, default=8099)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.02)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    llm = None
+    server = None
+    tmpdir = None
+
+    try:
+        if not args.url:
+            llm = stub_llm.serve(
+                args.llm_port, background=True, latency=args.llm_latency, jitter=args.llm_jitter,
+                chunk_delay=args.llm_chunk_delay, error_rate=args.llm_error_rate
+            )
+            db_path = None
+            if not args.mysql:
+                tmpdir = tempfile.TemporaryDirectory()
+                db_path = os.path.join(tmpdir.name, "bench.sqlite3")
+            server = start_gunicorn(args, args.llm_port, db_path)
+            args.url = f"http://127.0.0.1:{args.port}"
+
+        if not wait_until_up(args.url):
+            print("App did not come up", file=sys.stderr)
+            return 1
+
+        recorder = Recorder()
+        start = time.time()
+        stop_at = start + args.duration
+        users = [
+            threading.Thread(target=virtual_user, args=(i, args, mix, recorder, stop_at), daemon=True)
+            for i in range(args.users)
+        ]
+        for t in users:
+            t.start()
+        for t in users:
+            t.join()
+        elapsed = time.time() - start
+
+        result = recorder.report(elapsed)
+        result["config"] = {
+            "workers": args.workers, "threads": args.threads, "worker_class": args.worker_class,
+            "users": args.users, "duration": args.duration, "mix": mix,
+            "stream_fraction": args.stream_fraction, "database": "mysql" if args.mysql else "sqlite",
+            "llm_latency": args.llm_latency, "llm_jitter": args.llm_jitter, "env": args.env,
+        }
+
+        print(f"{result['total_requests']} requests in {result['elapsed_s']}s ({result['total_rps']} req/s)")
+        print(f"{'endpoint':22} {'count':>6} {'ok':>6} {'4xx':>5} {'err':>4} {'ok/s':>7} "
+              f"{'p50':>8} {'p95':>8} {'p99':>8}")
+        for name, row in result["endpoints"].items():
+            print(f"{name:22} {row['count']:>6} {row['ok']:>6} {row['rejected']:>5} {row['errors']:>4} "
+                  f"{row['rps']:>7} {row['p50_ms']!s:>8} {row['p95_ms']!s:>8} {row['p99_ms']!s:>8}")
+
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+        return 0
+
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(10)
+        if llm is not None:
+            llm.shutdown()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""SQLite stand-in for mysql.connector, for benchmarks without a MySQL server.
+
+Implements only what the app uses: cursor(dictionary=True), %s
+placeholders, execute/executemany/fetch*, lastrowid, commit/rollback,
+ping and in_transaction. AsyncConnection wraps it for the async serving
+mode, running each call on the connection's own thread. Numbers from it are useful for comparing app
+changes against each other, not as absolute MySQL figures.
+"""
+import asyncio, sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(80) NOT NULL UNIQUE,
+    name VARCHAR(120),
+    password VARCHAR(120) NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(80) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    timestamp INT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_username_timestamp ON history (username, timestamp);
+CREATE TABLE IF NOT EXISTS ai_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(100),
+    user_prompt TEXT,
+    ai_response TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    prompt_template SMALLINT,
+    prompt_params TEXT,
+    response_z BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_ai_history_username_created ON ai_history (username, created_at, id);
+CREATE TABLE IF NOT EXISTS ai_tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ai_history_id INT NOT NULL,
+    username VARCHAR(100) NOT NULL,
+    position TINYINT NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    tips TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_ai_tasks_history ON ai_tasks (ai_history_id, position);
+CREATE TABLE IF NOT EXISTS ai_jobs (
+    job_id CHAR(32) PRIMARY KEY,
+    username VARCHAR(100),
+    status VARCHAR(16) NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at DOUBLE NOT NULL,
+    updated_at DOUBLE NOT NULL,
+    expires_at DOUBLE NOT NULL
+);
+"""
+
+class Cursor:
+
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+
+    @staticmethod
+    def _sql(sql):
+        return sql.replace("%s", "?")
+
+    def execute(self, sql, args=()):
+        self._cursor.execute(self._sql(sql), tuple(args or ()))
+
+    def executemany(self, sql, rows):
+        self._cursor.executemany(self._sql(sql), rows)
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def cursor(self, dictionary=False, **kwargs):
+        return Cursor(self._conn, dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._conn.execute("SELECT 1")
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._conn.close()
+
+
+def create_schema(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    conn.commit()
+    conn.close()
+
+def connector(path):
+    return lambda: Connection(path)
+
+
+class AsyncCursor:
+
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+
+    async def execute(self, sql, args=()):
+        await self._conn._run(self._cursor.execute, sql, args)
+
+    async def executemany(self, sql, rows):
+        await self._conn._run(self._cursor.executemany, sql, rows)
+
+    async def fetchone(self):
+        return self._cursor.fetchone()
+
+    async def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    async def close(self):
+        self._cursor.close()
+
+
+class AsyncConnection:
+    """One thread per connection, like a driver owning its socket: a
+    transaction waiting on SQLite's write lock never starves the holder."""
+
+    def __init__(self, path):
+        self._conn = Connection(path)
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    def _run(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._thread, fn, *args)
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    async def cursor(self, dictionary=False, **kwargs):
+        return AsyncCursor(self, self._conn.cursor(dictionary))
+
+    async def commit(self):
+        await self._run(self._conn.commit)
+
+    async def rollback(self):
+        await self._run(self._conn.rollback)
+
+    async def ping(self, reconnect=False, attempts=1, delay=0):
+        await self._run(self._conn.ping)
+
+    async def close(self):
+        await self._run(self._conn.close)
+        self._thread.shutdown(wait=False)
+
+
+def async_connector(path):
+    async def connect():
+        return AsyncConnection(path)
+    return connect
@@ -0,0 +1,151 @@
+"""OpenAI-compatible stand-in for OpenRouter, for offline benchmarks.
+
+    python benchmarks/stub_llm.py --port 8099 --latency 0.8 --jitter 0.3
+
+Serves POST /v1/chat/completions (plain and stream=true) with a canned
+three-task answer in the format the app's prompt asks for. Latency,
+streaming pace and error rate are configurable so slow or failing
+models can be simulated.
+"""
+import argparse, json, random, threading, time, uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = "\n\n---\n\n".join(
+    f"""### Task {i} – Practice step {i}
+
+**Detailed Description**
+Work through a short exercise on the topic. Read one focused explanation.
+Try a small example yourself. Write down what surprised you.
+
+**Small Tips**
+- Keep it short
+- Use a timer
+- Review at the end"""
+    for i in range(1, 4)
+)
+
+class StubConfig:
+    latency = 0.5       # seconds before the first byte
+    jitter = 0.0        # +/- uniform seconds added to latency
+    chunk_delay = 0.02  # seconds between streamed chunks
+    chunks = 20
+    error_rate = 0.0
+    slow_models = ()    # models that take 10x latency
+    in_flight = 0       # requests being answered right now
+    peak_in_flight = 0
+
+def make_handler(config):
+
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            with lock:
+                config.in_flight += 1
+                config.peak_in_flight = max(config.peak_in_flight, config.in_flight)
+            try:
+                self._answer()
+            finally:
+                with lock:
+                    config.in_flight -= 1
+
+        def _answer(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            model = request.get("model", "stub")
+
+            delay = max(0.0, config.latency + random.uniform(-config.jitter, config.jitter))
+            if model in config.slow_models:
+                delay *= 10
+            time.sleep(delay)
+
+            if random.random() < config.error_rate:
+                return self._json(503, {"error": {"message": "stub upstream error", "code": 503}})
+
+            completion_id = "chatcmpl-" + uuid.uuid4().hex
+            created = int(time.time())
+            usage = {"prompt_tokens": 350, "completion_tokens": 220, "total_tokens": 570}
+
+            if not request.get("stream"):
+                return self._json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": ANSWER}}],
+                    "usage": usage,
+                })
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+
+            size = max(1, len(ANSWER) // config.chunks + 1)
+            for start in range(0, len(ANSWER), size):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": ANSWER[start:start + size]}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(config.chunk_delay)
+
+            final = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage,
+            }
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+def serve(port=8099, background=False, **options):
+    config = StubConfig()
+    for key, value in options.items():
+        setattr(config, key, value)
+
+    class Server(ThreadingHTTPServer):
+        # hundreds of connections arrive at once in bench_async.py
+        request_queue_size = 1024
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", port), make_handler(config))
+    server.config = config
+
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    print(f"Stub LLM listening on http://127.0.0.1:{port}/v1")
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-model", action="append", default=[])
+    args = parser.parse_args()
+
+    serve(args.port, latency=args.latency, jitter=args.jitter, chunk_delay=args.chunk_delay,
+          chunks=args.chunks, error_rate=args.error_rate, slow_models=tuple(args.slow_model))
+
+if __name__ == '__main__':
+    main()
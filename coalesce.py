@@ -0,0 +1,174 @@
+import hashlib, json, threading
+from ai_cache import LRUCache, ResponseCache, _normalize
+
+# ================= Request Coalescing =================
+# Double-clicks, client retries and refreshed tabs send the same
+# /api/process-data body while the first call is still waiting on the
+# model. SingleFlight lets identical concurrent requests in one worker
+# share a single generation; IdempotencyStore replays a finished result
+# for requests that repeat an Idempotency-Key.
+#
+# Across workers: in-flight coalescing is per process, so route a user's
+# requests to one worker (e.g. nginx `hash $username consistent`) and set
+# IDEMPOTENCY_SHARED=sqlite|mysql so any worker can replay finished keys.
+
+REQUEST_FIELDS = ['username','name','age','domain','time_available','topic','context']
+
+def request_key(params):
+    """Hash of the normalized request body, username included."""
+    parts = {field: _normalize(params.get(field,'')) for field in REQUEST_FIELDS}
+    raw = json.dumps(parts, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() once per key at a time. Returns (result, shared); errors reach every caller."""
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise TimeoutError("Identical request still running")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+            return flight.result, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
+
+
+class AsyncSingleFlight:
+    """SingleFlight for one event loop: fn is a coroutine function."""
+
+    def __init__(self):
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, timeout=None):
+        # asyncio is imported where it is used: the sync app never loads it
+        import asyncio
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            try:
+                # shield: a follower that gives up must not cancel the leader
+                return await asyncio.wait_for(asyncio.shield(flight), timeout), True
+            except asyncio.TimeoutError:
+                raise TimeoutError("Identical request still running")
+
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        self.leaders += 1
+        try:
+            result = await fn()
+            flight.set_result(result)
+            return result, False
+        except BaseException as e:
+            flight.set_exception(e if isinstance(e, Exception) else RuntimeError("Request cancelled"))
+            # followers may never await it
+            flight.exception()
+            raise
+        finally:
+            del self._flights[key]
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+class KeyConflict(Exception):
+    pass
+
+
+class IdempotencyStore:
+    """Finished results by (username, Idempotency-Key), kept for `ttl` seconds.
+
+    Entries live in a ResponseCache, so the optional shared tier is the same
+    SQLite/MySQL store the response cache uses (keys cannot collide)."""
+
+    def __init__(self, ttl=300, maxsize=1024, shared=None):
+        self.entries = ResponseCache(LRUCache(maxsize, ttl=ttl), shared)
+        self._lock = threading.Lock()
+        self.replays = 0
+        self.conflicts = 0
+
+    @staticmethod
+    def _key(username, idempotency_key):
+        raw = f"idempotency|{username}|{idempotency_key}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, username, idempotency_key, fingerprint):
+        """Return the stored result, or None. Raises KeyConflict if the key was
+        used with a different request body."""
+
+        raw = self.entries.get(self.entries.owned_key(self._key(username, idempotency_key), username))
+        if raw is None:
+            return None
+
+        entry = json.loads(raw)
+        if entry["fingerprint"] != fingerprint:
+            with self._lock:
+                self.conflicts += 1
+            raise KeyConflict("Idempotency-Key was already used with a different request")
+        with self._lock:
+            self.replays += 1
+        return entry["result"]
+
+    def set(self, username, idempotency_key, fingerprint, result):
+        raw = json.dumps({"fingerprint": fingerprint, "result": result})
+        self.entries.set(self.entries.owned_key(self._key(username, idempotency_key), username), raw)
+
+    def clear_user(self, username):
+        """Forget every stored result of `username`; their keys can be used again."""
+        self.entries.clear_owner(username)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self.entries.local),
+                "replays": self.replays,
+                "conflicts": self.conflicts,
+            }
@@ -0,0 +1,334 @@
+import os, threading, time, traceback
+
+# ================= Connection Pool =================
+# One pool per process. Gunicorn forks workers before the first request,
+# so the pool is created lazily and every worker gets its own.
+
+def connection_settings():
+    return dict(
+        host=os.getenv("MYSQL_HOST"),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD"),
+        database=os.getenv("MYSQL_DATABASE"),
+        port=int(os.getenv("MYSQL_PORT", 3306))
+    )
+
+def connect_from_env():
+    # imported here so a cold start does not pay for the driver
+    import mysql.connector
+    return mysql.connector.connect(**connection_settings())
+
+async def async_connect_from_env():
+    # asyncio driver shipped with mysql-connector-python (8.3+)
+    import mysql.connector.aio
+    return await mysql.connector.aio.connect(**connection_settings())
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """Wraps a raw connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise AttributeError("connection already returned to pool")
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw)
+
+    def discard(self):
+        """Drop the connection instead of reusing it (e.g. unread streamed rows)."""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.discard(raw)
+
+
+class ConnectionPool:
+
+    def __init__(self, factory, size=5, timeout=5.0, ping_interval=30.0):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = []          # (raw, last_used), most recently used last
+        self._created = 0
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ----- checkout -----
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                    create = False
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    raw, last_used = None, None
+                    create = True
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection available within {self.timeout}s "
+                        f"(pool size {self.size}, all in use)"
+                    )
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+
+        try:
+            if create:
+                raw = self.factory()
+            elif time.monotonic() - last_used >= self.ping_interval:
+                raw = self._pre_ping(raw)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        return PooledConnection(self, raw)
+
+    def _pre_ping(self, raw):
+        try:
+            raw.ping(reconnect=True, attempts=1, delay=0)
+            return raw
+        except Exception:
+            # Stale beyond repair (server restarted, wait_timeout hit): replace it
+            self._discard(raw)
+            with self._cond:
+                self._reconnects += 1
+            return self.factory()
+
+    # ----- return -----
+    def release(self, raw):
+        healthy = True
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((raw, time.monotonic()))
+            else:
+                self._created -= 1
+            self._cond.notify()
+
+        if not healthy:
+            self._discard(raw)
+
+    def discard(self, raw):
+        with self._cond:
+            self._in_use -= 1
+            self._created -= 1
+            self._cond.notify()
+        self._discard(raw)
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            traceback.print_exc()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for raw, _ in idle:
+            self._discard(raw)
+
+    # ----- monitoring -----
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+                "wait_time_total": round(self._wait_total, 6),
+                "wait_time_avg": round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+                "wait_time_max": round(self._wait_max, 6),
+            }
+
+
+# ================= Async Connection Pool =================
+# Same contract as ConnectionPool for the asyncio serving mode (asgi_app.py):
+# a bounded set of connections, PoolTimeout when none frees up in time.
+# Waiting is done on the event loop, so a full pool parks coroutines rather
+# than threads. One pool per event loop.
+
+class AsyncPooledConnection:
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise AttributeError("connection already returned to pool")
+        return getattr(self._raw, name)
+
+    async def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            await self._pool.release(raw)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class AsyncConnectionPool:
+
+    def __init__(self, factory, size=10, timeout=5.0, ping_interval=30.0):
+        self.factory = factory      # coroutine function returning a raw connection
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+
+        self._cond = None           # created on first use, inside the running loop
+        self._idle = []
+        self._created = 0
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._reconnects = 0
+
+    def _condition(self):
+        # asyncio is imported where it is used: the sync app never loads it
+        import asyncio
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self):
+        import asyncio
+        cond = self._condition()
+        deadline = time.monotonic() + self.timeout
+
+        async with cond:
+            while not self._idle and self._created >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection available within {self.timeout}s "
+                        f"(pool size {self.size}, all in use)"
+                    )
+                try:
+                    await asyncio.wait_for(cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            if self._idle:
+                raw, last_used = self._idle.pop()
+            else:
+                self._created += 1
+                raw, last_used = None, None
+            self._in_use += 1
+
+        try:
+            if raw is None:
+                raw = await self.factory()
+            elif time.monotonic() - last_used >= self.ping_interval:
+                raw = await self._pre_ping(raw)
+        except BaseException:
+            async with cond:
+                self._in_use -= 1
+                self._created -= 1
+                cond.notify()
+            raise
+
+        self._checkouts += 1
+        return AsyncPooledConnection(self, raw)
+
+    async def _pre_ping(self, raw):
+        try:
+            await raw.ping(reconnect=True, attempts=1, delay=0)
+            return raw
+        except Exception:
+            await self._discard(raw)
+            self._reconnects += 1
+            return await self.factory()
+
+    async def release(self, raw):
+        healthy = True
+        try:
+            if raw.in_transaction:
+                await raw.rollback()
+        except Exception:
+            healthy = False
+
+        cond = self._condition()
+        async with cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((raw, time.monotonic()))
+            else:
+                self._created -= 1
+            cond.notify()
+
+        if not healthy:
+            await self._discard(raw)
+
+    async def _discard(self, raw):
+        try:
+            await raw.close()
+        except Exception:
+            traceback.print_exc()
+
+    async def close_all(self):
+        idle, self._idle = self._idle, []
+        self._created -= len(idle)
+        for raw, _ in idle:
+            await self._discard(raw)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "created": self._created,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "checkouts": self._checkouts,
+            "timeouts": self._timeouts,
+            "reconnects": self._reconnects,
+        }
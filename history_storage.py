@@ -0,0 +1,144 @@
+import json, sys, traceback, zlib
+from dotenv import load_dotenv
+import prompts
+
+# ================= Compact ai_history Storage =================
+# With AI_HISTORY_STORAGE=compact, ai_history rows keep the prompt as
+# (template version, JSON parameters) and the response zlib-compressed.
+# Reads rebuild the original text, only for the fields a request asks for.
+#
+# Convert existing rows:   python history_storage.py backfill [--batch 500]
+
+# API field -> columns it is stored in
+STORAGE_COLUMNS = {
+    'user_prompt': ['user_prompt','prompt_template','prompt_params'],
+    'ai_response': ['ai_response','response_z'],
+}
+
+def compress(text):
+    return zlib.compress(text.encode("utf-8"), 6)
+
+def decompress(blob):
+    return zlib.decompress(bytes(blob)).decode("utf-8")
+
+def encode(user_prompt, ai_response):
+    """Column values for one compact ai_history row.
+
+    Prompts that no known template reproduces exactly are kept as text.
+    """
+
+    row = {
+        'user_prompt': user_prompt,
+        'prompt_template': None,
+        'prompt_params': None,
+        'ai_response': None,
+        'response_z': None,
+    }
+
+    parsed = prompts.parse(user_prompt) if user_prompt is not None else None
+    if parsed:
+        version, params = parsed
+        row.update(user_prompt=None, prompt_template=version, prompt_params=json.dumps(params))
+
+    if ai_response is not None:
+        row['response_z'] = compress(ai_response)
+
+    return row
+
+def storage_columns(fields):
+    columns = []
+    for field in fields:
+        columns += STORAGE_COLUMNS.get(field, [field])
+    return columns
+
+def decode(row):
+    """Rebuild user_prompt/ai_response in place from whichever columns were read."""
+
+    if 'prompt_template' in row:
+        version = row.pop('prompt_template')
+        params = row.pop('prompt_params', None)
+        if version is not None:
+            row['user_prompt'] = prompts.render(version, json.loads(params))
+
+    if 'response_z' in row:
+        blob = row.pop('response_z')
+        if blob is not None:
+            row['ai_response'] = decompress(blob)
+
+    return row
+
+# ----- backfill -----
+
+def backfill(conn, batch_size=500, log=print):
+    """Convert plain rows to compact storage in id order, one batch per commit."""
+
+    cursor = conn.cursor(dictionary=True)
+    last_id = 0
+    converted = 0
+
+    try:
+        while True:
+            cursor.execute(
+                """
+                SELECT id,user_prompt,ai_response FROM ai_history
+                WHERE id>%s AND ai_response IS NOT NULL
+                ORDER BY id LIMIT %s
+                """,
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                compact = encode(row['user_prompt'], row['ai_response'])
+                updates.append((
+                    compact['user_prompt'], compact['prompt_template'], compact['prompt_params'],
+                    compact['ai_response'], compact['response_z'], row['id']
+                ))
+
+            cursor.executemany(
+                """
+                UPDATE ai_history
+                SET user_prompt=%s, prompt_template=%s, prompt_params=%s, ai_response=%s, response_z=%s
+                WHERE id=%s
+                """,
+                updates
+            )
+            conn.commit()
+
+            converted += len(rows)
+            last_id = rows[-1]['id']
+            log(f"Converted {converted} rows (up to id {last_id})")
+
+        return converted
+
+    finally:
+        cursor.close()
+
+def main(argv):
+    from db_pool import connect_from_env
+
+    if not argv or argv[0] != "backfill":
+        print("usage: python history_storage.py backfill [--batch N]")
+        return 2
+
+    batch_size = 500
+    if "--batch" in argv:
+        batch_size = int(argv[argv.index("--batch") + 1])
+
+    load_dotenv()
+    conn = connect_from_env()
+
+    try:
+        print(f"Done, {backfill(conn, batch_size)} rows converted")
+        return 0
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
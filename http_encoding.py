@@ -0,0 +1,139 @@
+import dataclasses, decimal, gzip, os, uuid
+from datetime import date
+from flask import request
+from werkzeug.http import http_date
+import metrics
+from metrics import phase, TimedJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ================= Response Encoding =================
+# History responses carry whole prompts and answers. Three things keep
+# them cheap:
+#   - FastJSONProvider: jsonify() through orjson when it is installed,
+#     with the same output rules as Flask's provider (sorted keys, dates
+#     as HTTP dates), falling back to the stdlib for anything orjson
+#     rejects
+#   - a weak ETag on GET responses, so a client sending it back in
+#     If-None-Match gets 304 with no body
+#   - gzip (or brotli, when installed) for bodies of COMPRESS_MIN_SIZE
+#     bytes or more, if the client's Accept-Encoding allows it
+# Streams (SSE, the NDJSON export) and bodies that already have a
+# Content-Encoding are left alone.
+
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'application/javascript', 'text/')
+
+def _default(o):
+    # the same conversions as Flask's DefaultJSONProvider
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(TimedJSONProvider):
+    """TimedJSONProvider that serializes with orjson.
+
+    orjson writes UTF-8 instead of \\u escapes; everything else matches the
+    stdlib output. Integers beyond 64 bits and other values orjson cannot
+    encode go through the stdlib."""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.pop("indent", None):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.pop("separators", (",", ":")) != (",", ":") or kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=_default, option=option).decode("utf-8")
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def json_provider_from_env(app):
+    """JSON_PROVIDER: auto (orjson if installed) | orjson | stdlib."""
+
+    choice = os.getenv("JSON_PROVIDER", "auto").lower()
+    if choice == "stdlib":
+        return TimedJSONProvider(app)
+    if orjson is None:
+        if choice == "orjson":
+            raise RuntimeError("JSON_PROVIDER=orjson but orjson is not installed")
+        return TimedJSONProvider(app)
+    return FastJSONProvider(app)
+
+
+def compress(data, encoding, level=6, brotli_quality=4):
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def init_app(app):
+
+    app.json = json_provider_from_env(app)
+
+    etags = os.getenv("ETAGS", "on").lower() not in ("0", "off", "false")
+    min_size = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    level = int(os.getenv("COMPRESS_LEVEL", 6))
+    brotli_quality = int(os.getenv("BROTLI_QUALITY", 4))
+    encodings = (["br"] if brotli is not None else []) + ["gzip"]
+
+    @app.after_request
+    def encode_response(response):
+        if response.is_streamed or response.direct_passthrough:
+            return response
+
+        if etags and request.method in ("GET", "HEAD") and response.status_code == 200 \
+                and "ETag" not in response.headers:
+            with phase("etag"):
+                response.add_etag(weak=True)
+            response.headers.setdefault("Cache-Control", "private, no-cache")
+            response.make_conditional(request)
+            if response.status_code == 304:
+                metrics.registry.inc("http_not_modified_total", {},
+                                     help="GET responses answered with 304 Not Modified")
+                return response
+
+        if min_size <= 0 or "Content-Encoding" in response.headers \
+                or not response.mimetype.startswith(COMPRESSIBLE) \
+                or (response.content_length or 0) < min_size:
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        with phase("compress"):
+            body = compress(data, encoding, level, brotli_quality)
+        if len(body) >= len(data):
+            return response
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        metrics.registry.inc("http_response_bytes_total", {"stage": "uncompressed"}, len(data),
+                             help="Bytes of compressed responses before and after encoding")
+        metrics.registry.inc("http_response_bytes_total", {"stage": "sent"}, len(body))
+        return response
@@ -0,0 +1,290 @@
+import json, queue, threading, time, traceback, uuid
+
+# ================= Background Jobs =================
+# A bounded queue drained by a fixed set of worker threads per process.
+# Job state lives in a store (MySQL in production) so results can be
+# polled from any gunicorn worker and survive restarts until they expire.
+#
+# Queued and running jobs only live in their worker's memory. The worker
+# touches their updated_at every heartbeat; a job nobody has touched for
+# LOST_AFTER heartbeats belonged to a worker that died or restarted and
+# is reported (and swept) as "lost" so clients stop polling.
+
+ACTIVE = ("queued", "running")
+LOST_ERROR = "The worker running this job stopped before it finished; submit it again"
+LOST_AFTER = 3
+
+class QueueFull(Exception):
+    pass
+
+
+class MemoryJobStore:
+    """Single-process store, for development and tests."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, username, expires_at):
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id, "username": username, "status": "queued",
+                "result": None, "error": None,
+                "created_at": time.time(), "updated_at": time.time(), "expires_at": expires_at
+            }
+
+    def update(self, job_id, status, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(status=status, result=result, error=error, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job["expires_at"] > time.time():
+                return dict(job)
+        return None
+
+    def touch(self, job_ids):
+        now = time.time()
+        with self._lock:
+            for job_id in job_ids:
+                job = self._jobs.get(job_id)
+                if job and job["status"] in ACTIVE:
+                    job["updated_at"] = now
+
+    def mark_lost(self, stale_before):
+        with self._lock:
+            lost = [job for job in self._jobs.values()
+                    if job["status"] in ACTIVE and job["updated_at"] < stale_before]
+            for job in lost:
+                job.update(status="lost", error=LOST_ERROR, updated_at=time.time())
+        return len(lost)
+
+    def delete_user(self, username):
+        with self._lock:
+            owned = [k for k, job in self._jobs.items() if job["username"] == username]
+            for k in owned:
+                del self._jobs[k]
+        return len(owned)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [k for k, job in self._jobs.items() if job["expires_at"] <= now]
+            for k in expired:
+                del self._jobs[k]
+        return len(expired)
+
+
+class MySQLJobStore:
+
+    def __init__(self, get_connection):
+        self.get_connection = get_connection
+
+    def _run(self, sql, args, fetch=False):
+        conn = self.get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(sql, args)
+            if fetch:
+                return cursor.fetchone()
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+            conn.close()
+
+    def create(self, job_id, username, expires_at):
+        now = time.time()
+        self._run(
+            """
+            INSERT INTO ai_jobs (job_id,username,status,created_at,updated_at,expires_at)
+            VALUES (%s,%s,'queued',%s,%s,%s)
+            """,
+            (job_id, username, now, now, expires_at)
+        )
+
+    def update(self, job_id, status, result=None, error=None):
+        self._run(
+            "UPDATE ai_jobs SET status=%s, result=%s, error=%s, updated_at=%s WHERE job_id=%s",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        )
+
+    def get(self, job_id):
+        row = self._run(
+            """
+            SELECT job_id,username,status,result,error,created_at,updated_at,expires_at
+            FROM ai_jobs WHERE job_id=%s AND expires_at>%s
+            """,
+            (job_id, time.time()), fetch=True
+        )
+        if row and row["result"] is not None:
+            row["result"] = json.loads(row["result"])
+        return row
+
+    def touch(self, job_ids):
+        if not job_ids:
+            return
+        self._run(
+            f"""
+            UPDATE ai_jobs SET updated_at=%s
+            WHERE job_id IN ({','.join(['%s'] * len(job_ids))}) AND status IN ('queued','running')
+            """,
+            (time.time(), *job_ids)
+        )
+
+    def mark_lost(self, stale_before):
+        return self._run(
+            """
+            UPDATE ai_jobs SET status='lost', error=%s, updated_at=%s
+            WHERE status IN ('queued','running') AND updated_at<%s
+            """,
+            (LOST_ERROR, time.time(), stale_before)
+        )
+
+    def delete_user(self, username):
+        return self._run("DELETE FROM ai_jobs WHERE username=%s", (username,))
+
+    def purge_expired(self):
+        return self._run("DELETE FROM ai_jobs WHERE expires_at<=%s", (time.time(),))
+
+
+class JobQueue:
+
+    def __init__(self, run, store, workers=4, max_queue=32, ttl=3600, purge_interval=300,
+                 heartbeat_interval=30.0):
+        self.run = run                  # run(payload) -> JSON-serializable result
+        self.store = store
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_queue = max_queue
+        self.workers = workers
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._active = set()            # ids queued or running in this process
+        self._last_purge = time.monotonic()
+
+        self.running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            t = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, username, payload):
+        if self._queue.full():
+            with self._lock:
+                self.rejected += 1
+            raise QueueFull(f"Job queue is full ({self.max_queue} waiting)")
+
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, username, time.time() + self.ttl)
+
+        with self._lock:
+            self._active.add(job_id)
+        try:
+            self._queue.put_nowait((job_id, payload, time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+                self._active.discard(job_id)
+            self.store.update(job_id, "failed", error="Job queue is full")
+            raise QueueFull(f"Job queue is full ({self.max_queue} waiting)")
+
+        with self._lock:
+            self.submitted += 1
+        self.start()
+        return job_id
+
+    def _work(self):
+        while True:
+            job_id, payload, enqueued_at = self._queue.get()
+            waited = time.monotonic() - enqueued_at
+            with self._lock:
+                self.running += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+            try:
+                self.store.update(job_id, "running")
+                result = self.run(payload)
+                self.store.update(job_id, "done", result=result)
+                with self._lock:
+                    self.completed += 1
+            except Exception as e:
+                traceback.print_exc()
+                with self._lock:
+                    self.failed += 1
+                try:
+                    self.store.update(job_id, "failed", error=str(e))
+                except Exception:
+                    traceback.print_exc()
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self._active.discard(job_id)
+                self._queue.task_done()
+                self._maybe_purge()
+
+    def _heartbeat(self):
+        while True:
+            try:
+                # jobs of workers that died are never touched again
+                self.store.mark_lost(time.time() - LOST_AFTER * self.heartbeat_interval)
+                with self._lock:
+                    active = list(self._active)
+                self.store.touch(active)
+            except Exception:
+                traceback.print_exc()
+            time.sleep(self.heartbeat_interval)
+
+    def get(self, job_id):
+        """The stored job, reported as lost when its worker stopped heartbeating."""
+        job = self.store.get(job_id)
+        if job and job["status"] in ACTIVE \
+                and job["updated_at"] < time.time() - LOST_AFTER * self.heartbeat_interval:
+            job.update(status="lost", error=LOST_ERROR)
+        return job
+
+    def _maybe_purge(self):
+        if time.monotonic() - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = time.monotonic()
+        try:
+            self.store.purge_expired()
+        except Exception:
+            traceback.print_exc()
+
+    def stats(self):
+        with self._lock:
+            started = self.completed + self.failed + self.running
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "workers": self.workers,
+                "running": self.running,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "wait_time_avg": round(self.wait_total / started, 6) if started else 0.0,
+                "wait_time_max": round(self.wait_max, 6),
+            }
@@ -0,0 +1,319 @@
+import argparse, atexit, json, os, queue, re, sys, threading, time, traceback
+from collections import deque
+
+# ================= LLM Call Telemetry =================
+# One record per model call (hedges and fallbacks included): model, token
+# usage, time to first token, total latency, why the call was made and how
+# it ended. Requests only append to an in-process queue; a background
+# thread writes batches to the store, so a slow store never adds latency.
+#
+# Report from the command line:
+#   python llm_telemetry.py --window 24h
+#   python llm_telemetry.py --window 1h --store jsonl --path llm_calls.jsonl
+
+FIELDS = (
+    "created_at", "model", "kind", "reason", "outcome", "error",
+    "prompt_chars", "prompt_tokens", "completion_tokens", "ttft_ms", "latency_ms"
+)
+
+def make_record(model, kind, reason, prompt, started_at, first_token_at=None,
+                usage=None, error=None, outcome=None):
+    """Build a record from monotonic timestamps and an optional OpenAI usage object."""
+
+    now = time.monotonic()
+
+    def tokens(name):
+        value = getattr(usage, name, None)
+        return value if isinstance(value, int) else None
+
+    if outcome is None:
+        if error is None:
+            outcome = "ok"
+        elif "timeout" in type(error).__name__.lower():
+            outcome = "timeout"
+        else:
+            outcome = "error"
+
+    return {
+        "created_at": time.time(),
+        "model": model,
+        "kind": kind,
+        "reason": reason,
+        "outcome": outcome,
+        "error": f"{type(error).__name__}: {error}"[:500] if error is not None else None,
+        "prompt_chars": len(prompt or ""),
+        "prompt_tokens": tokens("prompt_tokens"),
+        "completion_tokens": tokens("completion_tokens"),
+        "ttft_ms": round((first_token_at - started_at) * 1000, 1) if first_token_at else None,
+        "latency_ms": round((now - started_at) * 1000, 1),
+    }
+
+# ----- stores -----
+
+class MemoryTelemetryStore:
+    """Recent calls of this process only; the default, needs no setup."""
+
+    def __init__(self, max_rows=10000):
+        self._rows = deque(maxlen=max_rows)
+        self._lock = threading.Lock()
+
+    def write(self, records):
+        with self._lock:
+            self._rows.extend(records)
+
+    def read(self, since):
+        with self._lock:
+            return [r for r in self._rows if r["created_at"] >= since]
+
+
+class JSONLTelemetryStore:
+    """Appends one JSON line per call. Small appends are atomic, so workers can share a file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, records):
+        data = "".join(json.dumps(r) + "\n" for r in records)
+        with open(self.path, "a") as f:
+            f.write(data)
+
+    def read(self, since):
+        rows = []
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue
+                    if row.get("created_at", 0) >= since:
+                        rows.append(row)
+        except FileNotFoundError:
+            pass
+        return rows
+
+
+class MySQLTelemetryStore:
+    """llm_calls table (migration 6)."""
+
+    def __init__(self, get_connection, max_rows=200000):
+        self.get_connection = get_connection
+        self.max_rows = max_rows
+
+    def write(self, records):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(
+                f"INSERT INTO llm_calls ({','.join(FIELDS)}) VALUES ({','.join(['%s'] * len(FIELDS))})",
+                [tuple(r[f] for f in FIELDS) for r in records]
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def read(self, since):
+        conn = self.get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                f"SELECT {','.join(FIELDS)} FROM llm_calls WHERE created_at>=%s "
+                f"ORDER BY created_at DESC LIMIT {int(self.max_rows)}",
+                (since,)
+            )
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+# ----- batched writer -----
+
+class TelemetryWriter:
+
+    def __init__(self, store, batch_size=100, flush_interval=2.0, max_queue=10000):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+
+    def record(self, record):
+        """Never blocks the caller: when the queue is full the record is dropped."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.recorded += 1
+        self._start()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-telemetry", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                try:
+                    self.store.write(batch)
+                    with self._lock:
+                        self.written += len(batch)
+                except Exception:
+                    # telemetry is best effort: log and drop the batch
+                    traceback.print_exc()
+                    with self._lock:
+                        self.write_errors += 1
+                        self.dropped += len(batch)
+
+    def read(self, since):
+        self.flush()
+        return self.store.read(since)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "recorded": self.recorded,
+                "written": self.written,
+                "dropped": self.dropped,
+                "write_errors": self.write_errors,
+            }
+
+# ----- reporting -----
+
+WINDOW = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_window(text):
+    """"90", "15m", "24h", "7d" -> seconds. Raises ValueError."""
+    match = WINDOW.match(str(text).lower())
+    if not match:
+        raise ValueError("window must look like 3600, 30m, 24h or 7d")
+    return float(match.group(1)) * UNITS[match.group(2)]
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))]
+
+def _distribution(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 1),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+def summarize(rows):
+    """Per-model latency, time-to-first-token and token distributions."""
+
+    by_model = {}
+    for row in rows:
+        by_model.setdefault(row["model"], []).append(row)
+
+    report = {}
+    for model, calls in sorted(by_model.items()):
+        outcomes, reasons = {}, {}
+        for call in calls:
+            outcomes[call["outcome"]] = outcomes.get(call["outcome"], 0) + 1
+            reasons[call["reason"]] = reasons.get(call["reason"], 0) + 1
+        ok = [c for c in calls if c["outcome"] == "ok"]
+        report[model] = {
+            "calls": len(calls),
+            "error_rate": round(1 - len(ok) / len(calls), 4),
+            "outcomes": outcomes,
+            "reasons": reasons,
+            "latency_ms": _distribution([c["latency_ms"] for c in ok]),
+            "ttft_ms": _distribution([c["ttft_ms"] for c in ok]),
+            "prompt_tokens": _distribution([c["prompt_tokens"] for c in calls]),
+            "completion_tokens": _distribution([c["completion_tokens"] for c in ok]),
+            "prompt_chars": _distribution([c["prompt_chars"] for c in calls]),
+        }
+    return report
+
+# ----- configuration -----
+
+def store_from_env(get_connection=None):
+    """LLM_TELEMETRY=memory (default) | jsonl | mysql | off."""
+
+    kind = os.getenv("LLM_TELEMETRY", "memory").lower()
+    if kind == "off":
+        return None
+    if kind == "jsonl":
+        return JSONLTelemetryStore(os.getenv("LLM_TELEMETRY_PATH", "llm_calls.jsonl"))
+    if kind == "mysql":
+        return MySQLTelemetryStore(get_connection)
+    return MemoryTelemetryStore(int(os.getenv("LLM_TELEMETRY_MEMORY_ROWS", 10000)))
+
+def writer_from_env(get_connection=None):
+    store = store_from_env(get_connection)
+    if store is None:
+        return None
+    writer = TelemetryWriter(
+        store,
+        batch_size=int(os.getenv("LLM_TELEMETRY_BATCH", 100)),
+        flush_interval=float(os.getenv("LLM_TELEMETRY_FLUSH_INTERVAL", 2)),
+        max_queue=int(os.getenv("LLM_TELEMETRY_MAX_QUEUE", 10000))
+    )
+    atexit.register(writer.flush)
+    return writer
+
+def main(argv):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Per-model LLM latency and token report")
+    parser.add_argument("--window", default="24h")
+    parser.add_argument("--store", choices=["mysql", "jsonl"], default="mysql")
+    parser.add_argument("--path", default=os.getenv("LLM_TELEMETRY_PATH", "llm_calls.jsonl"))
+    args = parser.parse_args(argv)
+
+    if args.store == "jsonl":
+        store = JSONLTelemetryStore(args.path)
+    else:
+        from db_pool import connect_from_env
+        store = MySQLTelemetryStore(connect_from_env)
+
+    window = parse_window(args.window)
+    print(json.dumps({
+        "window_seconds": window,
+        "models": summarize(store.read(time.time() - window))
+    }, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
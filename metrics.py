@@ -0,0 +1,306 @@
+import atexit, json, os, threading, time, traceback
+from contextlib import contextmanager
+from flask import g, has_request_context, request, Response
+from flask.json.provider import DefaultJSONProvider
+
+# ================= Request Metrics =================
+# Routes time named phases (db_connect, history_select, llm, ...). Every
+# response gets a Server-Timing header, and per-route latency histograms,
+# phase histograms and error counters are served at /metrics in the
+# Prometheus text format.
+#
+# Gunicorn workers are separate processes. With METRICS_DIR set, each
+# worker periodically writes its counters to <METRICS_DIR>/<pid>.json and
+# /metrics sums every file, so any worker can answer the scrape. Empty the
+# directory when the service (re)starts.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Registry:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.counters = {}      # (name, labels) -> value
+        self.histograms = {}    # (name, labels) -> [bucket counts..., sum, count]
+        self.help = {}
+        self.collectors = []    # callables returning [(name, labels, value)] gauges
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, labels, value=1, help=""):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.help.setdefault(name, help)
+
+    def observe(self, name, labels, seconds, help=""):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [0] * (len(self.buckets) + 2)
+                self.help.setdefault(name, help)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+
+    def add_collector(self, collect):
+        self.collectors.append(collect)
+
+    def snapshot(self):
+        gauges = []
+        for collect in self.collectors:
+            try:
+                gauges += [[name, sorted(labels.items()), value] for name, labels, value in collect()]
+            except Exception:
+                traceback.print_exc()
+        with self._lock:
+            return {
+                "counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+                "histograms": [[n, list(l), list(h)] for (n, l), h in self.histograms.items()],
+                "gauges": gauges,
+                "help": dict(self.help),
+            }
+
+
+def merge(snapshots):
+    """Sum counters, histograms and gauges from several worker snapshots."""
+
+    counters, histograms, gauges, help = {}, {}, {}, {}
+    for snap in snapshots:
+        help.update(snap.get("help", {}))
+        for name, labels, value in snap.get("counters", []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, hist in snap.get("histograms", []):
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], hist)]
+            else:
+                histograms[key] = list(hist)
+        for name, labels, value in snap.get("gauges", []):
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+    return counters, histograms, gauges, help
+
+
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def render(counters, histograms, gauges, help, buckets=BUCKETS):
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if help.get(name):
+                lines.append(f"# HELP {name} {help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+    for (name, labels), hist in sorted(histograms.items()):
+        header(name, "histogram")
+        for bound, count in zip(buckets, hist):
+            lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {hist[-1]}")
+        lines.append(f"{name}_sum{_labels(labels)} {round(hist[-2], 6)}")
+        lines.append(f"{name}_count{_labels(labels)} {hist[-1]}")
+
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge")
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ----- per-request phases -----
+
+@contextmanager
+def phase(name):
+    """Time a block as a named phase of the current request (no-op outside one)."""
+    if not has_request_context() or "phases" not in g:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - start)
+
+def record_phase(name, seconds):
+    if has_request_context() and "phases" in g:
+        g.phases[name] = g.phases.get(name, 0.0) + seconds
+
+def server_timing(phases, total):
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in phases.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+# ----- cross-worker files -----
+# Each worker rewrites <pid>.json at least every interval, idle or not.
+# Files of workers that exited, or stopped writing for STALE_INTERVALS,
+# are deleted on read so restarted workers are not summed twice.
+
+STALE_INTERVALS = 5
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class SnapshotWriter:
+
+    def __init__(self, directory, interval=1.0):
+        self.directory = directory
+        self.interval = interval
+        self._last = 0.0
+        self._lock = threading.Lock()
+        self._pid = None                # process the refresh thread runs in
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self):
+        return os.path.join(self.directory, f"{os.getpid()}.json")
+
+    def _start(self):
+        # started lazily: threads do not survive gunicorn's fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._refresh, name="metrics-snapshot", daemon=True).start()
+                atexit.register(self.remove)
+
+    def _refresh(self):
+        while True:
+            time.sleep(self.interval)
+            if not os.path.isdir(self.directory):
+                return
+            self.maybe_write(force=True)
+
+    def remove(self):
+        """Drop this worker's file; called at exit."""
+        try:
+            os.remove(self._path())
+        except OSError:
+            pass
+
+    def maybe_write(self, force=False):
+        self._start()
+        now = time.monotonic()
+        if not force and now - self._last < self.interval:
+            return
+        with self._lock:
+            self._last = now
+            path = self._path()
+            tmp = path + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(registry.snapshot(), f)
+                os.replace(tmp, path)
+            except Exception:
+                traceback.print_exc()
+
+    def read_all(self):
+        snapshots = []
+        stale_before = time.time() - STALE_INTERVALS * self.interval
+        for entry in os.listdir(self.directory):
+            if not entry.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, entry)
+            try:
+                pid = int(entry[:-len(".json")])
+                if not pid_alive(pid) or os.path.getmtime(path) < stale_before:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+# ----- Flask wiring -----
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify() with its work recorded as the "serialize" phase."""
+
+    def response(self, *args, **kwargs):
+        with phase("serialize"):
+            return super().response(*args, **kwargs)
+
+def init_app(app):
+
+    directory = os.getenv("METRICS_DIR")
+    writer = SnapshotWriter(directory, float(os.getenv("METRICS_FLUSH_INTERVAL", 1))) if directory else None
+    slow_ms = float(os.getenv("SLOW_REQUEST_MS", 0))
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_timer():
+        g.phases = {}
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def finish_timer(response):
+        if "request_start" not in g:
+            return response
+
+        total = time.perf_counter() - g.request_start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        labels = {"route": route, "method": request.method}
+
+        response.headers["Server-Timing"] = server_timing(g.phases, total)
+
+        registry.inc("http_requests_total", dict(labels, status=str(response.status_code)),
+                     help="Requests by route, method and status")
+        registry.observe("http_request_duration_seconds", labels, total,
+                         help="Time until the response (headers for streams) was ready")
+        for name, seconds in g.phases.items():
+            registry.observe("http_request_phase_seconds", dict(labels, phase=name), seconds,
+                             help="Time spent in named phases of a request")
+        if response.status_code >= 500:
+            registry.inc("http_request_errors_total", dict(labels, status=str(response.status_code)),
+                         help="Responses with a 5xx status")
+
+        if slow_ms and total * 1000 >= slow_ms:
+            print("Slow request:", json.dumps({
+                "route": route, "method": request.method, "status": response.status_code,
+                "total_ms": round(total * 1000, 1),
+                "phases_ms": {k: round(v * 1000, 1) for k, v in g.phases.items()},
+            }))
+
+        if writer:
+            writer.maybe_write()
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        if writer:
+            writer.maybe_write(force=True)
+            snapshots = writer.read_all()
+        else:
+            snapshots = [registry.snapshot()]
+        body = render(*merge(snapshots), buckets=registry.buckets)
+        return Response(body, mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,253 @@
+import sys, traceback
+from dotenv import load_dotenv
+
+# ================= Schema Migrations =================
+# Each migration runs once and is recorded in schema_migrations. Steps are
+# also written to be harmless on databases that were set up by hand from
+# the README (CREATE ... IF NOT EXISTS, indexes checked before adding).
+#
+# Run at deploy time:   python migrations.py
+# Show applied state:   python migrations.py --status
+
+def table_exists(cursor, table):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema=DATABASE() AND table_name=%s",
+        (table,)
+    )
+    return cursor.fetchone()[0] > 0
+
+def index_exists(cursor, table, name):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema=DATABASE() AND table_name=%s AND index_name=%s
+        """,
+        (table, name)
+    )
+    return cursor.fetchone()[0] > 0
+
+def column_exists(cursor, table, column):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema=DATABASE() AND table_name=%s AND column_name=%s
+        """,
+        (table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+def add_index(cursor, table, name, columns):
+    if not index_exists(cursor, table, name):
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+
+# ----- migrations -----
+
+def m001_base_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INT NOT NULL AUTO_INCREMENT,
+            username VARCHAR(80) NOT NULL UNIQUE,
+            name VARCHAR(120),
+            password VARCHAR(120) NOT NULL,
+            PRIMARY KEY (id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS history (
+            id INT NOT NULL AUTO_INCREMENT,
+            username VARCHAR(80) NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            timestamp INT NOT NULL,
+            PRIMARY KEY (id),
+            INDEX (username)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ai_history (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(100),
+            user_prompt TEXT,
+            ai_response LONGTEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def m002_history_indexes(cursor):
+    # last-3-titles lookup: WHERE username=? ORDER BY timestamp DESC LIMIT 3
+    add_index(cursor, "history", "idx_history_username_timestamp", "username, timestamp")
+    # history reads: WHERE username=? ORDER BY created_at DESC, id DESC
+    add_index(cursor, "ai_history", "idx_ai_history_username_created", "username, created_at, id")
+
+def m003_jobs_and_cache(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ai_jobs (
+            job_id CHAR(32) NOT NULL,
+            username VARCHAR(100),
+            status VARCHAR(16) NOT NULL,
+            result LONGTEXT,
+            error TEXT,
+            created_at DOUBLE NOT NULL,
+            updated_at DOUBLE NOT NULL,
+            expires_at DOUBLE NOT NULL,
+            PRIMARY KEY (job_id),
+            INDEX (expires_at)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            cache_key CHAR(64) NOT NULL,
+            response LONGTEXT NOT NULL,
+            expires_at DOUBLE NOT NULL,
+            PRIMARY KEY (cache_key),
+            INDEX (expires_at)
+        )
+    """)
+
+def m004_compact_ai_history(cursor):
+    # AI_HISTORY_STORAGE=compact: template reference + compressed response
+    if not column_exists(cursor, "ai_history", "prompt_template"):
+        cursor.execute("ALTER TABLE ai_history ADD COLUMN prompt_template SMALLINT NULL")
+    if not column_exists(cursor, "ai_history", "prompt_params"):
+        cursor.execute("ALTER TABLE ai_history ADD COLUMN prompt_params TEXT NULL")
+    if not column_exists(cursor, "ai_history", "response_z"):
+        cursor.execute("ALTER TABLE ai_history ADD COLUMN response_z LONGBLOB NULL")
+
+def m005_ai_tasks(cursor):
+    # tasks parsed from each ai_history response at write time
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ai_tasks (
+            id INT NOT NULL AUTO_INCREMENT,
+            ai_history_id INT NOT NULL,
+            username VARCHAR(100) NOT NULL,
+            position TINYINT NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            description TEXT,
+            tips TEXT,
+            PRIMARY KEY (id),
+            INDEX idx_ai_tasks_history (ai_history_id, position),
+            INDEX idx_ai_tasks_username (username)
+        )
+    """)
+
+def m006_llm_calls(cursor):
+    # one row per model call, written in batches by llm_telemetry
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_calls (
+            id BIGINT NOT NULL AUTO_INCREMENT,
+            created_at DOUBLE NOT NULL,
+            model VARCHAR(255) NOT NULL,
+            kind VARCHAR(16) NOT NULL,
+            reason VARCHAR(16),
+            outcome VARCHAR(16) NOT NULL,
+            error VARCHAR(500),
+            prompt_chars INT,
+            prompt_tokens INT,
+            completion_tokens INT,
+            ttft_ms DOUBLE,
+            latency_ms DOUBLE NOT NULL,
+            PRIMARY KEY (id),
+            INDEX idx_llm_calls_created (created_at)
+        )
+    """)
+
+def m007_ai_tasks_fulltext(cursor):
+    # /api/ai-history/<username>/search; InnoDB rebuilds the table for its
+    # first FULLTEXT index, so run this off-peak on large tables
+    if not index_exists(cursor, "ai_tasks", "ft_ai_tasks_text"):
+        cursor.execute("CREATE FULLTEXT INDEX ft_ai_tasks_text ON ai_tasks (title, description, tips)")
+
+def m008_retention_indexes(cursor):
+    # retention.py age-based pruning: WHERE <time> < ? ORDER BY <time>, id
+    add_index(cursor, "ai_history", "idx_ai_history_created", "created_at, id")
+    add_index(cursor, "history", "idx_history_timestamp", "timestamp")
+
+MIGRATIONS = [
+    (1, "base tables", m001_base_tables),
+    (2, "indexes for per-user history queries", m002_history_indexes),
+    (3, "ai_jobs and ai_cache tables", m003_jobs_and_cache),
+    (4, "compact ai_history storage columns", m004_compact_ai_history),
+    (5, "ai_tasks table", m005_ai_tasks),
+    (6, "llm_calls telemetry table", m006_llm_calls),
+    (7, "ai_tasks fulltext index", m007_ai_tasks_fulltext),
+    (8, "indexes for retention pruning", m008_retention_indexes),
+]
+
+# ----- runner -----
+
+def ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (version)
+        )
+    """)
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+def migrate(conn, migrations=MIGRATIONS, log=print):
+    """Apply pending migrations in order. Returns the versions applied."""
+
+    cursor = conn.cursor()
+    done = []
+
+    try:
+        ensure_version_table(cursor)
+        applied = applied_versions(cursor)
+
+        for version, name, step in migrations:
+            if version in applied:
+                continue
+            log(f"Applying migration {version}: {name}")
+            # MySQL commits DDL implicitly, so each step is recorded as soon
+            # as it finishes; a failed step is retried on the next run.
+            step(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version,name) VALUES (%s,%s)",
+                (version, name)
+            )
+            conn.commit()
+            done.append(version)
+
+        return done
+
+    finally:
+        cursor.close()
+
+def status(conn, migrations=MIGRATIONS):
+    cursor = conn.cursor()
+    try:
+        ensure_version_table(cursor)
+        applied = applied_versions(cursor)
+    finally:
+        cursor.close()
+    return [(version, name, version in applied) for version, name, _ in migrations]
+
+def main(argv):
+    from db_pool import connect_from_env
+
+    load_dotenv()
+    conn = connect_from_env()
+
+    try:
+        if "--status" in argv:
+            for version, name, applied in status(conn):
+                print(f"{version:>4}  {'applied' if applied else 'pending':8} {name}")
+            return 0
+
+        done = migrate(conn)
+        print(f"Applied {len(done)} migration(s)" if done else "Schema is up to date")
+        return 0
+
+    except Exception:
+        traceback.print_exc()
+        return 1
+
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
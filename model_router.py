@@ -0,0 +1,368 @@
+import threading, time, traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# ================= Model Router =================
+# Tries models in order under one deadline. A slow primary is hedged:
+# once it has been running longer than its usual latency percentile the
+# next model is started too, and the first good answer wins.
+
+QUEUED_POLL = 0.05   # seconds between checks while an attempt waits for a worker
+
+class ModelUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open after cooldown."""
+
+    def __init__(self, threshold=3, cooldown=60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def _passes(self, now):
+        state = self.state
+        if state == "closed":
+            return True
+        # a single trial request at a time; a trial that is never reported
+        # back frees up again after another cooldown
+        return state == "half-open" and (self._probe_at is None or now - self._probe_at >= self.cooldown)
+
+    def might_allow(self):
+        """allow() without spending a half-open breaker's trial."""
+        with self._lock:
+            return self._passes(time.monotonic())
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            if not self._passes(now):
+                return False
+            if self.state == "half-open":
+                self._probe_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probe_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._probe_at = None
+
+
+class ModelStats:
+
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.successes = 0
+        self.errors = 0
+        self.hedges = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok, error=None):
+        with self._lock:
+            if ok:
+                self.successes += 1
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+                self.last_error = error
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self):
+        return {
+            "successes": self.successes,
+            "errors": self.errors,
+            "hedges": self.hedges,
+            "samples": len(self.latencies),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "last_error": self.last_error,
+        }
+
+
+class Candidates:
+    """Models whose breaker lets a request through, in configured order.
+
+    allow() runs only when the next model is taken, so a half-open
+    breaker spends its trial on a model that actually gets called;
+    has_next() looks ahead without spending it.
+    """
+
+    def __init__(self, models, breakers):
+        self.models = models
+        self.breakers = breakers
+        self._pos = 0
+        self._taken = False
+        self._fallback = None   # every breaker was open: try them all
+
+    def has_next(self):
+        if self._fallback is not None:
+            return bool(self._fallback)
+        if not self._taken:
+            return True
+        return any(self.breakers[m].might_allow() for m in self.models[self._pos:])
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._fallback is None:
+            while self._pos < len(self.models):
+                model = self.models[self._pos]
+                self._pos += 1
+                if self.breakers[model].allow():
+                    self._taken = True
+                    return model
+            if self._taken:
+                raise StopIteration
+            self._fallback = list(self.models)
+        if not self._fallback:
+            raise StopIteration
+        return self._fallback.pop(0)
+
+
+class _Started:
+    """When an attempt actually began running (it may wait for a worker first)."""
+
+    def __init__(self):
+        self.at = None
+
+    def mark(self):
+        self.at = time.monotonic()
+
+
+class ModelRouter:
+
+    def __init__(self, call, models, deadline=60.0, hedge_percentile=95,
+                 hedge_min_delay=2.0, hedge_default_delay=10.0, min_samples=5,
+                 breaker_threshold=3, breaker_cooldown=60.0, max_workers=8):
+        self.call = call                    # call(prompt, model, timeout, reason) -> str
+        self.models = list(models)
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.min_samples = min_samples
+
+        self.breakers = {m: CircuitBreaker(breaker_threshold, breaker_cooldown) for m in self.models}
+        self.stats = {m: ModelStats() for m in self.models}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-router")
+
+    def candidates(self):
+        """Models to try, in order (see Candidates); every breaker open means try them all."""
+        return Candidates(self.models, self.breakers)
+
+    def record(self, model, latency, ok, error=None):
+        self.stats[model].record(latency, ok, error)
+        if ok:
+            self.breakers[model].record_success()
+        else:
+            self.breakers[model].record_failure()
+
+    def hedge_delay(self, model):
+        stats = self.stats[model]
+        if len(stats.latencies) < self.min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, stats.percentile(self.hedge_percentile))
+
+    def _attempt(self, prompt, model, timeout, reason, started=None):
+        start = time.monotonic()
+        if started is not None:
+            started.mark()
+        try:
+            response = self.call(prompt, model, timeout, reason)
+            if not response:
+                raise ValueError("empty response")
+        except Exception as e:
+            self.record(model, time.monotonic() - start, False, f"{type(e).__name__}: {e}")
+            raise
+        self.record(model, time.monotonic() - start, True)
+        return response
+
+    def generate(self, prompt, deadline=None):
+        """Return (response, model) from the first model to answer well."""
+
+        budget = deadline or self.deadline
+        deadline_at = time.monotonic() + budget
+        queue = self.candidates()
+        running = {}
+        errors = []
+
+        def launch(reason, current=None, started=None):
+            # the next model is taken only now, when it is really called
+            model = next(queue, None)
+            if model is None:
+                return current, started
+            timeout = max(0.1, deadline_at - time.monotonic())
+            started = _Started()
+            running[self._executor.submit(self._attempt, prompt, model, timeout, reason, started)] = model
+            return model, started
+
+        current, started = launch("primary")
+
+        try:
+            while running:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                if not queue.has_next():
+                    hedge_in = wait_for = remaining
+                elif started.at is None:
+                    # The hedge clock starts when the attempt runs, not while
+                    # it waits for a worker thread
+                    hedge_in, wait_for = remaining, min(remaining, QUEUED_POLL)
+                else:
+                    hedge_in = self.hedge_delay(current) - (time.monotonic() - started.at)
+                    wait_for = max(0, min(hedge_in, remaining))
+
+                done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    if queue.has_next() and hedge_in < remaining:
+                        print("Hedging slow model:", current)
+                        self.stats[current].hedges += 1
+                        current, started = launch("hedge", current, started)
+                    continue
+
+                for future in done:
+                    model = running.pop(future)
+                    try:
+                        return future.result(), model
+                    except Exception as e:
+                        print("Fallback model used:", e)
+                        errors.append(f"{model}: {e}")
+
+                if not running and queue.has_next():
+                    current, started = launch("fallback", current, started)
+        finally:
+            # losers and attempts past the deadline that have not started yet
+            # never take a worker; running ones finish with their own timeout
+            for future in running:
+                future.cancel()
+
+        if running:
+            raise ModelUnavailable(f"No model answered within {budget}s")
+        raise ModelUnavailable("All models failed: " + "; ".join(errors))
+
+    # ----- asyncio -----
+    # The same routing for the async serving mode: acall(prompt, model,
+    # timeout, reason) is a coroutine function, attempts are tasks on the
+    # running loop, and stats and breakers are shared with generate().
+    # asyncio is imported where it is used: the sync app never loads it.
+
+    async def _aattempt(self, acall, prompt, model, timeout, reason):
+        import asyncio
+        start = time.monotonic()
+        try:
+            response = await acall(prompt, model, timeout, reason)
+            if not response:
+                raise ValueError("empty response")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.record(model, time.monotonic() - start, False, f"{type(e).__name__}: {e}")
+            raise
+        self.record(model, time.monotonic() - start, True)
+        return response
+
+    async def agenerate(self, prompt, acall, deadline=None):
+        """generate() for asyncio. Losing and timed-out attempts are cancelled."""
+        import asyncio
+
+        budget = deadline or self.deadline
+        deadline_at = time.monotonic() + budget
+        queue = self.candidates()
+        running = {}
+        errors = []
+
+        def launch(reason, current=None, started_at=None):
+            # the next model is taken only now, when it is really called
+            model = next(queue, None)
+            if model is None:
+                return current, started_at
+            timeout = max(0.1, deadline_at - time.monotonic())
+            task = asyncio.ensure_future(self._aattempt(acall, prompt, model, timeout, reason))
+            running[task] = model
+            return model, time.monotonic()
+
+        current, started_at = launch("primary")
+
+        try:
+            while running:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                if queue.has_next():
+                    # tasks start at once, so the hedge clock runs from launch
+                    hedge_in = self.hedge_delay(current) - (time.monotonic() - started_at)
+                else:
+                    hedge_in = remaining
+                done, _ = await asyncio.wait(list(running), timeout=max(0, min(hedge_in, remaining)),
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if queue.has_next() and hedge_in < remaining:
+                        print("Hedging slow model:", current)
+                        self.stats[current].hedges += 1
+                        current, started_at = launch("hedge", current, started_at)
+                    continue
+
+                for task in done:
+                    model = running.pop(task)
+                    try:
+                        return task.result(), model
+                    except Exception as e:
+                        print("Fallback model used:", e)
+                        errors.append(f"{model}: {e}")
+
+                if not running and queue.has_next():
+                    current, started_at = launch("fallback", current, started_at)
+        finally:
+            for task in running:
+                task.cancel()
+
+        if running:
+            raise ModelUnavailable(f"No model answered within {budget}s")
+        raise ModelUnavailable("All models failed: " + "; ".join(errors))
+
+    def snapshot(self):
+        return {
+            m: dict(self.stats[m].snapshot(), breaker=self.breakers[m].state)
+            for m in self.models
+        }
+
+    def shutdown(self):
+        try:
+            self._executor.shutdown(wait=False)
+        except Exception:
+            traceback.print_exc()
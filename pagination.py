@@ -0,0 +1,58 @@
+import base64, json
+from datetime import datetime
+
+# ================= Keyset Pagination =================
+# Cursors are opaque to clients: base64 of the (sort key, id) of the
+# last row on the page. The next page continues strictly after it, so
+# no OFFSET scan is needed however deep the client pages.
+
+def encode_cursor(sort_value, row_id):
+    is_datetime = isinstance(sort_value, datetime)
+    if is_datetime:
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id, is_datetime]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id, is_datetime = json.loads(base64.urlsafe_b64decode(padded))
+        if is_datetime:
+            sort_value = datetime.fromisoformat(sort_value)
+        elif not isinstance(sort_value, (int, float)):
+            raise ValueError
+        return sort_value, int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def parse_page_args(args, allowed_fields, default_fields, default_limit=0, max_limit=100):
+    """Read limit/cursor/fields query args. Raises ValueError on bad input.
+
+    A limit of 0 means unpaginated, which keeps old clients working.
+    """
+
+    limit = args.get("limit", default_limit)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if limit < 0:
+        raise ValueError("limit must be positive")
+
+    cursor = args.get("cursor")
+    if cursor:
+        cursor = decode_cursor(cursor)
+        if not limit:
+            limit = max_limit
+    limit = min(limit, max_limit) if limit else 0
+
+    fields = args.get("fields")
+    if fields:
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in fields if f not in allowed_fields]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    else:
+        fields = list(default_fields)
+
+    return limit, cursor, fields
@@ -0,0 +1,94 @@
+import re
+
+# ================= Prompt Templates =================
+# Templates are versioned so stored history can reference the template it
+# was built from instead of repeating the full text. Never edit a released
+# version in place: add a new one and bump CURRENT_VERSION.
+
+FIELDS = ['name','age','domain','time_available','topic','context','recent_history_summary']
+
+TEMPLATE_V1 = """
+I'm {name}, a {age}-year-old {domain}.
+
+I have {time_available} available to learn about {topic}.
+
+Context: {context}
+
+Previously learned:
+{recent_history_summary}
+
+Generate EXACTLY 3 learning micro-tasks.
+
+STRICT FORMAT:
+
+### Task 1 – <Title>
+
+**Detailed Description**
+Write 4–6 sentences explaining the task clearly.
+
+**Small Tips**
+- Tip 1
+- Tip 2
+- Tip 3
+
+---
+
+### Task 2 – <Title>
+
+**Detailed Description**
+Write 4–6 sentences explaining the task clearly.
+
+**Small Tips**
+- Tip 1
+- Tip 2
+- Tip 3
+
+---
+
+### Task 3 – <Title>
+
+**Detailed Description**
+Write 4–6 sentences explaining the task clearly.
+
+**Small Tips**
+- Tip 1
+- Tip 2
+- Tip 3
+
+Rules:
+- Use headings exactly like above
+- Use bullet points
+- Do not add extra sections
+"""
+
+TEMPLATES = {
+    1: TEMPLATE_V1,
+}
+
+CURRENT_VERSION = 1
+
+def render(version, params):
+    return TEMPLATES[version].format(**{f: params[f] for f in FIELDS})
+
+def _pattern(template):
+    parts = re.split(r"\{(\w+)\}", template)
+    regex = ""
+    for i, part in enumerate(parts):
+        regex += re.escape(part) if i % 2 == 0 else f"(?P<{part}>.*?)"
+    return re.compile(regex + r"\Z", re.DOTALL)
+
+_PATTERNS = {version: _pattern(t) for version, t in TEMPLATES.items()}
+
+def parse(prompt):
+    """Find the template and parameters a stored prompt was rendered from.
+
+    Returns (version, params), or None when no template reproduces the
+    prompt exactly.
+    """
+    for version, pattern in _PATTERNS.items():
+        match = pattern.match(prompt)
+        if match:
+            params = match.groupdict()
+            if render(version, params) == prompt:
+                return version, params
+    return None
@@ -0,0 +1,170 @@
+import hashlib, json, threading, time, traceback
+from collections import OrderedDict, deque
+
+# ================= Recent Titles Cache =================
+# The prompt's "previously studied" block is a user's last few task
+# titles. They are kept per user, newest first, in a small ring buffer
+# inside an LRU map: filled from the history table on a miss, extended
+# when a generation is saved and dropped when the history is cleared.
+#
+# Without a shared store every worker has its own copy, so writes made by
+# another worker show up only after `ttl`. With a shared store (the
+# ai_cache SQLite file or MySQL table) workers read and update one copy
+# and the in-process tier is skipped. Appends to the shared copy are a
+# compare-and-set on the row read, retried a few times; a worker that
+# keeps losing the race drops the entry so the next read refills it.
+
+class RecentTitlesCache:
+
+    CAS_RETRIES = 3
+
+    def __init__(self, size=3, max_users=10000, ttl=300, shared=None):
+        self.size = size
+        self.max_users = max_users
+        self.ttl = ttl
+        self.shared = shared
+
+        self._users = OrderedDict()     # username -> (deque of titles, expires_at)
+        self._epoch = 0                 # bumped on every write or invalidation
+        self._changed = OrderedDict()   # username -> epoch of its last change
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.stale_fills = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @staticmethod
+    def _shared_key(username):
+        return hashlib.sha256(f"recent_titles|{username}".encode("utf-8")).hexdigest()
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    # ----- shared tier -----
+
+    def _shared_row(self, username):
+        try:
+            return self.shared.get(self._shared_key(username))
+        except Exception:
+            traceback.print_exc()
+            self._count('errors')
+            return None
+
+    def _shared_get(self, username):
+        row = self._shared_row(username)
+        return json.loads(row[0]) if row else None
+
+    def _shared_set(self, username, titles, expires_at):
+        try:
+            self.shared.set(self._shared_key(username), json.dumps(titles), expires_at)
+        except Exception:
+            traceback.print_exc()
+            self._count('errors')
+
+    # ----- reads -----
+
+    def get(self, username):
+        """Newest-first titles, or None when the database has to be asked."""
+
+        if self.shared is not None:
+            titles = self._shared_get(username)
+        else:
+            with self._lock:
+                entry = self._users.get(username)
+                if entry is not None and entry[1] <= time.time():
+                    del self._users[username]
+                    entry = None
+                if entry is not None:
+                    self._users.move_to_end(username)
+                titles = list(entry[0]) if entry is not None else None
+
+        self._count('misses' if titles is None else 'hits')
+        return titles
+
+    def version(self):
+        """Take before reading the database; fill() is ignored if the user changed since."""
+        with self._lock:
+            return self._epoch
+
+    def fill(self, username, titles, version):
+        with self._lock:
+            if self._changed.get(username, -1) > version:
+                self.stale_fills += 1
+                return
+            self.fills += 1
+            if self.shared is None:
+                self._store(username, titles)
+        if self.shared is not None:
+            self._shared_set(username, titles[:self.size], time.time() + self.ttl)
+
+    # ----- writes -----
+
+    def _store(self, username, titles):
+        self._users[username] = (deque(titles[:self.size], maxlen=self.size), time.time() + self.ttl)
+        self._users.move_to_end(username)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def _mark_changed(self, username):
+        self._epoch += 1
+        self._changed[username] = self._epoch
+        self._changed.move_to_end(username)
+        while len(self._changed) > self.max_users:
+            self._changed.popitem(last=False)
+
+    def add(self, username, titles):
+        """Record titles saved in this order (the last one is the newest)."""
+
+        with self._lock:
+            self._mark_changed(username)
+            entry = self._users.get(username)
+            # a user we never read stays uncached; the next read fills it
+            if entry is not None:
+                for title in titles:
+                    entry[0].appendleft(title)
+
+        if self.shared is None:
+            return
+        # another worker may append between our read and write; only write
+        # over the row we read
+        for _ in range(self.CAS_RETRIES):
+            row = self._shared_row(username)
+            if row is None:
+                return
+            merged = (list(reversed(titles)) + json.loads(row[0]))[:self.size]
+            try:
+                if self.shared.replace(self._shared_key(username), row, json.dumps(merged),
+                                       time.time() + self.ttl):
+                    return
+            except Exception:
+                traceback.print_exc()
+                self._count('errors')
+                break
+        self._shared_set(username, [], 0)
+
+    def invalidate(self, username):
+        with self._lock:
+            self._mark_changed(username)
+            self._users.pop(username, None)
+            self.invalidations += 1
+        if self.shared is not None:
+            self._shared_set(username, [], 0)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._users),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "fills": self.fills,
+                "stale_fills": self.stale_fills,
+                "invalidations": self.invalidations,
+                "errors": self.errors,
+                "shared": self.shared is not None,
+            }
@@ -0,0 +1,469 @@
+import argparse, gzip, json, os, sys, threading, time, traceback
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+import history_storage
+
+# ================= Retention =================
+# ai_history and history are pruned per table by age (RETENTION_<TABLE>_DAYS)
+# and/or by a per-user row cap (RETENTION_<TABLE>_MAX_ROWS). Deletes run in
+# batches of RETENTION_BATCH rows, each in its own short transaction with a
+# pause in between, so no run holds locks for long. ai_tasks rows go with
+# their ai_history row.
+#
+# With RETENTION_ARCHIVE_DIR set, every batch is first appended to
+# <dir>/<table>-<UTC time>-<pid>.ndjson.gz (flushed and fsynced) and only
+# then deleted. Archived ai_history rows hold the plain prompt and answer
+# even in compact storage; tasks can be re-parsed from the answer.
+#
+# A MySQL named lock keeps runs from overlapping, so every gunicorn worker
+# may run the background pruner (RETENTION_INTERVAL) or cron the CLI:
+#
+#   python retention.py prune [--dry-run]
+#   python retention.py partition [--months-ahead 3]   # optional, see below
+#
+# Partitioning (optional, not a migration because it rebuilds ai_history):
+# monthly RANGE partitions on created_at. The primary key becomes
+# (id, created_at) as MySQL requires. Age-based pruning then drops whole
+# expired partitions instead of deleting their rows, unless archiving is on.
+
+LOCK_NAME = "smartfreetime_retention"
+
+# table -> (time column, column holds epoch seconds, [(child table, foreign key)])
+TABLES = {
+    "ai_history": ("created_at", False, [("ai_tasks", "ai_history_id")]),
+    "history": ("timestamp", True, []),
+}
+
+
+def policies_from_env():
+    """table -> (max age in days or 0, max rows per user or 0), for tables with a limit."""
+    policies = {}
+    for table in TABLES:
+        days = float(os.getenv(f"RETENTION_{table.upper()}_DAYS", 0))
+        max_rows = int(os.getenv(f"RETENTION_{table.upper()}_MAX_ROWS", 0))
+        if days > 0 or max_rows > 0:
+            policies[table] = (days, max_rows)
+    return policies
+
+
+def cutoff_value(table, days, now=None):
+    now = time.time() if now is None else now
+    cutoff = now - days * 86400
+    return int(cutoff) if TABLES[table][1] else datetime.fromtimestamp(cutoff)
+
+
+def _json_default(o):
+    return o.isoformat() if isinstance(o, datetime) else str(o)
+
+
+class Archive:
+    """Gzipped NDJSON files of rows about to be deleted, one per table and run."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._files = {}
+        self.paths = []
+
+    def write(self, table, rows):
+        f = self._files.get(table)
+        if f is None:
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            path = os.path.join(self.directory, f"{table}-{stamp}-{os.getpid()}.ndjson.gz")
+            f = self._files[table] = gzip.open(path, "ab")
+            self.paths.append(path)
+        for row in rows:
+            f.write((json.dumps(row, default=_json_default) + "\n").encode("utf-8"))
+        # on disk before the rows are deleted
+        f.flush()
+        os.fsync(f.fileobj.fileno())
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+# ----- batched deletes -----
+
+def delete_ids(cursor, table, ids):
+    placeholders = ",".join(["%s"] * len(ids))
+    for child, key in TABLES[table][2]:
+        cursor.execute(f"DELETE FROM {child} WHERE {key} IN ({placeholders})", tuple(ids))
+    cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", tuple(ids))
+
+
+def delete_in_batches(conn, table, where, args, batch_size=500, pause=0.05,
+                      archive=None, dry_run=False):
+    """Delete rows of `table` matching `where`, oldest first. Returns the number of rows."""
+
+    time_column = TABLES[table][0]
+    columns = "*" if archive else f"id,{time_column}"
+    cursor = conn.cursor(dictionary=True)
+    deleted = 0
+    last = None
+
+    try:
+        while True:
+            sql = f"SELECT {columns} FROM {table} WHERE {where}"
+            batch_args = list(args)
+            if dry_run and last is not None:
+                # nothing is deleted, so continue after the last row seen
+                sql += f" AND ({time_column} > %s OR ({time_column} = %s AND id > %s))"
+                batch_args += [last[0], last[0], last[1]]
+            sql += f" ORDER BY {time_column}, id LIMIT %s"
+            cursor.execute(sql, tuple(batch_args + [batch_size]))
+            rows = cursor.fetchall()
+            if not rows:
+                return deleted
+
+            if dry_run:
+                deleted += len(rows)
+                last = (rows[-1][time_column], rows[-1]["id"])
+                if len(rows) < batch_size:
+                    return deleted
+                continue
+
+            ids = [row["id"] for row in rows]
+            if archive:
+                if table == "ai_history":
+                    rows = [history_storage.decode(row) for row in rows]
+                archive.write(table, rows)
+            delete_ids(cursor, table, ids)
+            conn.commit()
+
+            deleted += len(ids)
+            if len(rows) < batch_size:
+                return deleted
+            time.sleep(pause)
+    finally:
+        cursor.close()
+
+
+def prune_expired(conn, table, days, now=None, **options):
+    cutoff = cutoff_value(table, days, now)
+    return delete_in_batches(conn, table, f"{TABLES[table][0]} < %s", [cutoff], **options)
+
+
+def prune_over_cap(conn, table, max_rows, **options):
+    """Keep each user's newest `max_rows` rows."""
+
+    time_column = TABLES[table][0]
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT username FROM {table} GROUP BY username HAVING COUNT(*) > %s",
+            (max_rows,)
+        )
+        usernames = [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+    deleted = 0
+    for username in usernames:
+        cursor = conn.cursor()
+        try:
+            # newest row past the cap: it and everything older goes
+            cursor.execute(
+                f"""
+                SELECT {time_column},id FROM {table} WHERE username=%s
+                ORDER BY {time_column} DESC, id DESC LIMIT 1 OFFSET %s
+                """,
+                (username, max_rows)
+            )
+            boundary = cursor.fetchone()
+        finally:
+            cursor.close()
+        if boundary is None:
+            continue
+        deleted += delete_in_batches(
+            conn, table,
+            f"username=%s AND ({time_column} < %s OR ({time_column} = %s AND id <= %s))",
+            [username, boundary[0], boundary[0], boundary[1]],
+            **options
+        )
+    return deleted
+
+
+def delete_user(conn, username, tables=("history", "ai_history"), batch_size=500, pause=0.0):
+    """Everything a user has in `tables`, in batches. Returns {table: rows deleted}."""
+    return {
+        table: delete_in_batches(conn, table, "username=%s", [username],
+                                 batch_size=batch_size, pause=pause)
+        for table in tables
+    }
+
+
+# ----- partitioning -----
+
+def partitions(cursor, table):
+    """[(name, upper bound as epoch seconds or None for MAXVALUE)] of a partitioned table."""
+    cursor.execute(
+        """
+        SELECT partition_name, partition_description FROM information_schema.partitions
+        WHERE table_schema=DATABASE() AND table_name=%s AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+        """,
+        (table,)
+    )
+    return [(name, None if bound == "MAXVALUE" else int(bound)) for name, bound in cursor.fetchall()]
+
+
+def month_starts(first, last):
+    """First day of every month from `first`'s month through `last`'s month."""
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        yield datetime(year, month, 1)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def partition_definitions(months):
+    # partition pYYYYMM holds rows created before the first of the next month
+    parts = []
+    for start in months:
+        nxt = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+        parts.append(f"PARTITION p{start:%Y%m} VALUES LESS THAN (UNIX_TIMESTAMP('{nxt:%Y-%m-%d}'))")
+    parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ", ".join(parts)
+
+
+def partition_ai_history(conn, months_ahead=3, log=print):
+    """Partition ai_history by month, or add partitions up to `months_ahead` months from now."""
+
+    cursor = conn.cursor()
+    try:
+        now = datetime.now()
+        ahead = datetime(now.year + (now.month - 1 + months_ahead) // 12,
+                         (now.month - 1 + months_ahead) % 12 + 1, 1)
+        existing = partitions(cursor, "ai_history")
+
+        if not existing:
+            cursor.execute("SELECT MIN(created_at) FROM ai_history")
+            first = cursor.fetchone()[0] or now
+            log("Partitioning ai_history by month (rebuilds the table)")
+            cursor.execute(
+                "ALTER TABLE ai_history DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at), "
+                "PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) ("
+                + partition_definitions(month_starts(first, ahead)) + ")"
+            )
+            return
+
+        names = {name for name, _ in existing}
+        last = datetime.fromtimestamp(max(bound for _, bound in existing if bound is not None))
+        months = [m for m in month_starts(last, ahead) if f"p{m:%Y%m}" not in names]
+        if not months:
+            log("ai_history partitions are up to date")
+            return
+        log(f"Adding {len(months)} ai_history partition(s)")
+        cursor.execute(
+            "ALTER TABLE ai_history REORGANIZE PARTITION pmax INTO ("
+            + partition_definitions(months) + ")"
+        )
+    finally:
+        cursor.close()
+
+
+def drop_expired_partitions(conn, cutoff, batch_size=500, pause=0.05, log=print):
+    """Drop ai_history partitions whose rows are all older than `cutoff` (epoch seconds)."""
+
+    cursor = conn.cursor()
+    dropped = 0
+    try:
+        for name, bound in partitions(cursor, "ai_history"):
+            if bound is None or bound > cutoff:
+                continue
+            # children first, in batches, then the partition itself
+            last_id = 0
+            while True:
+                cursor.execute(
+                    f"SELECT id FROM ai_history PARTITION ({name}) WHERE id>%s ORDER BY id LIMIT %s",
+                    (last_id, batch_size)
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    break
+                cursor.execute(
+                    f"DELETE FROM ai_tasks WHERE ai_history_id IN ({','.join(['%s'] * len(ids))})",
+                    tuple(ids)
+                )
+                conn.commit()
+                last_id = ids[-1]
+                time.sleep(pause)
+            cursor.execute(f"SELECT COUNT(*) FROM ai_history PARTITION ({name})")
+            count = cursor.fetchone()[0]
+            cursor.execute(f"ALTER TABLE ai_history DROP PARTITION {name}")
+            log(f"Dropped partition {name} ({count} rows)")
+            dropped += count
+        return dropped
+    finally:
+        cursor.close()
+
+
+# ----- runs -----
+
+def acquire_lock(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+        return cursor.fetchone()[0] == 1
+    finally:
+        cursor.close()
+
+
+def release_lock(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def prune(conn, policies, batch_size=500, pause=0.05, archive_dir=None,
+          dry_run=False, now=None, log=print):
+    """Apply every policy once. Returns {table: rows deleted}, or None if another run holds the lock."""
+
+    if not acquire_lock(conn):
+        log("Another retention run is in progress")
+        return None
+
+    archive = Archive(archive_dir) if archive_dir and not dry_run else None
+    options = dict(batch_size=batch_size, pause=pause, archive=archive, dry_run=dry_run)
+    deleted = {}
+
+    try:
+        for table, (days, max_rows) in policies.items():
+            count = 0
+            if days > 0:
+                if table == "ai_history" and archive is None and not dry_run:
+                    cursor = conn.cursor()
+                    try:
+                        partitioned = bool(partitions(cursor, table))
+                    finally:
+                        cursor.close()
+                    if partitioned:
+                        cutoff = int((time.time() if now is None else now) - days * 86400)
+                        count += drop_expired_partitions(conn, cutoff, batch_size, pause, log)
+                count += prune_expired(conn, table, days, now=now, **options)
+            if max_rows > 0:
+                count += prune_over_cap(conn, table, max_rows, **options)
+            deleted[table] = count
+            log(f"{'Would delete' if dry_run else 'Deleted'} {count} {table} rows")
+        return deleted
+
+    finally:
+        if archive:
+            archive.close()
+        release_lock(conn)
+
+
+class RetentionWorker:
+    """Runs prune() every `interval` seconds on a daemon thread."""
+
+    def __init__(self, get_connection, policies, interval, **options):
+        self.get_connection = get_connection
+        self.policies = policies
+        self.interval = interval
+        self.options = options
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.deleted = {}
+        self.last_run = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        conn = None
+        try:
+            conn = self.get_connection()
+            deleted = prune(conn, self.policies, log=lambda msg: None, **self.options)
+        except Exception:
+            traceback.print_exc()
+            with self._lock:
+                self.errors += 1
+            return None
+        finally:
+            if conn is not None:
+                conn.close()
+
+        with self._lock:
+            self.last_run = time.time()
+            if deleted is None:
+                self.skipped += 1
+            else:
+                self.runs += 1
+                for table, count in deleted.items():
+                    self.deleted[table] = self.deleted.get(table, 0) + count
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            return {
+                "policies": {table: {"days": days, "max_rows": rows}
+                             for table, (days, rows) in self.policies.items()},
+                "interval": self.interval,
+                "runs": self.runs,
+                "skipped": self.skipped,
+                "errors": self.errors,
+                "deleted": dict(self.deleted),
+                "last_run": self.last_run,
+            }
+
+
+def options_from_env():
+    return {
+        "batch_size": int(os.getenv("RETENTION_BATCH", 500)),
+        "pause": float(os.getenv("RETENTION_PAUSE_MS", 50)) / 1000,
+        "archive_dir": os.getenv("RETENTION_ARCHIVE_DIR") or None,
+    }
+
+
+def main(argv=None):
+    from db_pool import connect_from_env
+
+    parser = argparse.ArgumentParser(description="Prune, archive and partition history tables")
+    sub = parser.add_subparsers(dest="command", required=True)
+    prune_args = sub.add_parser("prune", help="apply RETENTION_* policies once")
+    prune_args.add_argument("--dry-run", action="store_true", help="count rows without deleting")
+    partition_args = sub.add_parser("partition", help="partition ai_history by month or add partitions")
+    partition_args.add_argument("--months-ahead", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    conn = connect_from_env()
+
+    try:
+        if args.command == "partition":
+            partition_ai_history(conn, args.months_ahead)
+            return 0
+
+        policies = policies_from_env()
+        if not policies:
+            print("No retention policy set (RETENTION_<TABLE>_DAYS / RETENTION_<TABLE>_MAX_ROWS)")
+            return 0
+        return 0 if prune(conn, policies, dry_run=args.dry_run, **options_from_env()) is not None else 1
+
+    except Exception:
+        traceback.print_exc()
+        return 1
+
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,128 @@
+import json, re, sys, traceback
+from dotenv import load_dotenv
+import history_storage
+from task_parser import parse_tasks
+
+# ================= Task Search =================
+# GET /api/ai-history/<username>/search ranks a user's parsed tasks
+# (ai_tasks title, description and tips) with the FULLTEXT index added by
+# migration 7. Queries are reduced to plain words and run in boolean mode
+# as prefixes, so "recurs" finds "recursion" and user input cannot inject
+# boolean operators. Results carry a short snippet, never the stored
+# prompt or response.
+#
+# Index rows written before ai_tasks existed:   python search.py backfill [--batch 500]
+
+MAX_TERMS = 8
+SNIPPET_WIDTH = 160
+
+def search_terms(q):
+    """Lowercase words of a query, deduplicated, at most MAX_TERMS."""
+    terms = []
+    for word in re.findall(r"\w+", (q or "").lower()):
+        if word not in terms:
+            terms.append(word)
+    return terms[:MAX_TERMS]
+
+def boolean_query(terms):
+    # any word may match (ranked by relevance), each as a prefix
+    return " ".join(f"{term}*" for term in terms)
+
+def task_text(task):
+    tips = json.loads(task.get('tips') or "[]")
+    return " ".join([task.get('description') or ""] + tips)
+
+def snippet(text, terms, width=SNIPPET_WIDTH):
+    """About `width` characters of text around the first matching word."""
+
+    text = " ".join(text.split())
+    if len(text) <= width:
+        return text
+
+    match = re.search(r"\b(?:%s)" % "|".join(map(re.escape, terms)), text, re.IGNORECASE) if terms else None
+    start = 0
+    if match and match.start() > width // 3:
+        start = match.start() - width // 3
+        space = text.find(" ", start, match.start())
+        start = space + 1 if space >= 0 else start
+    end = min(len(text), start + width)
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+
+    return ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
+
+# ----- backfill -----
+
+def backfill(conn, batch_size=500, log=print):
+    """Parse tasks for ai_history rows that have none, in id order, one batch per commit."""
+
+    cursor = conn.cursor(dictionary=True)
+    last_id = 0
+    indexed = 0
+
+    try:
+        while True:
+            cursor.execute(
+                """
+                SELECT h.id,h.username,h.ai_response,h.response_z FROM ai_history h
+                WHERE h.id>%s AND NOT EXISTS (SELECT 1 FROM ai_tasks t WHERE t.ai_history_id=h.id)
+                ORDER BY h.id LIMIT %s
+                """,
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            task_rows = []
+            for row in rows:
+                history_storage.decode(row)
+                for i, t in enumerate(parse_tasks(row.get('ai_response') or "")):
+                    task_rows.append((row['id'], row['username'], i, t['title'], t['description'],
+                                      json.dumps(t['tips'])))
+
+            if task_rows:
+                cursor.executemany(
+                    """
+                    INSERT INTO ai_tasks (ai_history_id,username,position,title,description,tips)
+                    VALUES (%s,%s,%s,%s,%s,%s)
+                    """,
+                    task_rows
+                )
+            conn.commit()
+
+            indexed += len(rows)
+            last_id = rows[-1]['id']
+            log(f"Indexed {indexed} rows (up to id {last_id})")
+
+        return indexed
+
+    finally:
+        cursor.close()
+
+def main(argv):
+    from db_pool import connect_from_env
+
+    if not argv or argv[0] != "backfill":
+        print("usage: python search.py backfill [--batch N]")
+        return 2
+
+    batch_size = 500
+    if "--batch" in argv:
+        batch_size = int(argv[argv.index("--batch") + 1])
+
+    load_dotenv()
+    conn = connect_from_env()
+
+    try:
+        print(f"Done, {backfill(conn, batch_size)} rows indexed")
+        return 0
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
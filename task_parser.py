@@ -0,0 +1,98 @@
+import re
+
+# ================= Task Parser =================
+# Single pass over the model output, line by line, for the format the
+# prompt asks for:
+#
+#   ### Task 1 – Title
+#   **Detailed Description**
+#   ...
+#   **Small Tips**
+#   - tip
+#
+# Models drift from it (bold headings, numbered lists, "Tips:" labels,
+# missing sections), so every part is optional and nothing raises.
+
+HEADING = re.compile(
+    r"^\s*(?:\d+[.)]\s*)?(?:#{1,6}\s*)?(?:\*\*)?\s*Task\s*(\d+)\s*[–—:-]\s*(.+)$",
+    re.IGNORECASE
+)
+
+SECTION = re.compile(
+    r"^\s*(#{1,6}\s*)?(\*\*)?\s*(detailed description|description|small tips|tips)\s*(:)?\s*(\*\*)?\s*(:)?\s*(.*)$",
+    re.IGNORECASE
+)
+
+BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.*)$")
+
+SEPARATOR = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$")
+
+MAX_TITLE = 255     # history.title / ai_tasks.title column size
+
+def _clean_title(raw):
+    title = raw.split("**")[0] if raw.count("**") else raw
+    return title.strip().strip("*#").strip()[:MAX_TITLE]
+
+def _section(line):
+    """Return (name, inline_text) if the line is a section label, else None."""
+    match = SECTION.match(line)
+    if not match:
+        return None
+    heading, bold_open, label, colon1, bold_close, colon2, rest = match.groups()
+    # "Tips are handy" is prose, not a label: need markup or a colon
+    if not (heading or (bold_open and bold_close) or colon1 or colon2):
+        return None
+    name = "tips" if "tip" in label.lower() else "description"
+    return name, rest.strip()
+
+def parse_tasks(text):
+    """Return [{"title", "description", "tips"}] in the order they appear."""
+
+    tasks = []
+    current = None
+    section = None
+    description = []
+
+    def finish():
+        if current is not None:
+            current["description"] = " ".join(description).strip()
+            tasks.append(current)
+
+    for line in (text or "").splitlines():
+
+        lowered = line.lower()
+
+        # substring checks keep the regexes off most lines
+        heading = HEADING.match(line) if "task" in lowered else None
+        if heading:
+            title = _clean_title(heading.group(2))
+            if title:
+                finish()
+                current = {"title": title, "description": "", "tips": []}
+                section = "description"
+                description = []
+                continue
+
+        if current is None or not line.strip() or SEPARATOR.match(line):
+            continue
+
+        label = _section(line) if ("tip" in lowered or "description" in lowered) else None
+        if label:
+            section, inline = label
+            line = inline
+            if not line:
+                continue
+
+        if section == "tips":
+            bullet = BULLET.match(line)
+            tip = (bullet.group(1) if bullet else line).strip()
+            if tip:
+                current["tips"].append(tip)
+        else:
+            description.append(line.strip())
+
+    finish()
+    return tasks
+
+def extract_titles(text):
+    return [task["title"] for task in parse_tasks(text)]
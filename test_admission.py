@@ -0,0 +1,131 @@
+import unittest
+from unittest.mock import patch
+import asyncio, threading, time
+from admission import KeyedTokenBuckets, ConcurrencyLimiter, AsyncConcurrencyLimiter, Rejected, parse_rate
+
+class TestParseRate(unittest.TestCase):
+
+    def test_formats(self):
+        self.assertEqual(parse_rate("10/m"), (10, 60))
+        self.assertEqual(parse_rate("100/30s"), (100, 30))
+        self.assertEqual(parse_rate("5/1"), (5, 1))
+        self.assertEqual(parse_rate("1000/h"), (1000, 3600))
+        self.assertIsNone(parse_rate("0"))
+        self.assertIsNone(parse_rate(""))
+        with self.assertRaises(ValueError):
+            parse_rate("lots")
+
+class TestTokenBuckets(unittest.TestCase):
+
+    @patch('admission.time.monotonic')
+    def test_burst_then_refill(self, mock_now):
+        mock_now.return_value = 100.0
+        buckets = KeyedTokenBuckets(2, 10)
+
+        self.assertEqual(buckets.take("a"), 0)
+        self.assertEqual(buckets.take("a"), 0)
+        self.assertAlmostEqual(buckets.take("a"), 5.0)
+        self.assertEqual(buckets.take("b"), 0)      # keys are independent
+
+        mock_now.return_value = 105.0
+        self.assertEqual(buckets.take("a"), 0)
+        self.assertEqual(buckets.stats(), {"keys": 2, "allowed": 4, "rejected": 1})
+
+    @patch('admission.time.monotonic')
+    def test_cost_takes_several_tokens(self, mock_now):
+        mock_now.return_value = 100.0
+        buckets = KeyedTokenBuckets(5, 60)
+
+        self.assertEqual(buckets.take("a", 3), 0)
+        self.assertGreater(buckets.take("a", 3), 0)
+        self.assertEqual(buckets.take("a", 2), 0)
+        self.assertEqual(buckets.take("b", 50), 0)     # capped at the burst, not impossible
+        self.assertGreater(buckets.take("b", 1), 0)
+        mock_now.return_value = 160.0
+        self.assertEqual(buckets.take("b", 50), 0)
+
+    def test_idle_keys_are_evicted(self):
+        buckets = KeyedTokenBuckets(1, 60, max_keys=2)
+        for key in "abc":
+            buckets.take(key)
+        self.assertEqual(buckets.stats()["keys"], 2)
+
+class TestConcurrencyLimiter(unittest.TestCase):
+
+    def test_rejects_when_queue_is_full(self):
+        limiter = ConcurrencyLimiter(1, max_waiting=0)
+        slot = limiter.acquire()
+
+        with self.assertRaises(Rejected) as ctx:
+            limiter.acquire()
+        self.assertEqual(ctx.exception.status, 503)
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+
+        slot.release()
+        slot.release()      # idempotent
+        with limiter.acquire():
+            self.assertEqual(limiter.stats()["in_use"], 1)
+        self.assertEqual(limiter.stats()["in_use"], 0)
+
+    def test_waiter_times_out(self):
+        limiter = ConcurrencyLimiter(1, max_waiting=1, timeout=0.05)
+        limiter.acquire()
+
+        with self.assertRaises(Rejected):
+            limiter.acquire()
+        self.assertEqual(limiter.stats()["waiting"], 0)
+
+    def test_waiter_gets_released_slot(self):
+        limiter = ConcurrencyLimiter(1, max_waiting=1, timeout=5)
+        slot = limiter.acquire()
+        acquired = []
+
+        waiter = threading.Thread(target=lambda: acquired.append(limiter.acquire()))
+        waiter.start()
+        while limiter.stats()["waiting"] == 0:
+            time.sleep(0.001)
+        slot.release()
+        waiter.join(5)
+
+        self.assertEqual(len(acquired), 1)
+        self.assertEqual(limiter.stats()["admitted"], 2)
+
+    def test_unbounded_ignores_queue_limit(self):
+        limiter = ConcurrencyLimiter(1, max_waiting=0, timeout=0.01)
+        slot = limiter.acquire()
+        threading.Timer(0.05, slot.release).start()
+
+        limiter.acquire(bounded=False).release()
+
+class TestAsyncConcurrencyLimiter(unittest.TestCase):
+
+    def test_waiter_gets_slot_then_queue_limits_apply(self):
+        async def scenario():
+            limiter = AsyncConcurrencyLimiter(1, max_waiting=1, timeout=1)
+            slot = await limiter.acquire()
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0.01)
+
+            with self.assertRaises(Rejected) as rejected:
+                await limiter.acquire()
+            self.assertEqual(rejected.exception.status, 503)
+
+            await slot.release()
+            async with await waiter:
+                self.assertEqual(limiter.stats()["in_use"], 1)
+            return limiter.stats()
+
+        stats = asyncio.run(scenario())
+        self.assertEqual((stats["in_use"], stats["admitted"], stats["rejected"]), (0, 2, 1))
+
+    def test_waiter_times_out(self):
+        async def scenario():
+            limiter = AsyncConcurrencyLimiter(1, max_waiting=1, timeout=0.02)
+            await limiter.acquire()
+            await limiter.acquire()
+
+        with self.assertRaises(Rejected):
+            asyncio.run(scenario())
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,94 @@
+import unittest
+from unittest.mock import patch
+import os, tempfile, time
+import ai_cache
+from ai_cache import LRUCache, ResponseCache, SQLiteCacheStore, make_key
+
+class TestAICache(unittest.TestCase):
+
+    def test_key_is_normalized(self):
+        a = make_key({"topic": "Python ", "domain": "Student", "age": 20})
+        b = make_key({"topic": "python", "domain": "  student", "age": "20"})
+        self.assertEqual(a, b)
+
+    def test_history_only_in_key_when_given(self):
+        params = {"topic": "Python"}
+        self.assertEqual(make_key(params), make_key(params))
+        self.assertNotEqual(make_key(params, "- Loops"), make_key(params, "- Lists"))
+        self.assertNotEqual(make_key(params), make_key(params, "- Loops"))
+
+    def test_name_only_in_key_when_personal(self):
+        alice = {"topic": "Python", "username": "alice", "name": "Alice"}
+        bob = {"topic": "Python", "username": "bob", "name": "Bob"}
+        self.assertNotEqual(make_key(alice), make_key(bob))
+        self.assertEqual(make_key(alice, personal=False), make_key(bob, personal=False))
+
+    def test_same_name_different_user_is_a_different_key(self):
+        self.assertNotEqual(make_key({"topic": "Python", "username": "alice", "name": "Sam"}),
+                            make_key({"topic": "Python", "username": "bob", "name": "Sam"}))
+
+    def test_lru_eviction(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl_expiry(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        with patch('ai_cache.time.time', return_value=1000):
+            cache.set("a", 1)
+        with patch('ai_cache.time.time', return_value=1061):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.expirations, 1)
+
+    def test_shared_sqlite_tier(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            worker_a = ResponseCache(LRUCache(8), SQLiteCacheStore(path))
+            worker_b = ResponseCache(LRUCache(8), SQLiteCacheStore(path))
+
+            worker_a.set("k", "response")
+
+            self.assertEqual(worker_b.get("k"), "response")
+            self.assertEqual(worker_b.stats()["shared_hits"], 1)
+            # Second lookup is served from worker_b's own LRU
+            self.assertEqual(worker_b.get("k"), "response")
+            self.assertEqual(worker_b.stats()["shared_hits"], 1)
+
+    def test_clear_owner_reaches_other_workers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            worker_a = ResponseCache(LRUCache(8), SQLiteCacheStore(path))
+            worker_b = ResponseCache(LRUCache(8), SQLiteCacheStore(path))
+
+            for worker in (worker_a, worker_b):
+                worker.set(worker.owned_key("k", "alice"), "alice's answer")
+                worker.set(worker.owned_key("k", "bob"), "bob's answer")
+            worker_a.clear_owner("alice")
+
+            self.assertIsNone(worker_b.get(worker_b.owned_key("k", "alice")))
+            self.assertEqual(worker_b.get(worker_b.owned_key("k", "bob")), "bob's answer")
+            worker_b.set(worker_b.owned_key("k", "alice"), "new answer")
+            self.assertEqual(worker_a.get(worker_a.owned_key("k", "alice")), "new answer")
+
+    def test_sqlite_replace_is_compare_and_set(self):
+        store = SQLiteCacheStore(":memory:")
+        store.set("k", "v1", time.time() + 60)
+        row = store.get("k")
+
+        self.assertTrue(store.replace("k", row, "v2", time.time() + 60))
+        self.assertFalse(store.replace("k", row, "v3", time.time() + 60))
+        self.assertEqual(store.get("k")[0], "v2")
+
+    def test_miss_counts(self):
+        cache = ResponseCache(LRUCache(8))
+        self.assertIsNone(cache.get("missing"))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,19 +1,51 @@
 import unittest
 from unittest.mock import MagicMock, patch
-import json
+import json, threading, time, gzip
 import app
+import jobs
+import history_storage
+import llm_telemetry
+import write_behind
+from datetime import datetime
 
 class TestSmartFreeTimeUtilizer(unittest.TestCase):
 
     def setUp(self):
         self.app = app.app.test_client()
         self.app.testing = True
+        app._cache = None
+        app._router = None
+        app._telemetry = None
+        app._writer = None
+        app._idempotency = None
+        app._limits = None
+        app._llm_limiter = None
+        app._titles_cache = None
+        app._warmup = None
+        app._jobs = None
 
     def test_health_check(self):
         response = self.app.get('/api/health')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['status'], 'healthy')
 
+    def test_ready_without_warmup(self):
+        response = self.app.get('/api/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json['ready'])
+
+    @patch('app.WARMUP', 'probe')
+    @patch('app.get_db_connection')
+    def test_ready_after_probe_warmup(self, mock_get_db):
+        self.app.get('/api/ready')
+        self.assertTrue(app.get_warmup().wait(5))
+
+        response = self.app.get('/api/ready')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json['steps_ms']), ['db_pool', 'model_client', 'response_cache'])
+        mock_get_db.return_value.close.assert_called_once()
+
     def test_home(self):
         response = self.app.get('/')
         self.assertEqual(response.status_code, 200)
@@ -195,6 +227,784 @@ class TestSmartFreeTimeUtilizer(unittest.TestCase):
         mock_cursor.execute.assert_called_with("DELETE FROM history WHERE username=%s", ('testuser',))
         self.assertTrue(mock_conn.commit.called)
 
+    @patch('app.get_db_connection')
+    def test_delete_all_history(self, mock_get_db):
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        mock_cursor.fetchall.side_effect = [
+            [{"id": 1, "timestamp": 10}],
+            [{"id": 5, "created_at": datetime(2024, 1, 1)}],
+        ]
+
+        response = self.app.delete('/api/history/testuser?all=1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['deleted'], {"history": 1, "ai_history": 1})
+        sql = [c[0][0] for c in mock_cursor.execute.call_args_list]
+        self.assertIn("DELETE FROM ai_tasks WHERE ai_history_id IN (%s)", sql)
+        self.assertIn("DELETE FROM ai_history WHERE id IN (%s)", sql)
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_delete_all_history_drops_cached_results(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+        app._jobs = jobs.JobQueue(app.run_generation, jobs.MemoryJobStore(), workers=1)
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        headers = {'Idempotency-Key': 'abc-123'}
+        self.app.post('/api/process-data', json=payload, headers=headers)
+        job_id = self.app.post('/api/process-data?async=1', json=payload).json['job_id']
+        app._jobs._queue.join()
+        self.app.post('/api/process-data', json=dict(payload, username="other"))
+        self.assertEqual(mock_ai.call_count, 2)
+
+        response = self.app.delete('/api/history/testuser?all=1')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.app.get(f'/api/jobs/{job_id}').status_code, 404)
+        again = self.app.post('/api/process-data', json=payload, headers=headers)
+        self.assertNotIn('Idempotent-Replayed', again.headers)
+        self.assertEqual(mock_ai.call_count, 3)
+
+        # other users keep their cached answers
+        self.app.post('/api/process-data', json=dict(payload, username="other"))
+        self.assertEqual(mock_ai.call_count, 3)
+
+    @patch('app.get_db_connection')
+    def test_delete_history_waits_for_batch_being_written(self, mock_get_db):
+        writing, release = threading.Event(), threading.Event()
+        order = []
+
+        def write(cursor, items):
+            writing.set()
+            release.wait(5)
+            order.append("batch")
+
+        app._writer = write_behind.WriteBehindWriter(MagicMock, write)
+        app._writer.submit("row", wait=False)
+        self.assertTrue(writing.wait(5))
+        mock_get_db.return_value.cursor.return_value.execute.side_effect = \
+            lambda sql, *args: order.append("delete")
+
+        deleting = threading.Thread(target=self.app.delete, args=('/api/history/testuser',))
+        deleting.start()
+        deleting.join(0.1)
+        self.assertEqual(order, [])
+
+        release.set()
+        deleting.join(5)
+        self.assertEqual(order, ["batch", "delete"])
+
+    @patch('app.get_db_connection')
+    def test_delete_all_history_waits_for_batch_being_written(self, mock_get_db):
+        writing, release = threading.Event(), threading.Event()
+        order = []
+
+        def write(cursor, items):
+            writing.set()
+            release.wait(5)
+            order.append("batch")
+
+        app._writer = write_behind.WriteBehindWriter(MagicMock, write)
+        app._writer.submit("row", wait=False)
+        self.assertTrue(writing.wait(5))
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = []
+        mock_cursor.execute.side_effect = lambda sql, *args: order.append("select")
+
+        deleting = threading.Thread(target=self.app.delete, args=('/api/history/testuser?all=1',))
+        deleting.start()
+        deleting.join(0.1)
+        self.assertEqual(order, [])
+
+        release.set()
+        deleting.join(5)
+        self.assertEqual(order[0], "batch")
+        self.assertIn("select", order)
+
+    @patch('app.get_pool')
+    def test_db_stats(self, mock_get_pool):
+        mock_get_pool.return_value.stats.return_value = {"in_use": 1, "idle": 4}
+
+        response = self.app.get('/api/db-stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['pool']['idle'], 4)
+
+    @patch('app.get_db_connection')
+    def test_signin_pool_exhausted(self, mock_get_db):
+        mock_get_db.side_effect = app.PoolTimeout("No database connection available")
+
+        payload = {"username": "testuser", "password": "pwd"}
+        response = self.app.post('/signin', json=payload)
+        self.assertEqual(response.status_code, 503)
+
+    def _stream_chunks(self, *parts):
+        chunks = []
+        for part in parts:
+            chunk = MagicMock()
+            chunk.choices = [MagicMock()]
+            chunk.choices[0].delta.content = part
+            chunks.append(chunk)
+        upstream = MagicMock()
+        upstream.__iter__.return_value = iter(chunks)
+        return upstream
+
+    @patch('app.stream_ai_response')
+    @patch('app.get_db_connection')
+    def test_process_data_stream(self, mock_get_db, mock_stream):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_db.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchall.return_value = []
+
+        mock_stream.return_value = self._stream_chunks("### Task 1 – ", "Variables\n")
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        response = self.app.post('/api/process-data?stream=1', json=payload)
+        body = response.get_data(as_text=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertIn('event: delta', body)
+        self.assertIn('event: done', body)
+        mock_cursor.executemany.assert_any_call(
+            "INSERT INTO history (username,title,timestamp) VALUES (%s,%s,%s)",
+            [('testuser', 'Variables', unittest.mock.ANY)]
+        )
+        self.assertTrue(mock_conn.commit.called)
+
+    @patch('app.stream_ai_response')
+    @patch('app.get_db_connection')
+    def test_process_data_stream_fallback(self, mock_get_db, mock_stream):
+        mock_conn = MagicMock()
+        mock_get_db.return_value = mock_conn
+        mock_conn.cursor.return_value.fetchall.return_value = []
+
+        mock_stream.side_effect = [Exception("primary down"), self._stream_chunks("ok")]
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        response = self.app.post('/api/process-data', json=payload,
+                                 headers={'Accept': 'text/event-stream'})
+        body = response.get_data(as_text=True)
+
+        self.assertIn('event: done', body)
+        self.assertEqual(mock_stream.call_args_list[1][0][1], app.MODELS[1])
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_process_data_cached(self, mock_get_db, mock_ai):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_db.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+
+        payload = {"username": "alice", "name": "Alice", "age": 25, "topic": "Python"}
+        first = self.app.post('/api/process-data', json=payload)
+        again = self.app.post('/api/process-data', json=dict(payload, topic="  python "))
+        bob = self.app.post('/api/process-data',
+                            json={"username": "bob", "name": "Bob", "age": 25, "topic": "Python"})
+
+        self.assertFalse(first.json['cached'])
+        self.assertTrue(again.json['cached'])
+        # another user never gets alice's personalised answer
+        self.assertFalse(bob.json['cached'])
+        self.assertEqual(mock_ai.call_count, 2)
+        mock_cursor.executemany.assert_any_call(
+            "INSERT INTO history (username,title,timestamp) VALUES (%s,%s,%s)",
+            [('bob', 'Loops', unittest.mock.ANY)]
+        )
+
+        stats = self.app.get('/api/cache-stats').json['cache']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+
+    @patch.dict('os.environ', {"RECENT_TITLES_SHARED": "local"})
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_repeated_request_hits_after_history_changes(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+
+        payload = {"username": "alice", "name": "Alice", "age": 25, "topic": "Python"}
+        responses = [self.app.post('/api/process-data', json=payload) for _ in range(3)]
+
+        # the first save adds "Loops" to alice's recent titles; the repeats still hit
+        self.assertIsNotNone(app.get_titles_cache())
+        self.assertEqual(app.get_recent_titles("alice")[0], "Loops")
+        self.assertEqual([r.json['cached'] for r in responses], [False, True, True])
+        self.assertEqual(mock_ai.call_count, 1)
+
+    @patch.dict('os.environ', {"AI_CACHE_SCOPE": "shared"})
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_process_data_cache_shared_across_users_on_opt_in(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+
+        self.app.post('/api/process-data', json={"username": "alice", "name": "Alice", "age": 25, "topic": "Python"})
+        bob = self.app.post('/api/process-data', json={"username": "bob", "name": "Bob", "age": 25, "topic": "Python"})
+
+        self.assertTrue(bob.json['cached'])
+        self.assertEqual(mock_ai.call_count, 1)
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_process_data_all_models_fail(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        mock_ai.side_effect = Exception("upstream error")
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Go"}
+        response = self.app.post('/api/process-data', json=payload)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(mock_ai.call_count, len(app.MODELS))
+
+        stats = self.app.get('/api/model-stats').json['models']
+        self.assertEqual(stats[app.MODELS[0]]['errors'], 1)
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_process_data_async_job(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+        store = jobs.MemoryJobStore()
+        app._jobs = jobs.JobQueue(app.run_generation, store, workers=1)
+        self.addCleanup(setattr, app, '_jobs', None)
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Rust"}
+        response = self.app.post('/api/process-data?async=1', json=payload)
+
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json['job_id']
+        self.assertEqual(response.headers['Location'], f'/api/jobs/{job_id}')
+
+        app._jobs._queue.join()
+        job = self.app.get(f'/api/jobs/{job_id}')
+        self.assertEqual(job.json['status'], 'done')
+        self.assertEqual(job.json['result']['response'], "### Task 1 – Loops")
+
+        self.assertEqual(self.app.get('/api/jobs/unknown').status_code, 404)
+
+    def test_process_data_async_queue_full(self):
+        app._jobs = MagicMock()
+        app._jobs.submit.side_effect = jobs.QueueFull("Job queue is full")
+        self.addCleanup(setattr, app, '_jobs', None)
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Rust"}
+        response = self.app.post('/api/process-data?async=1', json=payload)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+
+    @patch('app.get_db_connection')
+    def test_ai_history_keyset_page(self, mock_get_db):
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = [
+            {"id": 9, "created_at": datetime(2024, 1, 3)},
+            {"id": 8, "created_at": datetime(2024, 1, 2)},
+            {"id": 7, "created_at": datetime(2024, 1, 1)}
+        ]
+
+        response = self.app.get('/api/ai-history/testuser?limit=2&fields=created_at')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['history']), 2)
+        self.assertNotIn('id', response.json['history'][0])
+        self.assertNotIn('ai_response', mock_cursor.execute.call_args[0][0])
+
+        next_cursor = response.json['next_cursor']
+        self.assertIsNotNone(next_cursor)
+
+        mock_cursor.fetchall.return_value = []
+        response = self.app.get(f'/api/ai-history/testuser?limit=2&cursor={next_cursor}')
+        sql, args = mock_cursor.execute.call_args[0]
+        self.assertIn('id < %s', sql)
+        self.assertEqual(args, ('testuser', datetime(2024, 1, 2), datetime(2024, 1, 2), 8, 3))
+        self.assertIsNone(response.json['next_cursor'])
+
+    def test_history_bad_page_args(self):
+        self.assertEqual(self.app.get('/api/history/testuser?fields=password').status_code, 400)
+        self.assertEqual(self.app.get('/api/history/testuser?cursor=zzz').status_code, 400)
+
+    @patch('app.COMPACT_HISTORY', True)
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_process_data_compact_storage(self, mock_get_db, mock_ai):
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        self.assertEqual(self.app.post('/api/process-data', json=payload).status_code, 200)
+
+        sql, args = mock_cursor.execute.call_args_list[1][0]
+        self.assertIn('prompt_template', sql)
+        self.assertIsNone(args[1])
+        self.assertIsNone(args[4])
+
+        # Read back through the history route
+        mock_cursor.fetchall.return_value = [{
+            "id": 1, "created_at": datetime(2024, 1, 1),
+            "user_prompt": args[1], "prompt_template": args[2], "prompt_params": args[3],
+            "ai_response": args[4], "response_z": args[5]
+        }]
+        response = self.app.get('/api/ai-history/testuser')
+        row = response.json['history'][0]
+        self.assertEqual(row['ai_response'], "### Task 1 – Loops")
+        self.assertIn("I'm Tester, a 25-year-old general learner.", row['user_prompt'])
+        self.assertNotIn('response_z', row)
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_process_data_returns_tasks(self, mock_get_db, mock_ai):
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = []
+        mock_cursor.lastrowid = 77
+        mock_ai.return_value = (
+            "### Task 1 – Loops\n**Detailed Description**\nWrite loops.\n"
+            "**Small Tips**\n- Start small"
+        )
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        response = self.app.post('/api/process-data', json=payload)
+
+        self.assertEqual(response.json['tasks'], [
+            {"title": "Loops", "description": "Write loops.", "tips": ["Start small"]}
+        ])
+        rows = mock_cursor.executemany.call_args_list[0][0][1]
+        self.assertEqual(rows, [(77, 'testuser', 0, 'Loops', 'Write loops.', '["Start small"]')])
+
+    @patch('app.get_db_connection')
+    def test_ai_history_with_tasks(self, mock_get_db):
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        mock_cursor.fetchall.side_effect = [
+            [{"id": 5, "created_at": datetime(2024, 1, 1)}],
+            [{"ai_history_id": 5, "title": "Loops", "description": "d", "tips": '["t"]'}]
+        ]
+
+        response = self.app.get('/api/ai-history/testuser?fields=created_at,tasks')
+
+        self.assertEqual(response.json['history'][0]['tasks'],
+                         [{"title": "Loops", "description": "d", "tips": ["t"]}])
+        first_sql = mock_cursor.execute.call_args_list[0][0][0]
+        self.assertNotIn('ai_response', first_sql)
+        self.assertNotIn('tasks', first_sql)
+
+    @patch('app.get_db_connection')
+    def test_search_ranked_snippets_and_cursor(self, mock_get_db):
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        row = {"ai_history_id": 5, "position": 0, "title": "Recursion drills",
+               "description": "Write a recursive factorial. " * 20, "tips": '["Start with a base case"]',
+               "created_at": datetime(2024, 1, 1)}
+        mock_cursor.fetchall.return_value = [dict(row, id=12, score=2.5), dict(row, id=11, score=1.25)]
+
+        response = self.app.get('/api/ai-history/testuser/search?q=Recurs!&limit=1')
+
+        self.assertEqual(response.status_code, 200)
+        result = response.json['results'][0]
+        self.assertEqual((result['ai_history_id'], result['title'], result['score']), (5, "Recursion drills", 2.5))
+        self.assertLess(len(result['snippet']), 200)
+        self.assertNotIn('ai_response', result)
+        sql, args = mock_cursor.execute.call_args[0]
+        self.assertIn('MATCH(t.title,t.description,t.tips)', sql)
+        self.assertEqual(args, ('recurs*', 'testuser', 'recurs*', 2))
+
+        mock_cursor.fetchall.return_value = []
+        self.app.get(f"/api/ai-history/testuser/search?q=recurs&cursor={response.json['next_cursor']}")
+        sql, args = mock_cursor.execute.call_args[0]
+        self.assertIn('t.id < %s', sql)
+        self.assertEqual(args[3:], ('recurs*', 2.5, 'recurs*', 2.5, 12, 101))
+
+    def test_search_requires_a_word(self):
+        response = self.app.get('/api/ai-history/testuser/search?q=%2B%2B')
+        self.assertEqual(response.status_code, 400)
+
+    @patch('app.get_db_connection')
+    def test_search_out_of_range_since(self, mock_get_db):
+        for since in ('inf', '1e20', '-1e30', 'yesterday'):
+            response = self.app.get(f'/api/ai-history/testuser/search?q=recursion&since={since}')
+            self.assertEqual(response.status_code, 400, since)
+            self.assertIn('since', response.json['error'])
+        self.assertFalse(mock_get_db.called)
+
+    @patch('app.get_db_connection')
+    def test_title_history_reads_history_table(self, mock_get_db):
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = []
+
+        self.app.get('/api/history/testuser')
+
+        sql = mock_cursor.execute.call_args[0][0]
+        self.assertIn('FROM history', sql)
+        self.assertNotIn('ai_response', sql)
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_process_data_server_timing_and_metrics(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Haskell"}
+        response = self.app.post('/api/process-data', json=payload)
+
+        timing = response.headers['Server-Timing']
+        for name in ('history_select', 'prompt_build', 'llm', 'db_write', 'db_commit', 'serialize'):
+            self.assertIn(f'{name};dur=', timing)
+
+        body = self.app.get('/metrics').get_data(as_text=True)
+        self.assertIn('http_requests_total{method="POST",route="/api/process-data",status="200"}', body)
+        self.assertIn('http_request_phase_seconds_count{method="POST",phase="llm",route="/api/process-data"}', body)
+
+    @patch('app.client.chat.completions.create')
+    @patch('app.get_db_connection')
+    def test_llm_calls_are_recorded(self, mock_get_db, mock_create):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        completion = MagicMock()
+        completion.choices[0].message.content = "### Task 1 – Variables"
+        completion.usage.prompt_tokens = 120
+        completion.usage.completion_tokens = 30
+        mock_create.return_value = completion
+        app._telemetry = llm_telemetry.TelemetryWriter(llm_telemetry.MemoryTelemetryStore(), flush_interval=60)
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        self.app.post('/api/process-data', json=payload)
+        response = self.app.get('/api/llm-stats?window=1h')
+
+        self.assertEqual(response.status_code, 200)
+        stats = response.json['models'][app.MODELS[0]]
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['reasons'], {'primary': 1})
+        self.assertEqual(stats['prompt_tokens']['p50'], 120)
+        self.assertEqual(self.app.get('/api/llm-stats?window=soon').status_code, 400)
+
+    @patch('app.WRITE_MODE', 'enqueue')
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_process_data_write_behind(self, mock_get_db, mock_ai):
+        mock_conn = mock_get_db.return_value
+        mock_cursor = mock_conn.cursor.return_value
+        mock_cursor.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        response = self.app.post('/api/process-data', json=payload)
+        app._writer.close()
+
+        self.assertEqual(response.json['tasks'][0]['title'], 'Loops')
+        mock_cursor.executemany.assert_any_call(
+            "INSERT INTO history (username,title,timestamp) VALUES (%s,%s,%s)",
+            [('testuser', 'Loops', unittest.mock.ANY)]
+        )
+        self.assertTrue(mock_conn.commit.called)
+        self.assertEqual(app._writer.stats()['written'], 1)
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_identical_requests_share_one_generation(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(*args):
+            started.set()
+            release.wait(5)
+            return "### Task 1 – Loops"
+        mock_ai.side_effect = slow
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        responses = []
+        def post():
+            responses.append(app.app.test_client().post('/api/process-data', json=payload))
+
+        coalesced = app._flights.stats()['coalesced']
+        first = threading.Thread(target=post)
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=post)
+        second.start()
+        while app._flights.stats()['coalesced'] == coalesced:
+            time.sleep(0.001)
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(mock_ai.call_count, 1)
+        self.assertEqual([r.json['tasks'][0]['title'] for r in responses], ['Loops', 'Loops'])
+        self.assertEqual(sorted(r.headers.get('X-Coalesced', '') for r in responses), ['', 'true'])
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_idempotency_key_replays_result(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+        headers = {'Idempotency-Key': 'abc-123'}
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        first = self.app.post('/api/process-data', json=payload, headers=headers)
+        again = self.app.post('/api/process-data', json=payload, headers=headers)
+        changed = self.app.post('/api/process-data', json=dict(payload, topic="SQL"), headers=headers)
+
+        self.assertEqual(mock_ai.call_count, 1)
+        self.assertEqual(again.json, first.json)
+        self.assertEqual(again.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(changed.status_code, 422)
+
+    @patch.dict('os.environ', {'RATE_LIMIT_GENERATE_USER': '2/m'})
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_generation_rate_limit_leaves_reads_alone(self, mock_get_db, mock_ai):
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        statuses = [self.app.post('/api/process-data', json=payload).status_code for _ in range(3)]
+        limited = self.app.post('/api/process-data', json=payload)
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertIn('Retry-After', limited.headers)
+        self.assertEqual(self.app.get('/api/history/testuser').status_code, 200)
+        self.assertEqual(self.app.get('/api/health').status_code, 200)
+        self.assertIn('admission_rejected_total{limiter="generate_user"}',
+                      self.app.get('/metrics').get_data(as_text=True))
+
+    @patch.dict('os.environ', {'RATE_LIMIT_GENERATE_IP': '2/m'})
+    def test_cors_preflights_are_not_rate_limited(self):
+        headers = {'Origin': 'http://localhost:3000', 'Access-Control-Request-Method': 'POST'}
+
+        statuses = [self.app.options('/api/process-data', headers=headers).status_code for _ in range(4)]
+
+        self.assertEqual(statuses, [200] * 4)
+
+    @patch.dict('os.environ', {'RATE_LIMIT_WRITE_USER': '1/m'})
+    @patch('app.get_db_connection')
+    def test_deletes_use_the_write_budget(self, mock_get_db):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+
+        statuses = [self.app.delete('/api/history/testuser').status_code for _ in range(2)]
+
+        self.assertEqual(statuses, [200, 429])
+        self.assertEqual(self.app.get('/api/history/testuser').status_code, 200)
+
+    @patch.dict('os.environ', {'LLM_CONCURRENCY': '1', 'LLM_QUEUE': '0'})
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_saturated_model_slots_return_503(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+        busy = app.get_llm_limiter().acquire()
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        response = self.app.post('/api/process-data', json=payload)
+        stream = self.app.post('/api/process-data?stream=1', json=payload)
+        busy.release()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(stream.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        self.assertFalse(mock_ai.called)
+        self.assertEqual(self.app.post('/api/process-data', json=payload).status_code, 200)
+        self.assertEqual(app.get_llm_limiter().stats()['in_use'], 0)
+
+    @patch('app.get_export_connection')
+    def test_export_ai_history_streams_ndjson(self, mock_get_db):
+        mock_conn = mock_get_db.return_value
+        mock_cursor = mock_conn.cursor.return_value
+        mock_cursor.fetchmany.side_effect = [
+            [{"id": 1, "created_at": datetime(2024, 1, 1, 10, 0), "user_prompt": "p1", "ai_response": "r1"},
+             {"id": 2, "created_at": datetime(2024, 1, 2, 10, 0), "user_prompt": "p2", "ai_response": "r2"}],
+            [{"id": 3, "created_at": datetime(2024, 1, 3, 10, 0), "user_prompt": "p3", "ai_response": "r3"}],
+            []
+        ]
+
+        response = self.app.get('/api/ai-history/testuser/export?since=2024-01-01T00:00:00')
+        lines = [json.loads(l) for l in response.get_data(as_text=True).splitlines()]
+
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual([l['id'] for l in lines], [1, 2, 3])
+        self.assertEqual(lines[0]['created_at'], '2024-01-01T10:00:00')
+        mock_conn.cursor.assert_called_with(dictionary=True, buffered=False)
+        sql, args = mock_cursor.execute.call_args[0]
+        self.assertIn("created_at >= %s", sql)
+        self.assertIn("ORDER BY created_at, id", sql)
+        self.assertEqual(args, ('testuser', datetime(2024, 1, 1)))
+        self.assertTrue(mock_conn.close.called)
+        self.assertFalse(mock_conn.discard.called)
+
+    @patch('app.get_export_connection')
+    def test_export_ai_history_gzip(self, mock_get_db):
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        mock_cursor.fetchmany.side_effect = [
+            [{"id": 1, "created_at": datetime(2024, 1, 1), "user_prompt": "p", "ai_response": "r"}], []
+        ]
+
+        response = self.app.get('/api/ai-history/testuser/export?fields=ai_response',
+                                headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        line = json.loads(gzip.decompress(response.get_data()))
+        self.assertEqual(line['ai_response'], 'r')
+        self.assertNotIn('user_prompt', mock_cursor.execute.call_args[0][0])
+
+    @patch('app.get_export_connection')
+    def test_export_ai_history_client_disconnect(self, mock_get_db):
+        mock_conn = mock_get_db.return_value
+        mock_cursor = mock_conn.cursor.return_value
+        row = {"id": 1, "created_at": datetime(2024, 1, 1), "user_prompt": "p", "ai_response": "r"}
+        mock_cursor.fetchmany.return_value = [row]     # endless rows
+
+        response = self.app.get('/api/ai-history/testuser/export', buffered=False)
+        next(response.response)
+        response.close()
+
+        self.assertTrue(mock_conn.discard.called)
+        self.assertFalse(mock_conn.close.called)
+
+    @patch.dict('os.environ', {'EXPORT_MAX_SECONDS': '0'})
+    @patch('app.get_export_connection')
+    def test_export_ai_history_time_limit(self, mock_get_db):
+        mock_conn = mock_get_db.return_value
+        row = {"id": 1, "created_at": datetime(2024, 1, 1), "user_prompt": "p", "ai_response": "r"}
+        mock_conn.cursor.return_value.fetchmany.return_value = [row]     # endless rows
+
+        response = self.app.get('/api/ai-history/testuser/export')
+
+        self.assertEqual(response.get_data(), b"")
+        self.assertTrue(mock_conn.discard.called)
+
+    @patch.dict('os.environ', {'EXPORT_CONCURRENCY': '1', 'EXPORT_POOL_TIMEOUT': '0.01'})
+    @patch('app.connect_from_env')
+    @patch('app.get_db_connection')
+    def test_export_ai_history_has_its_own_pool(self, mock_get_db, mock_connect):
+        app._export_pool = None
+        self.addCleanup(setattr, app, '_export_pool', None)
+        busy = app.get_export_connection()
+
+        response = self.app.get('/api/ai-history/testuser/export')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(mock_get_db.called)
+        busy.close()
+
+    def test_export_ai_history_bad_args(self):
+        self.assertEqual(self.app.get('/api/ai-history/u/export?since=yesterday').status_code, 400)
+        self.assertEqual(self.app.get('/api/ai-history/u/export?fields=password').status_code, 400)
+
+    def test_export_ai_history_out_of_range_since(self):
+        for since in ('inf', 'nan', '1e20', '-1e30'):
+            response = self.app.get(f'/api/ai-history/u/export?since={since}')
+            self.assertEqual(response.status_code, 400, since)
+            self.assertIn('since', response.json['error'])
+
+    @patch.dict('os.environ', {"RECENT_TITLES_SHARED": "local"})
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_recent_titles_are_cached_per_user(self, mock_get_db, mock_ai):
+        mock_cursor = mock_get_db.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = [{"title": "Variables"}]
+        mock_ai.return_value = "### Task 1 – Loops"
+        history_select = "SELECT title FROM history WHERE username=%s ORDER BY timestamp DESC, id DESC LIMIT %s"
+
+        def selects():
+            return [c for c in mock_cursor.execute.call_args_list if c[0][0] == history_select]
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "topic": "Python"}
+        self.app.post('/api/process-data', json=payload)
+        self.app.post('/api/process-data', json=dict(payload, topic="SQL"))
+
+        self.assertEqual(len(selects()), 1)
+        self.assertIn("- Loops\n- Variables", mock_ai.call_args_list[1][0][0])
+        stats = self.app.get('/api/cache-stats').json['recent_titles']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+        self.app.delete('/api/history/testuser')
+        self.app.post('/api/process-data', json=dict(payload, topic="Git"))
+        self.assertEqual(len(selects()), 2)
+
+    @patch('app.get_db_connection')
+    def test_recent_titles_read_from_the_database_without_a_shared_store(self, mock_get_db):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = [{"title": "Variables"}]
+
+        self.assertIsNone(app.get_titles_cache())
+        self.assertEqual(app.get_recent_titles("testuser"), ["Variables"])
+        self.assertEqual(app.get_recent_titles("testuser"), ["Variables"])
+        self.assertEqual(mock_get_db.call_count, 2)
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_batch_runs_items_concurrently_and_saves_once(self, mock_get_db, mock_ai):
+        mock_conn = mock_get_db.return_value
+        mock_cursor = mock_conn.cursor.return_value
+        mock_cursor.fetchall.return_value = []
+
+        def slow(prompt, *args):
+            time.sleep(0.2)
+            topic = "SQL" if "SQL" in prompt else "Git" if "Git" in prompt else "Python"
+            return f"### Task 1 – {topic} basics"
+        mock_ai.side_effect = slow
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25,
+                   "items": ["Python", {"topic": "SQL"}, {"topic": "Git", "time_available": "1 hour"}]}
+        start = time.monotonic()
+        response = self.app.post('/api/process-data/batch', json=payload)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json['success'])
+        self.assertEqual([r['tasks'][0]['title'] for r in response.json['results']],
+                         ['Python basics', 'SQL basics', 'Git basics'])
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(mock_conn.commit.call_count, 1)
+        history_inserts = [c for c in mock_cursor.executemany.call_args_list
+                           if c[0][0].startswith("INSERT INTO history")]
+        self.assertEqual(len(history_inserts), 1)
+        self.assertEqual(len(history_inserts[0][0][1]), 3)
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_batch_reports_per_item_errors(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+
+        def answer(prompt, *args):
+            if "Broken" in prompt:
+                raise Exception("upstream 500")
+            return "### Task 1 – Loops"
+        mock_ai.side_effect = answer
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25,
+                   "items": [{"topic": "Python"}, {"topic": "Broken"}, {"topic": "  "}]}
+        results = self.app.post('/api/process-data/batch', json=payload).json['results']
+
+        self.assertTrue(results[0]['success'])
+        self.assertEqual((results[1]['success'], results[1]['status']), (False, 503))
+        self.assertEqual((results[2]['success'], results[2]['status']), (False, 400))
+
+    @patch('app.get_ai_response')
+    @patch('app.get_db_connection')
+    def test_batch_stream(self, mock_get_db, mock_ai):
+        mock_get_db.return_value.cursor.return_value.fetchall.return_value = []
+        mock_ai.return_value = "### Task 1 – Loops"
+
+        payload = {"username": "testuser", "name": "Tester", "age": 25, "items": ["Python", "SQL"]}
+        body = self.app.post('/api/process-data/batch?stream=1', json=payload).get_data(as_text=True)
+
+        self.assertEqual(body.count('event: result'), 2)
+        self.assertEqual(body.count('event: done'), 1)
+        self.assertLess(body.rindex('event: result'), body.index('event: done'))
+
+    def test_batch_validation(self):
+        too_many = {"username": "u", "name": "n", "age": 1, "items": ["t"] * (app.BATCH_MAX_ITEMS + 1)}
+        self.assertEqual(self.app.post('/api/process-data/batch', json=too_many).status_code, 400)
+        self.assertEqual(self.app.post('/api/process-data/batch', json={"username": "v"}).status_code, 400)
+        no_user = {"name": "n", "age": 1, "items": ["t"]}
+        self.assertEqual(self.app.post('/api/process-data/batch', json=no_user).status_code, 400)
+        response = self.app.post('/api/process-data/batch', json=[1])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json, {"error": "Request body must be a JSON object"})
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
 
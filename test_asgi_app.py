@@ -0,0 +1,242 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+import asyncio, gzip, json
+import app
+import asgi_app
+
+ANSWER = "### Task 1 – Recursion\n\n**Detailed Description**\nWalk a tree.\n\n**Small Tips**\n- Start small"
+
+def request(method, path, body=None, headers=(), query=b""):
+    return asyncio.run(send_requests([(method, path, body, headers, query)]))[0]
+
+async def send_requests(requests):
+    return await asyncio.gather(*(call_app(*r) for r in requests))
+
+async def call_app(method, path, body=None, headers=(), query=b"", disconnect_after=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = list(headers) + ([("content-type", "application/json")] if body is not None else [])
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "path": path, "query_string": query,
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+        "server": ("testserver", 80), "client": ("127.0.0.1", 5000),
+    }
+    messages = [{"type": "http.request", "body": payload}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        if disconnect_after is None:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app.app(scope, receive, send)
+
+    start = sent[0]
+    return (start["status"],
+            {k.decode(): v.decode() for k, v in start["headers"]},
+            b"".join(m.get("body", b"") for m in sent[1:]))
+
+def make_pool(*fetches):
+    """Fake AsyncConnectionPool; fetchall results are consumed in order."""
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    cursor.executemany = AsyncMock()
+    cursor.fetchall = AsyncMock(side_effect=list(fetches))
+    cursor.close = AsyncMock()
+    cursor.lastrowid = 7
+    conn = MagicMock()
+    conn.cursor = AsyncMock(return_value=cursor)
+    conn.commit = AsyncMock()
+    conn.close = AsyncMock()
+    pool = MagicMock()
+    pool.acquire = AsyncMock(return_value=conn)
+    return pool, conn, cursor
+
+class FakeStream:
+
+    def __init__(self, *deltas):
+        self.chunks = [MagicMock(usage=None, choices=[MagicMock(delta=MagicMock(content=d))]) for d in deltas]
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+PAYLOAD = {"username": "alice", "name": "Alice", "age": 30, "topic": "Recursion"}
+
+class TestAsgiApp(unittest.TestCase):
+
+    def setUp(self):
+        app._cache = None
+        app._router = None
+        app._telemetry = None
+        app._writer = None
+        app._idempotency = None
+        app._limits = None
+        app._titles_cache = None
+        asgi_app._async_pool = None
+        asgi_app._llm_limiter = None
+        asgi_app._wsgi_slots = None
+
+    def test_process_data_uses_async_model_and_db(self):
+        pool, conn, cursor = make_pool([{"title": "Loops"}])
+        model = AsyncMock(return_value=ANSWER)
+
+        with patch('asgi_app.get_async_pool', return_value=pool), \
+                patch('asgi_app.get_ai_response', model):
+            status, headers, body = request("POST", "/api/process-data", PAYLOAD)
+
+        self.assertEqual(status, 200)
+        result = json.loads(body)
+        self.assertEqual(result["response"], ANSWER)
+        self.assertEqual(result["tasks"][0]["title"], "Recursion")
+        self.assertFalse(result["cached"])
+        self.assertIn("Loops", model.call_args[0][0])
+        self.assertIn("INSERT INTO ai_history", cursor.execute.call_args_list[1][0][0])
+        self.assertEqual(cursor.executemany.call_args_list[0][0][1][0][0], 7)
+        conn.commit.assert_awaited_once()
+        self.assertIn("llm;dur=", headers["server-timing"])
+        self.assertEqual(headers["access-control-allow-origin"], "*")
+
+    def test_same_bytes_as_sync_route(self):
+        pool, _, _ = make_pool([])
+        with patch('asgi_app.get_async_pool', return_value=pool):
+            _, _, body = request("POST", "/api/process-data", {"username": "alice"})
+
+        sync = app.app.test_client().post('/api/process-data', json={"username": "alice"})
+
+        self.assertEqual(sync.status_code, 400)
+        self.assertEqual(body, sync.data)
+
+    def test_identical_requests_share_one_generation(self):
+        pool, _, _ = make_pool([], [])
+
+        async def slow(*args):
+            await asyncio.sleep(0.05)
+            return ANSWER
+
+        model = AsyncMock(side_effect=slow)
+        with patch('asgi_app.get_async_pool', return_value=pool), \
+                patch('asgi_app.get_ai_response', model), \
+                patch.dict('os.environ', {"AI_CACHE_SIZE": "0"}):
+            results = asyncio.run(send_requests([("POST", "/api/process-data", PAYLOAD)] * 2))
+
+        self.assertEqual(model.await_count, 1)
+        self.assertEqual(sorted(h.get("x-coalesced", "") for _, h, _ in results), ["", "true"])
+
+    def test_all_models_failing_is_503(self):
+        pool, _, _ = make_pool([])
+        model = AsyncMock(side_effect=RuntimeError("upstream down"))
+
+        with patch('asgi_app.get_async_pool', return_value=pool), \
+                patch('asgi_app.get_ai_response', model):
+            status, _, body = request("POST", "/api/process-data", PAYLOAD)
+
+        self.assertEqual(status, 503)
+        self.assertIn("All models failed", json.loads(body)["error"])
+
+    def test_process_data_stream(self):
+        pool, _, cursor = make_pool([])
+        stream = FakeStream("### Task 1 – Recursion\n\n", "**Detailed Description**\nWalk a tree.")
+
+        with patch('asgi_app.get_async_pool', return_value=pool), \
+                patch('asgi_app.stream_ai_response', AsyncMock(return_value=stream)):
+            status, headers, body = request("POST", "/api/process-data", PAYLOAD, query=b"stream=1")
+
+        events = body.decode().split("\n\n")
+        self.assertEqual(status, 200)
+        self.assertTrue(headers["content-type"].startswith("text/event-stream"))
+        self.assertTrue(events[0].startswith("event: delta"))
+        self.assertIn("event: done", body.decode())
+        self.assertIn("INSERT INTO ai_history", cursor.execute.call_args_list[-1][0][0])
+        self.assertEqual(asgi_app.get_llm_limiter().in_use, 0)
+
+    def test_stream_cancelled_when_client_leaves(self):
+        pool, _, cursor = make_pool([])
+        stream = FakeStream("### Task 1", " – Recursion")
+
+        async def slow_chunks():
+            yield stream.chunks[0]
+            await asyncio.sleep(5)
+            yield stream.chunks[1]
+        stream._iterate = slow_chunks
+
+        with patch('asgi_app.get_async_pool', return_value=pool), \
+                patch('asgi_app.stream_ai_response', AsyncMock(return_value=stream)):
+            status, _, body = asyncio.run(call_app("POST", "/api/process-data", PAYLOAD,
+                                                   query=b"stream=1", disconnect_after=0.05))
+
+        self.assertEqual(status, 200)
+        self.assertNotIn("event: done", body.decode())
+        self.assertTrue(stream.closed)
+        self.assertFalse(any("INSERT" in c[0][0] for c in cursor.execute.call_args_list))
+        self.assertEqual(asgi_app.get_llm_limiter().in_use, 0)
+
+    def test_history_etag_and_gzip(self):
+        rows = [{"id": i, "title": f"Title {i} " * 10, "timestamp": 1700000000 + i} for i in range(20)]
+        pool, _, cursor = make_pool(rows, rows)
+
+        with patch('asgi_app.get_async_pool', return_value=pool):
+            status, headers, body = request("GET", "/api/history/alice",
+                                            headers=[("accept-encoding", "gzip")])
+            again, _, empty = request("GET", "/api/history/alice",
+                                      headers=[("if-none-match", headers["etag"])])
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertEqual(len(json.loads(gzip.decompress(body))["history"]), 20)
+        self.assertIn("FROM history WHERE username=%s", cursor.execute.call_args[0][0])
+        self.assertEqual((again, empty), (304, b""))
+
+    def test_ai_history_with_tasks(self):
+        rows = [{"id": 3, "ai_response": "r", "created_at": None}]
+        tasks = [{"ai_history_id": 3, "title": "Recursion", "description": "Walk a tree.", "tips": "[]"}]
+        pool, _, _ = make_pool(rows, tasks)
+
+        with patch('asgi_app.get_async_pool', return_value=pool):
+            status, _, body = request("GET", "/api/ai-history/alice", query=b"fields=ai_response,tasks")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["history"],
+                         [{"ai_response": "r", "tasks": [{"title": "Recursion", "description": "Walk a tree.",
+                                                          "tips": []}]}])
+
+    def test_bad_page_args(self):
+        status, _, body = request("GET", "/api/history/alice", query=b"limit=x")
+        self.assertEqual(status, 400)
+        self.assertIn("limit", json.loads(body)["error"])
+
+    def test_teardown_runs_after_the_response_and_sees_errors(self):
+        pool, _, _ = make_pool([])
+        pool.acquire.side_effect = ZeroDivisionError("boom")
+        torn_down = []
+
+        with patch('asgi_app.get_async_pool', return_value=pool), \
+                patch.dict(asgi_app.flask_app.teardown_request_funcs, {None: [torn_down.append]}):
+            status, _, _ = request("GET", "/api/history/alice")
+
+        self.assertEqual(status, 500)
+        self.assertEqual(len(torn_down), 1)
+        self.assertIsInstance(torn_down[0], ZeroDivisionError)
+
+    def test_other_routes_go_to_flask(self):
+        status, headers, body = request("GET", "/api/health")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["status"], "healthy")
+        self.assertEqual(request("GET", "/nowhere")[0], 404)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,127 @@
+import unittest
+import asyncio, threading, time
+from coalesce import SingleFlight, AsyncSingleFlight, IdempotencyStore, KeyConflict, request_key
+
+PARAMS = {"username": "alice", "name": "Alice", "age": 25, "topic": "Python",
+          "domain": "", "time_available": "1 hour", "context": ""}
+
+class TestRequestKey(unittest.TestCase):
+
+    def test_normalized_body(self):
+        self.assertEqual(request_key(PARAMS), request_key(dict(PARAMS, topic="  python ")))
+
+    def test_username_is_part_of_the_key(self):
+        self.assertNotEqual(request_key(PARAMS), request_key(dict(PARAMS, username="bob")))
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"answer": 42}
+
+        leader = threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+                     for _ in range(3)]
+        for t in followers:
+            t.start()
+        while flights.stats()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        for t in [leader] + followers:
+            t.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertTrue(all(result == {"answer": 42} for result, _ in results))
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+    def test_error_reaches_followers_and_key_is_released(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def failing():
+            started.set()
+            release.wait(5)
+            raise ValueError("model down")
+
+        def call():
+            try:
+                flights.do("k", failing)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=call))
+        threads[1].start()
+        while flights.stats()["coalesced"] < 1:
+            time.sleep(0.001)
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(flights.do("k", lambda: "fresh"), ("fresh", False))
+
+class TestAsyncSingleFlight(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"answer": 42}
+
+        async def scenario():
+            return await asyncio.gather(*(flights.do("k", slow) for _ in range(4)))
+
+        results = asyncio.run(scenario())
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+    def test_error_reaches_followers(self):
+        flights = AsyncSingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("model down")
+
+        async def scenario():
+            return await asyncio.gather(flights.do("k", failing), flights.do("k", failing),
+                                        return_exceptions=True)
+
+        self.assertTrue(all(isinstance(r, ValueError) for r in asyncio.run(scenario())))
+
+class TestIdempotencyStore(unittest.TestCase):
+
+    def test_replay_and_conflict(self):
+        store = IdempotencyStore(ttl=60)
+        store.set("alice", "key-1", "fp", {"success": True})
+
+        self.assertEqual(store.get("alice", "key-1", "fp"), {"success": True})
+        self.assertIsNone(store.get("bob", "key-1", "fp"))
+        with self.assertRaises(KeyConflict):
+            store.get("alice", "key-1", "other-fp")
+        self.assertEqual(store.stats()["replays"], 1)
+        self.assertEqual(store.stats()["conflicts"], 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,159 @@
+import unittest
+from unittest.mock import MagicMock
+import asyncio, threading
+from db_pool import ConnectionPool, AsyncConnectionPool, PoolTimeout
+
+def make_raw():
+    raw = MagicMock()
+    raw.in_transaction = False
+    return raw
+
+class TestConnectionPool(unittest.TestCase):
+
+    def test_connection_is_reused(self):
+        factory = MagicMock(side_effect=make_raw)
+        pool = ConnectionPool(factory, size=2, timeout=0.1)
+
+        conn = pool.acquire()
+        conn.close()
+        conn = pool.acquire()
+        conn.close()
+
+        self.assertEqual(factory.call_count, 1)
+        stats = pool.stats()
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["idle"], 1)
+        self.assertEqual(stats["in_use"], 0)
+
+    def test_checkout_timeout_fails_fast(self):
+        pool = ConnectionPool(make_raw, size=1, timeout=0.05)
+        held = pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        self.assertEqual(pool.stats()["timeouts"], 1)
+        held.close()
+        pool.acquire().close()
+
+    def test_waiter_gets_released_connection(self):
+        pool = ConnectionPool(make_raw, size=1, timeout=2)
+        held = pool.acquire()
+        got = []
+
+        t = threading.Thread(target=lambda: got.append(pool.acquire()))
+        t.start()
+        held.close()
+        t.join(2)
+
+        self.assertEqual(len(got), 1)
+        self.assertGreater(pool.stats()["wait_time_max"], 0)
+
+    def test_stale_connection_is_replaced(self):
+        stale = make_raw()
+        stale.ping.side_effect = Exception("MySQL server has gone away")
+        fresh = make_raw()
+        factory = MagicMock(side_effect=[stale, fresh])
+        pool = ConnectionPool(factory, size=1, timeout=0.1, ping_interval=0)
+
+        pool.acquire().close()
+        conn = pool.acquire()
+
+        self.assertIs(conn._raw, fresh)
+        self.assertTrue(stale.close.called)
+        self.assertEqual(pool.stats()["reconnects"], 1)
+
+    def test_uncommitted_work_is_rolled_back_on_release(self):
+        raw = make_raw()
+        raw.in_transaction = True
+        pool = ConnectionPool(lambda: raw, size=1)
+
+        pool.acquire().close()
+
+        self.assertTrue(raw.rollback.called)
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_discarded_connection_frees_slot(self):
+        factory = MagicMock(side_effect=make_raw)
+        pool = ConnectionPool(factory, size=1, timeout=0.1)
+
+        conn = pool.acquire()
+        raw = conn._raw
+        conn.discard()
+        conn.close()
+
+        self.assertTrue(raw.close.called)
+        self.assertEqual(pool.stats()["in_use"], 0)
+        pool.acquire().close()
+        self.assertEqual(factory.call_count, 2)
+
+    def test_factory_failure_frees_slot(self):
+        factory = MagicMock(side_effect=[Exception("refused"), make_raw()])
+        pool = ConnectionPool(factory, size=1, timeout=0.05)
+
+        with self.assertRaises(Exception):
+            pool.acquire()
+        pool.acquire().close()
+
+        self.assertEqual(pool.stats()["created"], 1)
+
+class FakeAsyncConnection:
+
+    def __init__(self):
+        self.in_transaction = False
+        self.rolled_back = 0
+
+    async def rollback(self):
+        self.rolled_back += 1
+        self.in_transaction = False
+
+    async def close(self):
+        pass
+
+class TestAsyncConnectionPool(unittest.TestCase):
+
+    def test_connection_is_reused_and_rolled_back(self):
+        created = []
+
+        async def factory():
+            created.append(FakeAsyncConnection())
+            return created[-1]
+
+        async def scenario():
+            pool = AsyncConnectionPool(factory, size=2, timeout=0.1)
+            async with await pool.acquire():
+                created[0].in_transaction = True
+            async with await pool.acquire():
+                pass
+            return pool.stats()
+
+        stats = asyncio.run(scenario())
+
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0].rolled_back, 1)
+        self.assertEqual((stats["checkouts"], stats["idle"], stats["in_use"]), (2, 1, 0))
+
+    def test_waiter_gets_released_connection_or_times_out(self):
+        async def factory():
+            return FakeAsyncConnection()
+
+        async def scenario():
+            pool = AsyncConnectionPool(factory, size=1, timeout=0.05)
+            held = await pool.acquire()
+            with self.assertRaises(PoolTimeout):
+                await pool.acquire()
+
+            pool.timeout = 2
+            waiter = asyncio.ensure_future(pool.acquire())
+            await asyncio.sleep(0.01)
+            await held.close()
+            await (await waiter).close()
+            return pool.stats()
+
+        stats = asyncio.run(scenario())
+
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["created"], 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
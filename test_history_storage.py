@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import MagicMock
+import history_storage
+import prompts
+
+PARAMS = {
+    "name": "Tester", "age": 25, "domain": "student", "time_available": "2 hours",
+    "topic": "Python", "context": "Exam next week", "recent_history_summary": "- Loops\n- Lists"
+}
+
+RESPONSE = "### Task 1 – Variables\n\n**Detailed Description**\nLearn variables. " * 20
+
+class TestHistoryStorage(unittest.TestCase):
+
+    def test_round_trip(self):
+        prompt = prompts.render(prompts.CURRENT_VERSION, PARAMS)
+        row = history_storage.encode(prompt, RESPONSE)
+
+        self.assertIsNone(row['user_prompt'])
+        self.assertIsNone(row['ai_response'])
+        self.assertEqual(row['prompt_template'], prompts.CURRENT_VERSION)
+        self.assertLess(len(row['prompt_params']) + len(row['response_z']), len(prompt) + len(RESPONSE))
+
+        decoded = history_storage.decode(dict(row))
+        self.assertEqual(decoded['user_prompt'], prompt)
+        self.assertEqual(decoded['ai_response'], RESPONSE)
+        self.assertNotIn('response_z', decoded)
+
+    def test_unknown_prompt_kept_as_text(self):
+        row = history_storage.encode("hand-written prompt", "answer")
+
+        self.assertEqual(row['user_prompt'], "hand-written prompt")
+        self.assertIsNone(row['prompt_template'])
+        self.assertEqual(history_storage.decode(dict(row))['ai_response'], "answer")
+
+    def test_only_requested_fields_are_decoded(self):
+        self.assertEqual(history_storage.storage_columns(['created_at']), ['created_at'])
+
+        row = history_storage.decode({"created_at": "x"})
+        self.assertEqual(row, {"created_at": "x"})
+
+    def test_backfill_converts_in_batches(self):
+        prompt = prompts.render(prompts.CURRENT_VERSION, PARAMS)
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        cursor.fetchall.side_effect = [
+            [{"id": 1, "user_prompt": prompt, "ai_response": "a"},
+             {"id": 2, "user_prompt": "custom", "ai_response": "b"}],
+            []
+        ]
+
+        converted = history_storage.backfill(conn, batch_size=2, log=lambda msg: None)
+
+        self.assertEqual(converted, 2)
+        updates = cursor.executemany.call_args[0][1]
+        self.assertEqual(updates[0][:2], (None, prompts.CURRENT_VERSION))
+        self.assertEqual(updates[1][0], "custom")
+        self.assertEqual(cursor.execute.call_args_list[-1][0][1], (2, 2))
+        self.assertEqual(conn.commit.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
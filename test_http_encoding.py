@@ -0,0 +1,89 @@
+import unittest
+import gzip, os
+from datetime import datetime
+from unittest.mock import patch
+from flask import Flask, jsonify, Response
+from flask.json.provider import DefaultJSONProvider
+import http_encoding
+import metrics
+
+ROWS = [{"id": i, "user_prompt": "Suggest tasks " * 50, "ai_response": "### Task 1 – Café\n" * 40,
+         "created_at": datetime(2024, 5, 1, 10, 30, i)} for i in range(20)]
+
+def make_app(**env):
+    app = Flask(__name__)
+    with patch.dict(os.environ, env):
+        metrics.init_app(app)
+        http_encoding.init_app(app)
+
+    @app.route('/history')
+    def history():
+        return jsonify({"history": ROWS, "next_cursor": None})
+
+    @app.route('/small')
+    def small():
+        return jsonify({"ok": True})
+
+    @app.route('/stream')
+    def stream():
+        return Response((("x" * 100 + "\n") for _ in range(50)), mimetype='application/x-ndjson')
+
+    return app
+
+@unittest.skipIf(http_encoding.orjson is None, "orjson not installed")
+class TestFastJSONProvider(unittest.TestCase):
+
+    def test_same_data_as_stdlib(self):
+        app = Flask(__name__)
+        fast = http_encoding.FastJSONProvider(app)
+        stdlib = DefaultJSONProvider(app)
+        payload = {"b": 1, "a": ROWS[:2], "big": 2 ** 70}
+
+        self.assertEqual(fast.loads(fast.dumps(payload)), stdlib.loads(stdlib.dumps(payload)))
+        self.assertIn('"created_at":"Wed, 01 May 2024 10:30:00 GMT"', fast.dumps(ROWS[0]))
+        self.assertTrue(fast.dumps({"b": 1, "a": 2}).startswith('{"a"'))
+
+    def test_env_selects_stdlib(self):
+        with patch.dict(os.environ, {"JSON_PROVIDER": "stdlib"}):
+            provider = http_encoding.json_provider_from_env(Flask(__name__))
+        self.assertNotIsInstance(provider, http_encoding.FastJSONProvider)
+
+class TestResponseEncoding(unittest.TestCase):
+
+    def test_gzip_when_accepted(self):
+        client = make_app().test_client()
+
+        plain = client.get('/history')
+        response = client.get('/history', headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertLess(len(response.data), len(plain.data))
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertIn("serialize", response.headers["Server-Timing"])
+
+    def test_small_refused_and_streamed_bodies_are_not_compressed(self):
+        client = make_app().test_client()
+
+        self.assertNotIn("Content-Encoding", client.get('/small', headers={"Accept-Encoding": "gzip"}).headers)
+        self.assertNotIn("Content-Encoding", client.get('/history', headers={"Accept-Encoding": "gzip;q=0"}).headers)
+        self.assertNotIn("Content-Encoding", client.get('/stream', headers={"Accept-Encoding": "gzip"}).headers)
+
+    def test_unchanged_history_returns_304(self):
+        client = make_app().test_client()
+
+        first = client.get('/history', headers={"Accept-Encoding": "gzip"})
+        etag = first.headers["ETag"]
+        again = client.get('/history', headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+
+        self.assertTrue(etag.startswith('W/'))
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b"")
+        self.assertEqual(client.get('/history', headers={"If-None-Match": 'W/"stale"'}).status_code, 200)
+
+    def test_etags_can_be_disabled(self):
+        client = make_app(ETAGS="off").test_client()
+        self.assertNotIn("ETag", client.get('/history').headers)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,90 @@
+import unittest
+import threading, time
+from jobs import JobQueue, MemoryJobStore, QueueFull
+
+def wait_for(store, job_id, status, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job and job["status"] == status:
+            return job
+        time.sleep(0.01)
+    return store.get(job_id)
+
+class TestJobQueue(unittest.TestCase):
+
+    def test_job_runs_and_result_is_stored(self):
+        store = MemoryJobStore()
+        jobs = JobQueue(lambda payload: {"echo": payload["topic"]}, store, workers=1)
+
+        job_id = jobs.submit("alice", {"topic": "Python"})
+        job = wait_for(store, job_id, "done")
+
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["result"], {"echo": "Python"})
+        self.assertEqual(jobs.stats()["completed"], 1)
+
+    def test_failure_is_recorded(self):
+        def run(payload):
+            raise RuntimeError("model down")
+
+        store = MemoryJobStore()
+        jobs = JobQueue(run, store, workers=1)
+
+        job = wait_for(store, jobs.submit("alice", {}), "failed")
+
+        self.assertEqual(job["error"], "model down")
+        self.assertEqual(jobs.stats()["failed"], 1)
+
+    def test_full_queue_rejects(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        jobs = JobQueue(lambda payload: release.wait(2), MemoryJobStore(), workers=1, max_queue=1)
+
+        jobs.submit("alice", {})
+        deadline = time.time() + 2
+        while jobs.stats()["running"] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        jobs.submit("alice", {})
+
+        with self.assertRaises(QueueFull):
+            jobs.submit("alice", {})
+        self.assertEqual(jobs.stats()["rejected"], 1)
+        self.assertEqual(jobs.stats()["queue_depth"], 1)
+
+    def test_jobs_of_a_dead_worker_are_lost(self):
+        store = MemoryJobStore()
+        store.create("orphan", "alice", expires_at=time.time() + 60)
+        store.update("orphan", "running")
+        store._jobs["orphan"]["updated_at"] -= 10
+        jobs = JobQueue(lambda payload: payload, store, workers=1, heartbeat_interval=1)
+
+        self.assertEqual(jobs.get("orphan")["status"], "lost")
+
+        jobs.start()
+        job = wait_for(store, "orphan", "lost")
+        self.assertEqual(job["status"], "lost")
+        self.assertIn("submit it again", job["error"])
+
+    def test_heartbeat_keeps_live_jobs_running(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        store = MemoryJobStore()
+        jobs = JobQueue(lambda payload: release.wait(2), store, workers=1, heartbeat_interval=0.05)
+
+        job_id = jobs.submit("alice", {})
+        time.sleep(0.3)
+
+        self.assertEqual(jobs.get(job_id)["status"], "running")
+        release.set()
+        self.assertEqual(wait_for(store, job_id, "done")["status"], "done")
+
+    def test_expired_jobs_are_hidden_and_purged(self):
+        store = MemoryJobStore()
+        store.create("old", "alice", expires_at=time.time() - 1)
+
+        self.assertIsNone(store.get("old"))
+        self.assertEqual(store.purge_expired(), 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
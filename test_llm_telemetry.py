@@ -0,0 +1,132 @@
+import unittest
+from unittest.mock import MagicMock
+import os, tempfile, time
+import llm_telemetry
+from llm_telemetry import (
+    make_record, parse_window, summarize, TelemetryWriter,
+    MemoryTelemetryStore, JSONLTelemetryStore, MySQLTelemetryStore
+)
+
+def record(model="m1", latency=100.0, outcome="ok", reason="primary", **extra):
+    row = {
+        "created_at": time.time(), "model": model, "kind": "sync", "reason": reason,
+        "outcome": outcome, "error": None, "prompt_chars": 1000, "prompt_tokens": 250,
+        "completion_tokens": 400, "ttft_ms": None, "latency_ms": latency
+    }
+    row.update(extra)
+    return row
+
+class TestMakeRecord(unittest.TestCase):
+
+    def test_usage_and_timing(self):
+        usage = MagicMock(prompt_tokens=12, completion_tokens=34)
+        start = time.monotonic() - 0.5
+
+        row = make_record("m1", "stream", "hedge", "hello", start,
+                          first_token_at=start + 0.1, usage=usage)
+
+        self.assertEqual(row["prompt_tokens"], 12)
+        self.assertEqual(row["completion_tokens"], 34)
+        self.assertEqual(row["ttft_ms"], 100.0)
+        self.assertGreaterEqual(row["latency_ms"], 500)
+        self.assertEqual(row["prompt_chars"], 5)
+        self.assertEqual((row["reason"], row["outcome"]), ("hedge", "ok"))
+
+    def test_missing_usage_and_error_outcomes(self):
+        class APITimeoutError(Exception):
+            pass
+
+        row = make_record("m1", "sync", "primary", "p", time.monotonic(),
+                          usage=MagicMock(), error=APITimeoutError("slow"))
+
+        self.assertIsNone(row["prompt_tokens"])
+        self.assertEqual(row["outcome"], "timeout")
+        self.assertIn("slow", row["error"])
+        self.assertEqual(
+            make_record("m1", "sync", "primary", "p", time.monotonic(), error=ValueError())["outcome"],
+            "error"
+        )
+
+class TestWriter(unittest.TestCase):
+
+    def test_records_are_written_in_batches(self):
+        store = MagicMock()
+        writer = TelemetryWriter(store, batch_size=2, flush_interval=60)
+
+        for i in range(5):
+            writer.record(record(latency=i))
+        writer.flush()
+
+        self.assertEqual([len(c[0][0]) for c in store.write.call_args_list], [2, 2, 1])
+        self.assertEqual(writer.stats()["written"], 5)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        writer = TelemetryWriter(MemoryTelemetryStore(), flush_interval=60, max_queue=1)
+        writer.record(record())
+        writer.record(record())
+
+        self.assertEqual(writer.stats()["dropped"], 1)
+
+    def test_store_failure_is_contained(self):
+        store = MagicMock()
+        store.write.side_effect = Exception("db down")
+        writer = TelemetryWriter(store, flush_interval=60)
+        writer.record(record())
+
+        writer.flush()
+
+        self.assertEqual(writer.stats()["write_errors"], 1)
+
+class TestStores(unittest.TestCase):
+
+    def test_jsonl_round_trip_respects_window(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = JSONLTelemetryStore(os.path.join(tmp, "calls.jsonl"))
+            store.write([record(created_at=time.time() - 7200), record(model="m2")])
+
+            rows = store.read(time.time() - 3600)
+
+        self.assertEqual([r["model"] for r in rows], ["m2"])
+
+    def test_mysql_uses_executemany(self):
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        store = MySQLTelemetryStore(lambda: conn)
+
+        store.write([record(), record()])
+
+        sql, rows = cursor.executemany.call_args[0]
+        self.assertTrue(sql.startswith("INSERT INTO llm_calls (created_at,model,"))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(len(rows[0]), len(llm_telemetry.FIELDS))
+        self.assertTrue(conn.commit.called)
+        self.assertTrue(conn.close.called)
+
+class TestReport(unittest.TestCase):
+
+    def test_parse_window(self):
+        self.assertEqual(parse_window("90"), 90)
+        self.assertEqual(parse_window("15m"), 900)
+        self.assertEqual(parse_window("24h"), 86400)
+        self.assertEqual(parse_window("7d"), 604800)
+        with self.assertRaises(ValueError):
+            parse_window("yesterday")
+
+    def test_percentiles_per_model(self):
+        rows = [record(latency=float(i)) for i in range(1, 101)]
+        rows.append(record(outcome="error", reason="fallback", latency=5.0))
+        rows.append(record(model="m2", latency=50.0, kind="stream", ttft_ms=20.0))
+
+        report = summarize(rows)
+
+        m1 = report["m1"]
+        self.assertEqual(m1["calls"], 101)
+        self.assertEqual(m1["outcomes"], {"ok": 100, "error": 1})
+        self.assertEqual(m1["reasons"], {"primary": 100, "fallback": 1})
+        self.assertEqual(m1["latency_ms"]["p50"], 51.0)
+        self.assertEqual(m1["latency_ms"]["p99"], 99.0)
+        self.assertIsNone(m1["ttft_ms"])
+        self.assertEqual(report["m2"]["ttft_ms"]["p50"], 20.0)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
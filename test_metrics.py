@@ -0,0 +1,100 @@
+import unittest
+import os, subprocess, sys, tempfile, time
+from unittest.mock import patch
+from flask import Flask, jsonify
+import metrics
+from metrics import Registry, merge, render
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_buckets(self):
+        registry = Registry(buckets=(0.1, 1))
+        registry.observe("latency", {"route": "/x"}, 0.05)
+        registry.observe("latency", {"route": "/x"}, 0.5)
+        registry.observe("latency", {"route": "/x"}, 5)
+
+        text = render(*merge([registry.snapshot()]), buckets=(0.1, 1))
+
+        self.assertIn('latency_bucket{route="/x",le="0.1"} 1', text)
+        self.assertIn('latency_bucket{route="/x",le="1"} 2', text)
+        self.assertIn('latency_bucket{route="/x",le="+Inf"} 3', text)
+        self.assertIn('latency_count{route="/x"} 3', text)
+
+    def test_merge_sums_workers(self):
+        a, b = Registry(), Registry()
+        a.inc("requests_total", {"route": "/x"}, help="Requests")
+        b.inc("requests_total", {"route": "/x"}, 2)
+        b.add_collector(lambda: [("pool_in_use", {}, 3)])
+
+        text = render(*merge([a.snapshot(), b.snapshot()]))
+
+        self.assertIn("# TYPE requests_total counter", text)
+        self.assertIn('requests_total{route="/x"} 3', text)
+        self.assertIn("pool_in_use 3", text)
+
+    def test_snapshot_files_are_aggregated(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = metrics.SnapshotWriter(tmp)
+            writer.maybe_write(force=True)
+            with open(os.path.join(tmp, f"{os.getppid()}.json"), "w") as f:
+                f.write('{"counters": [["requests_total", [["route", "/x"]], 5]]}')
+            with open(os.path.join(tmp, "broken.json"), "w") as f:
+                f.write('{not json')
+
+            counters, _, _, _ = merge(writer.read_all())
+
+            self.assertGreaterEqual(counters[("requests_total", (("route", "/x"),))], 5)
+
+    def test_snapshots_of_exited_or_silent_workers_are_dropped(self):
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = metrics.SnapshotWriter(tmp)
+            snapshot = '{"counters": [["requests_total", [], 5]]}'
+            for pid in (exited.pid, os.getppid()):
+                with open(os.path.join(tmp, f"{pid}.json"), "w") as f:
+                    f.write(snapshot)
+            silent = time.time() - 10 * writer.interval
+            os.utime(os.path.join(tmp, f"{os.getppid()}.json"), (silent, silent))
+            writer.maybe_write(force=True)
+
+            self.assertEqual(len(writer.read_all()), 1)
+            self.assertEqual(os.listdir(tmp), [f"{os.getpid()}.json"])
+
+            writer.remove()
+            self.assertEqual(os.listdir(tmp), [])
+
+    def test_phases_and_server_timing(self):
+        app = Flask(__name__)
+        metrics.init_app(app)
+
+        @app.route('/work')
+        def work():
+            with metrics.phase("db_query"):
+                pass
+            return jsonify({"ok": True})
+
+        response = app.test_client().get('/work')
+
+        timing = response.headers['Server-Timing']
+        self.assertIn('db_query;dur=', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_slow_request_log(self):
+        app = Flask(__name__)
+        with patch.dict(os.environ, {"SLOW_REQUEST_MS": "0.000001"}):
+            metrics.init_app(app)
+        app.route('/slow')(lambda: "ok")
+
+        with patch('builtins.print') as mock_print:
+            app.test_client().get('/slow')
+
+        self.assertEqual(mock_print.call_args[0][0], "Slow request:")
+
+    def test_phase_outside_request_is_a_no_op(self):
+        with metrics.phase("anything"):
+            pass
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import MagicMock
+import os, time
+import migrations
+
+class TestMigrationRunner(unittest.TestCase):
+
+    def make_conn(self, applied):
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        cursor.fetchall.return_value = [(v,) for v in applied]
+        return conn, cursor
+
+    def test_pending_migrations_run_in_order(self):
+        conn, cursor = self.make_conn(applied=[1])
+        ran = []
+        steps = [
+            (1, "one", lambda c: ran.append(1)),
+            (2, "two", lambda c: ran.append(2)),
+            (3, "three", lambda c: ran.append(3)),
+        ]
+
+        done = migrations.migrate(conn, steps, log=lambda msg: None)
+
+        self.assertEqual(done, [2, 3])
+        self.assertEqual(ran, [2, 3])
+        cursor.execute.assert_any_call(
+            "INSERT INTO schema_migrations (version,name) VALUES (%s,%s)", (3, "three")
+        )
+
+    def test_rerun_is_a_no_op(self):
+        conn, cursor = self.make_conn(applied=[v for v, _, _ in migrations.MIGRATIONS])
+
+        self.assertEqual(migrations.migrate(conn, log=lambda msg: None), [])
+        self.assertFalse(conn.commit.called)
+
+    def test_existing_index_is_not_recreated(self):
+        cursor = MagicMock()
+        cursor.fetchone.return_value = (1,)
+
+        migrations.add_index(cursor, "history", "idx_history_username_timestamp", "username, timestamp")
+
+        self.assertEqual(cursor.execute.call_count, 1)
+
+    def test_versions_are_unique_and_ordered(self):
+        versions = [v for v, _, _ in migrations.MIGRATIONS]
+        self.assertEqual(versions, sorted(set(versions)))
+
+
+# Runs against a throwaway local MySQL/MariaDB database, e.g.
+#   MYSQL_TEST_DATABASE=smartfreetime_test python -m pytest test_migrations.py
+@unittest.skipUnless(os.getenv("MYSQL_TEST_DATABASE"), "MYSQL_TEST_DATABASE not set")
+class TestHotQueriesUseIndexes(unittest.TestCase):
+
+    HOT_QUERIES = [
+        ("recent titles",
+         "SELECT title FROM history WHERE username=%s ORDER BY timestamp DESC, id DESC LIMIT 3"),
+        ("title history page",
+         "SELECT title,timestamp,id FROM history WHERE username=%s "
+         "ORDER BY timestamp DESC, id DESC LIMIT 21"),
+        ("ai history page",
+         "SELECT user_prompt,ai_response,created_at,id FROM ai_history WHERE username=%s "
+         "ORDER BY created_at DESC, id DESC LIMIT 21"),
+        ("delete history",
+         "DELETE FROM history WHERE username=%s"),
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        import mysql.connector
+        cls.conn = mysql.connector.connect(
+            host=os.getenv("MYSQL_HOST", "127.0.0.1"),
+            user=os.getenv("MYSQL_USER"),
+            password=os.getenv("MYSQL_PASSWORD"),
+            database=os.getenv("MYSQL_TEST_DATABASE"),
+            port=int(os.getenv("MYSQL_PORT", 3306))
+        )
+        migrations.migrate(cls.conn, log=lambda msg: None)
+
+        cursor = cls.conn.cursor()
+        now = int(time.time())
+        cursor.executemany(
+            "INSERT INTO history (username,title,timestamp) VALUES (%s,%s,%s)",
+            [(f"user{i % 50}", f"Task {i}", now + i) for i in range(2000)]
+        )
+        cursor.executemany(
+            "INSERT INTO ai_history (username,user_prompt,ai_response) VALUES (%s,%s,%s)",
+            [(f"user{i % 50}", "prompt", "response") for i in range(2000)]
+        )
+        cls.conn.commit()
+        cursor.execute("ANALYZE TABLE history, ai_history")
+        cursor.fetchall()
+        cursor.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cursor = cls.conn.cursor()
+        cursor.execute("DELETE FROM history WHERE username LIKE 'user%'")
+        cursor.execute("DELETE FROM ai_history WHERE username LIKE 'user%'")
+        cls.conn.commit()
+        cursor.close()
+        cls.conn.close()
+
+    def test_hot_queries_use_an_index(self):
+        cursor = self.conn.cursor(dictionary=True)
+        try:
+            for label, sql in self.HOT_QUERIES:
+                with self.subTest(query=label):
+                    cursor.execute("EXPLAIN " + sql, ("user7",))
+                    plan = cursor.fetchall()[0]
+                    self.assertIsNotNone(plan["key"], f"{label} does not use an index: {plan}")
+                    self.assertNotIn("filesort", plan.get("Extra") or "", f"{label} sorts rows: {plan}")
+        finally:
+            cursor.close()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,193 @@
+import unittest
+from unittest.mock import patch
+import asyncio, threading, time
+from model_router import CircuitBreaker, ModelRouter, ModelUnavailable
+
+class TestModelRouter(unittest.TestCase):
+
+    def make_router(self, call, **kwargs):
+        router = ModelRouter(call, ["primary", "backup"], **kwargs)
+        self.addCleanup(router.shutdown)
+        return router
+
+    def test_primary_answers(self):
+        router = self.make_router(lambda prompt, model, timeout, reason: f"{model} says hi")
+        self.assertEqual(router.generate("p"), ("primary says hi", "primary"))
+
+    def test_falls_back_on_error(self):
+        def call(prompt, model, timeout, reason):
+            if model == "primary":
+                raise RuntimeError("boom")
+            return "ok"
+
+        router = self.make_router(call)
+        self.assertEqual(router.generate("p"), ("ok", "backup"))
+        self.assertEqual(router.snapshot()["primary"]["errors"], 1)
+
+    def test_empty_answer_is_a_failure(self):
+        router = self.make_router(lambda prompt, model, timeout, reason: "" if model == "primary" else "ok")
+        self.assertEqual(router.generate("p")[1], "backup")
+
+    def test_slow_primary_is_hedged(self):
+        release = threading.Event()
+
+        def call(prompt, model, timeout, reason):
+            if model == "primary":
+                release.wait(2)
+                return "late"
+            return "fast"
+
+        router = self.make_router(call, hedge_default_delay=0.05)
+        start = time.monotonic()
+        self.assertEqual(router.generate("p"), ("fast", "backup"))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(router.snapshot()["primary"]["hedges"], 1)
+        release.set()
+
+    def test_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        router = self.make_router(lambda prompt, model, timeout, reason: release.wait(2) and "x",
+                                  hedge_default_delay=0.01)
+        with self.assertRaises(ModelUnavailable):
+            router.generate("p", deadline=0.1)
+
+    def test_time_waiting_for_a_worker_does_not_trigger_hedges(self):
+        calls = []
+
+        def call(prompt, model, timeout, reason):
+            calls.append(reason)
+            time.sleep(0.3)
+            return "ok"
+
+        router = self.make_router(call, hedge_default_delay=0.5, max_workers=1)
+        threads = [threading.Thread(target=router.generate, args=("p",)) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(calls, ["primary", "primary"])
+        self.assertEqual(router.snapshot()["primary"]["hedges"], 0)
+
+    def test_attempts_past_the_deadline_are_cancelled(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        calls = []
+
+        def call(prompt, model, timeout, reason):
+            calls.append(prompt)
+            release.wait(2)
+            return "x"
+
+        router = self.make_router(call, max_workers=1)
+        busy = threading.Thread(target=router.generate, args=("busy",))
+        busy.start()
+        time.sleep(0.05)
+
+        with self.assertRaises(ModelUnavailable):
+            router.generate("late", deadline=0.1)
+        release.set()
+        busy.join()
+
+        self.assertEqual(calls, ["busy"])
+
+    def test_open_breaker_skips_model(self):
+        calls = []
+
+        def call(prompt, model, timeout, reason):
+            calls.append(model)
+            if model == "primary":
+                raise RuntimeError("down")
+            return "ok"
+
+        router = self.make_router(call, breaker_threshold=2, breaker_cooldown=60)
+        router.generate("p")
+        router.generate("p")
+        calls.clear()
+        router.generate("p")
+
+        self.assertEqual(calls, ["backup"])
+        self.assertEqual(router.snapshot()["primary"]["breaker"], "open")
+
+    def test_async_hedge_cancels_the_loser(self):
+        cancelled = []
+
+        async def acall(prompt, model, timeout, reason):
+            if model == "primary":
+                try:
+                    await asyncio.sleep(2)
+                except asyncio.CancelledError:
+                    cancelled.append(model)
+                    raise
+                return "late"
+            return "fast"
+
+        router = self.make_router(None, hedge_default_delay=0.05)
+        result = asyncio.run(router.agenerate("p", acall))
+
+        self.assertEqual(result, ("fast", "backup"))
+        self.assertEqual(cancelled, ["primary"])
+        self.assertEqual(router.snapshot()["primary"]["hedges"], 1)
+
+    def test_async_falls_back_and_shares_breakers(self):
+        async def acall(prompt, model, timeout, reason):
+            if model == "primary":
+                raise RuntimeError("down")
+            return "ok"
+
+        router = self.make_router(None, breaker_threshold=1)
+        self.assertEqual(asyncio.run(router.agenerate("p", acall)), ("ok", "backup"))
+        self.assertEqual(router.snapshot()["primary"]["breaker"], "open")
+
+    def test_half_open_backup_trial_is_kept_until_it_is_called(self):
+        calls = []
+        primary_up = [True]
+
+        def call(prompt, model, timeout, reason):
+            calls.append(model)
+            if model == "primary" and not primary_up[0]:
+                raise RuntimeError("primary down")
+            return f"{model} ok"
+
+        router = self.make_router(call, breaker_threshold=1, breaker_cooldown=0.2)
+        router.breakers["backup"].record_failure()
+        time.sleep(0.25)
+        self.assertEqual(router.snapshot()["backup"]["breaker"], "half-open")
+
+        self.assertEqual(router.generate("p"), ("primary ok", "primary"))
+        primary_up[0] = False
+        self.assertEqual(router.generate("p"), ("backup ok", "backup"))
+        self.assertEqual(calls, ["primary", "primary", "backup"])
+
+    def test_async_hedge_clock_keeps_running_across_wakeups(self):
+        async def acall(prompt, model, timeout, reason):
+            if model == "a":
+                await asyncio.sleep(0.6)
+                raise RuntimeError("a down")
+            if model == "b":
+                await asyncio.sleep(5)
+            return model
+
+        router = ModelRouter(None, ["a", "b", "c"], hedge_default_delay=0.4)
+        self.addCleanup(router.shutdown)
+        start = time.monotonic()
+        result = asyncio.run(router.agenerate("p", acall))
+
+        # b is hedged at 0.4s and c at 0.8s; a failing at 0.6s must not restart b's clock
+        self.assertEqual(result, ("c", "c"))
+        self.assertLess(time.monotonic() - start, 0.9)
+
+    def test_breaker_half_open_trial(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=10)
+        with patch('model_router.time.monotonic', return_value=100):
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+        with patch('model_router.time.monotonic', return_value=111):
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())
+            breaker.record_success()
+            self.assertEqual(breaker.state, "closed")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,38 @@
+import unittest
+from datetime import datetime
+from pagination import decode_cursor, encode_cursor, parse_page_args
+
+class TestPagination(unittest.TestCase):
+
+    def test_cursor_round_trip(self):
+        created_at = datetime(2024, 5, 1, 12, 30, 0)
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+
+    def test_integer_sort_key(self):
+        self.assertEqual(decode_cursor(encode_cursor(1700000000, 5)), (1700000000, 5))
+
+    def test_bad_cursor(self):
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor")
+
+    def test_defaults_are_unpaginated(self):
+        limit, cursor, fields = parse_page_args({}, ['a','b'], ['a'])
+        self.assertEqual((limit, cursor, fields), (0, None, ['a']))
+
+    def test_limit_is_capped(self):
+        limit, _, _ = parse_page_args({"limit": "500"}, ['a'], ['a'], max_limit=100)
+        self.assertEqual(limit, 100)
+
+    def test_cursor_implies_limit(self):
+        cursor = encode_cursor(datetime(2024, 1, 1), 1)
+        limit, _, _ = parse_page_args({"cursor": cursor}, ['a'], ['a'], max_limit=50)
+        self.assertEqual(limit, 50)
+
+    def test_fields_are_validated(self):
+        _, _, fields = parse_page_args({"fields": "a, b"}, ['a','b'], ['a'])
+        self.assertEqual(fields, ['a','b'])
+        with self.assertRaises(ValueError):
+            parse_page_args({"fields": "a,secret"}, ['a','b'], ['a'])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,104 @@
+import unittest
+from unittest.mock import MagicMock
+import time
+from ai_cache import SQLiteCacheStore
+from recent_titles import RecentTitlesCache
+
+class TestRecentTitlesCache(unittest.TestCase):
+
+    def test_miss_fill_then_hit(self):
+        cache = RecentTitlesCache(size=3)
+
+        self.assertIsNone(cache.get("alice"))
+        cache.fill("alice", ["C", "B", "A"], cache.version())
+
+        self.assertEqual(cache.get("alice"), ["C", "B", "A"])
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_add_keeps_newest_first_and_bounded(self):
+        cache = RecentTitlesCache(size=3)
+        cache.fill("alice", ["B", "A"], cache.version())
+
+        cache.add("alice", ["C", "D"])
+
+        self.assertEqual(cache.get("alice"), ["D", "C", "B"])
+
+    def test_add_for_uncached_user_does_not_create_entry(self):
+        cache = RecentTitlesCache()
+        cache.add("alice", ["A"])
+        self.assertIsNone(cache.get("alice"))
+
+    def test_fill_racing_a_write_is_dropped(self):
+        cache = RecentTitlesCache()
+        version = cache.version()          # request starts its database read
+        cache.add("alice", ["New"])         # another request saves meanwhile
+
+        cache.fill("alice", ["Old"], version)
+
+        self.assertIsNone(cache.get("alice"))
+        self.assertEqual(cache.stats()["stale_fills"], 1)
+
+    def test_invalidate(self):
+        cache = RecentTitlesCache()
+        cache.fill("alice", ["A"], cache.version())
+
+        cache.invalidate("alice")
+
+        self.assertIsNone(cache.get("alice"))
+
+    def test_entries_expire(self):
+        cache = RecentTitlesCache(ttl=0)
+        cache.fill("alice", ["A"], cache.version())
+        time.sleep(0.001)
+        self.assertIsNone(cache.get("alice"))
+
+    def test_lru_bound(self):
+        cache = RecentTitlesCache(max_users=2)
+        for user in ("a", "b", "c"):
+            cache.fill(user, ["T"], cache.version())
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["users"], 2)
+
+    def test_shared_store_is_seen_by_other_workers(self):
+        store = SQLiteCacheStore(":memory:")
+        worker1 = RecentTitlesCache(shared=store)
+        worker2 = RecentTitlesCache(shared=store)
+
+        worker1.fill("alice", ["A"], worker1.version())
+        worker2.add("alice", ["B"])
+        self.assertEqual(worker1.get("alice"), ["B", "A"])
+
+        worker2.invalidate("alice")
+        self.assertIsNone(worker1.get("alice"))
+
+    def test_concurrent_shared_adds_keep_both_titles(self):
+        store = SQLiteCacheStore(":memory:")
+        worker1 = RecentTitlesCache(shared=store)
+        worker2 = RecentTitlesCache(shared=store)
+        worker1.fill("alice", ["A"], worker1.version())
+
+        # worker2 appends between worker1's read and its write
+        read = store.get
+        def racing_get(key):
+            row = read(key)
+            if store.get is racing_get:
+                store.get = read
+                worker2.add("alice", ["C"])
+            return row
+        store.get = racing_get
+
+        worker1.add("alice", ["B"])
+        self.assertEqual(worker1.get("alice"), ["B", "C", "A"])
+
+    def test_shared_store_errors_fall_back_to_miss(self):
+        store = MagicMock()
+        store.get.side_effect = Exception("store down")
+        cache = RecentTitlesCache(shared=store)
+
+        self.assertIsNone(cache.get("alice"))
+        self.assertEqual(cache.stats()["errors"], 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
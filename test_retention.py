@@ -0,0 +1,108 @@
+import unittest
+import gzip, json, os, tempfile
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+import history_storage
+import retention
+
+def make_conn(*batches):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.fetchall.side_effect = list(batches) + [[]]
+    return conn, cursor
+
+def statements(cursor):
+    return [c[0][0] for c in cursor.execute.call_args_list]
+
+class TestPolicies(unittest.TestCase):
+
+    def test_only_tables_with_a_limit(self):
+        env = {"RETENTION_AI_HISTORY_DAYS": "90", "RETENTION_HISTORY_MAX_ROWS": "500"}
+        with patch.dict(os.environ, env):
+            self.assertEqual(retention.policies_from_env(),
+                             {"ai_history": (90.0, 0), "history": (0.0, 500)})
+
+    def test_cutoff_matches_the_time_column(self):
+        self.assertEqual(retention.cutoff_value("history", 1, now=86400 * 3), 86400 * 2)
+        self.assertIsInstance(retention.cutoff_value("ai_history", 1), datetime)
+
+class TestBatchedDeletes(unittest.TestCase):
+
+    def test_children_then_rows_one_commit_per_batch(self):
+        conn, cursor = make_conn(
+            [{"id": 1, "created_at": datetime(2024, 1, 1)}, {"id": 2, "created_at": datetime(2024, 1, 2)}],
+            [{"id": 3, "created_at": datetime(2024, 1, 3)}],
+        )
+
+        deleted = retention.delete_in_batches(conn, "ai_history", "created_at < %s",
+                                              [datetime(2024, 2, 1)], batch_size=2, pause=0)
+
+        self.assertEqual(deleted, 3)
+        self.assertEqual(conn.commit.call_count, 2)
+        sql = statements(cursor)
+        self.assertIn("DELETE FROM ai_tasks WHERE ai_history_id IN (%s,%s)", sql)
+        self.assertLess(sql.index("DELETE FROM ai_tasks WHERE ai_history_id IN (%s,%s)"),
+                        sql.index("DELETE FROM ai_history WHERE id IN (%s,%s)"))
+
+    def test_dry_run_counts_without_deleting(self):
+        conn, cursor = make_conn(
+            [{"id": 1, "timestamp": 10}, {"id": 2, "timestamp": 20}],
+            [{"id": 3, "timestamp": 30}],
+        )
+
+        deleted = retention.delete_in_batches(conn, "history", "timestamp < %s", [100],
+                                              batch_size=2, dry_run=True)
+
+        self.assertEqual(deleted, 3)
+        self.assertFalse(any(s.startswith("DELETE") for s in statements(cursor)))
+        self.assertEqual(cursor.execute.call_args_list[1][0][1], (100, 20, 20, 2, 2))
+        conn.commit.assert_not_called()
+
+    def test_archive_is_written_before_delete(self):
+        row = dict(history_storage.encode("prompt", "answer"), id=7, username="alice",
+                   created_at=datetime(2024, 1, 1))
+        conn, cursor = make_conn([row])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = retention.Archive(tmp)
+            retention.delete_in_batches(conn, "ai_history", "created_at < %s", [datetime(2024, 2, 1)],
+                                        archive=archive, pause=0)
+            archive.close()
+
+            with gzip.open(archive.paths[0], "rt") as f:
+                archived = [json.loads(line) for line in f]
+
+        self.assertEqual(archived[0]["ai_response"], "answer")
+        self.assertEqual(archived[0]["created_at"], "2024-01-01T00:00:00")
+        self.assertNotIn("response_z", archived[0])
+
+    def test_cap_keeps_newest_rows_per_user(self):
+        conn, cursor = make_conn([("alice",)], [{"id": 4, "timestamp": 40}])
+        cursor.fetchone.return_value = (50, 5)
+
+        deleted = retention.prune_over_cap(conn, "history", 100, pause=0)
+
+        self.assertEqual(deleted, 1)
+        select = cursor.execute.call_args_list[2][0]
+        self.assertIn("username=%s AND (timestamp < %s OR (timestamp = %s AND id <= %s))", select[0])
+        self.assertEqual(select[1], ("alice", 50, 50, 5, 500))
+
+class TestPrune(unittest.TestCase):
+
+    def test_skipped_while_another_run_holds_the_lock(self):
+        conn, cursor = make_conn()
+        cursor.fetchone.return_value = (0,)
+
+        self.assertIsNone(retention.prune(conn, {"history": (30, 0)}, log=lambda msg: None))
+        self.assertFalse(any("DELETE" in s for s in statements(cursor)))
+
+    def test_monthly_partition_definitions(self):
+        months = list(retention.month_starts(datetime(2024, 11, 20), datetime(2025, 1, 5)))
+        sql = retention.partition_definitions(months)
+
+        self.assertEqual([m.month for m in months], [11, 12, 1])
+        self.assertIn("PARTITION p202412 VALUES LESS THAN (UNIX_TIMESTAMP('2025-01-01'))", sql)
+        self.assertTrue(sql.endswith("PARTITION pmax VALUES LESS THAN MAXVALUE"))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,49 @@
+import unittest
+import json
+from unittest.mock import MagicMock
+import search
+
+class TestSearchHelpers(unittest.TestCase):
+
+    def test_terms_drop_operators_and_duplicates(self):
+        self.assertEqual(search.search_terms('+Recursion -"trees" recursion*  (base)'),
+                         ["recursion", "trees", "base"])
+        self.assertEqual(search.search_terms("  ?! "), [])
+        self.assertEqual(len(search.search_terms(" ".join(f"w{i}" for i in range(20)))), search.MAX_TERMS)
+
+    def test_boolean_query_uses_prefixes(self):
+        self.assertEqual(search.boolean_query(["recurs", "tree"]), "recurs* tree*")
+
+    def test_snippet_centers_on_first_match(self):
+        text = "Intro words " * 30 + "Write a recursive function that walks a tree. " + "More text " * 30
+
+        result = search.snippet(text, ["recurs"], width=80)
+
+        self.assertIn("recursive function", result)
+        self.assertTrue(result.startswith("…") and result.endswith("…"))
+        self.assertLessEqual(len(result), 82)
+        self.assertEqual(search.snippet("Short text", ["x"]), "Short text")
+
+    def test_task_text_includes_tips(self):
+        task = {"description": "Practice recursion.", "tips": json.dumps(["Start with a base case"])}
+        self.assertEqual(search.task_text(task), "Practice recursion. Start with a base case")
+
+class TestBackfill(unittest.TestCase):
+
+    def test_rows_without_tasks_are_parsed(self):
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        cursor.fetchall.side_effect = [
+            [{"id": 4, "username": "alice", "response_z": None,
+              "ai_response": "### Task 1 – Recursion\n\n**Detailed Description**\nWalk a tree."}],
+            [],
+        ]
+
+        self.assertEqual(search.backfill(conn, log=lambda msg: None), 1)
+
+        rows = cursor.executemany.call_args[0][1]
+        self.assertEqual(rows[0][:4], (4, "alice", 0, "Recursion"))
+        conn.commit.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
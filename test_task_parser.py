@@ -0,0 +1,93 @@
+import unittest
+import random
+from task_parser import parse_tasks, extract_titles
+
+WELL_FORMED = """
+Here are your tasks.
+
+### Task 1 – Variables
+
+**Detailed Description**
+Learn how variables store values.
+Practice with a few examples.
+
+**Small Tips**
+- Use clear names
+- Print values often
+- Avoid globals
+
+---
+
+### Task 2 – Loops
+
+**Detailed Description**
+Write for and while loops.
+
+**Small Tips**
+- Start small
+- Watch for off-by-one errors
+- Use range()
+"""
+
+class TestTaskParser(unittest.TestCase):
+
+    def test_well_formed(self):
+        tasks = parse_tasks(WELL_FORMED)
+
+        self.assertEqual([t['title'] for t in tasks], ['Variables', 'Loops'])
+        self.assertEqual(tasks[0]['description'],
+                         "Learn how variables store values. Practice with a few examples.")
+        self.assertEqual(tasks[0]['tips'], ['Use clear names', 'Print values often', 'Avoid globals'])
+        self.assertEqual(len(tasks[1]['tips']), 3)
+
+    def test_bold_heading_variants(self):
+        text = "1. **Task 1 – Recursion** is next\n### **Task 2 - Sorting**\nTask 3: Graphs"
+        self.assertEqual(extract_titles(text), ['Recursion', 'Sorting', 'Graphs'])
+
+    def test_inline_labels(self):
+        text = "### Task 1 – Lists\nDescription: Use lists.\nTips:\n* one\n2) two"
+        task = parse_tasks(text)[0]
+        self.assertEqual(task['description'], 'Use lists.')
+        self.assertEqual(task['tips'], ['one', 'two'])
+
+    def test_prose_is_not_a_section_label(self):
+        task = parse_tasks("### Task 1 – Lists\nTips are everywhere in this task.")[0]
+        self.assertEqual(task['description'], 'Tips are everywhere in this task.')
+        self.assertEqual(task['tips'], [])
+
+    def test_no_tasks(self):
+        self.assertEqual(parse_tasks("Sorry, I can't help with that."), [])
+        self.assertEqual(parse_tasks(""), [])
+        self.assertEqual(parse_tasks(None), [])
+
+    def test_matches_old_regex_titles(self):
+        # titles the previous regex-based extract_titles found
+        text = "### Task 1 – Alpha\n**Task 2 – Beta**\n### Task 3 – Gamma"
+        self.assertEqual(extract_titles(text), ['Alpha', 'Beta', 'Gamma'])
+
+    def test_long_title_is_truncated(self):
+        self.assertEqual(len(extract_titles("### Task 1 – " + "x" * 400)[0]), 255)
+
+    def test_fuzz_malformed_output(self):
+        rng = random.Random(1234)
+        pieces = WELL_FORMED.splitlines() + [
+            "**", "###", "Task", "Task 9 –", "- ", "**Small Tips**", "**Detailed Description**:",
+            "—", "Task 1 – **", "\t", "* * *", "1.", "Tips:", "### Task x – y", "• bullet"
+        ]
+
+        for _ in range(500):
+            lines = [rng.choice(pieces) for _ in range(rng.randint(0, 40))]
+            if rng.random() < 0.3:
+                lines = [line[:rng.randint(0, len(line))] for line in lines]
+            text = "\n".join(lines)
+
+            tasks = parse_tasks(text)
+
+            for task in tasks:
+                self.assertTrue(task['title'])
+                self.assertLessEqual(len(task['title']), 255)
+                self.assertIsInstance(task['description'], str)
+                self.assertTrue(all(isinstance(tip, str) and tip for tip in task['tips']))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
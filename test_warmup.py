@@ -0,0 +1,48 @@
+import unittest
+import os, subprocess, sys
+from unittest.mock import MagicMock
+from warmup import Warmup
+
+class TestWarmup(unittest.TestCase):
+
+    def test_steps_run_once_in_the_background(self):
+        client, pool = MagicMock(), MagicMock()
+        warm = Warmup([("model_client", client), ("db_pool", pool)])
+
+        self.assertFalse(warm.state()["ready"])
+        self.assertTrue(warm.start())
+        self.assertTrue(warm.wait(5))
+        self.assertFalse(warm.start())
+
+        state = warm.state()
+        self.assertEqual(sorted(state["steps_ms"]), ["db_pool", "model_client"])
+        self.assertEqual(state["pending"], [])
+        self.assertEqual(client.call_count, 1)
+        self.assertEqual(pool.call_count, 1)
+
+    def test_failed_step_is_retried_by_next_start(self):
+        client = MagicMock()
+        pool = MagicMock(side_effect=[ConnectionError("db down"), None])
+        warm = Warmup([("model_client", client), ("db_pool", pool)])
+
+        warm.start()
+        self.assertFalse(warm.wait(5))
+        self.assertIn("db down", warm.state()["error"])
+        self.assertEqual(warm.state()["pending"], ["db_pool"])
+
+        warm.start()
+        self.assertTrue(warm.wait(5))
+        self.assertIsNone(warm.state()["error"])
+        self.assertEqual(client.call_count, 1)
+
+class TestColdStart(unittest.TestCase):
+
+    def test_import_leaves_heavy_modules_unloaded(self):
+        code = "import sys, app; print(','.join(m for m in ('openai', 'mysql.connector') if m in sys.modules))"
+        env = dict(os.environ, OPENROUTER_API_KEY="x", WARMUP="off")
+        result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,166 @@
+import unittest
+from unittest.mock import MagicMock
+import threading
+from write_behind import WriteBehindWriter, is_transient, _Pending
+
+class TransientError(Exception):
+    errno = 1213    # deadlock
+
+class TestWriteBehind(unittest.TestCase):
+
+    def make_writer(self, write_batch=None, **kwargs):
+        conn = MagicMock()
+        written = []
+
+        def default_write(cursor, items):
+            written.append(list(items))
+
+        writer = WriteBehindWriter(lambda: conn, write_batch or default_write,
+                                   retry_backoff=0, **kwargs)
+        return writer, conn, written
+
+    def test_concurrent_submits_share_one_commit(self):
+        writer, conn, written = self.make_writer(batch_size=10, flush_interval=0.2)
+
+        threads = [threading.Thread(target=writer.submit, args=(i,)) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+
+        self.assertEqual(sorted(sum(written, [])), [0, 1, 2, 3, 4])
+        self.assertLess(conn.commit.call_count, 5)
+        self.assertEqual(writer.stats()["written"], 5)
+
+    def test_enqueue_mode_returns_before_the_write(self):
+        gate = threading.Event()
+        writer, conn, _ = self.make_writer(write_batch=lambda cursor, items: gate.wait(5))
+
+        writer.submit("row", wait=False)
+
+        self.assertFalse(conn.commit.called)
+        gate.set()
+        writer.close()
+
+    def test_transient_errors_are_retried(self):
+        calls = []
+
+        def flaky(cursor, items):
+            calls.append(items)
+            if len(calls) == 1:
+                raise TransientError("Deadlock found")
+
+        writer, conn, _ = self.make_writer(write_batch=flaky)
+        writer.submit("row")
+
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(conn.rollback.called)
+        self.assertEqual(writer.stats()["retried"], 1)
+
+    def test_bad_row_fails_alone(self):
+        written = []
+
+        def write(cursor, items):
+            if "bad" in items:
+                raise ValueError("Data too long")
+            written.extend(items)
+
+        writer, _, _ = self.make_writer(write_batch=write, batch_size=10, flush_interval=60)
+        writer._queue.put_nowait(_Pending("good"))
+        bad = _Pending("bad")
+        writer._queue.put_nowait(bad)
+
+        writer.close()
+
+        self.assertEqual(written, ["good"])
+        self.assertIsInstance(bad.error, ValueError)
+        self.assertEqual(writer.stats()["failed"], 1)
+
+    def test_error_reaches_waiting_caller(self):
+        def broken(cursor, items):
+            raise ValueError("no such table")
+
+        writer, _, _ = self.make_writer(write_batch=broken)
+
+        with self.assertRaises(ValueError):
+            writer.submit("row")
+
+    def test_full_queue_writes_inline(self):
+        writer, conn, written = self.make_writer(max_queue=1)
+        writer._queue.put_nowait(_Pending("queued"))
+
+        writer.submit("overflow", wait=False)
+
+        self.assertEqual(written, [["overflow"]])
+        self.assertEqual(writer.stats()["overflow"], 1)
+
+    def test_close_flushes_queue(self):
+        writer, _, written = self.make_writer()
+        writer._queue.put_nowait(_Pending("a"))
+        writer._queue.put_nowait(_Pending("b"))
+
+        writer.close()
+
+        self.assertEqual(written, [["a", "b"]])
+
+    def test_flush_waits_for_batch_being_written(self):
+        writing, release = threading.Event(), threading.Event()
+        written = []
+
+        def slow(cursor, items):
+            writing.set()
+            release.wait(5)
+            written.extend(items)
+
+        writer, _, _ = self.make_writer(write_batch=slow)
+        writer.submit("row", wait=False)
+        self.assertTrue(writing.wait(5))
+
+        flusher = threading.Thread(target=writer.flush)
+        flusher.start()
+        flusher.join(0.1)
+        self.assertTrue(flusher.is_alive())
+
+        release.set()
+        flusher.join(5)
+        self.assertEqual(written, ["row"])
+
+    def test_flush_ignores_rows_queued_after_it(self):
+        first_held, release_first = threading.Event(), threading.Event()
+
+        def write(cursor, items):
+            if "first" in items:
+                first_held.set()
+                release_first.wait(5)
+            if "later" in items:
+                threading.Event().wait(5)     # steady load that never drains in time
+
+        writer, _, _ = self.make_writer(write_batch=write, flush_interval=0)
+        self.addCleanup(release_first.set)
+        writer.submit("first", wait=False)
+        self.assertTrue(first_held.wait(5))
+
+        flusher = threading.Thread(target=writer.flush, kwargs={"timeout": 5})
+        flusher.start()
+        flusher.join(0.05)
+        writer.submit("later", wait=False)
+        release_first.set()
+        flusher.join(2)
+
+        self.assertFalse(flusher.is_alive())
+
+    def test_flush_times_out(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        writer, _, _ = self.make_writer(write_batch=lambda cursor, items: release.wait(5))
+        writer.submit("row", wait=False)
+
+        with self.assertRaises(TimeoutError):
+            writer.flush(timeout=0.05)
+
+    def test_is_transient(self):
+        self.assertTrue(is_transient(TransientError()))
+        self.assertFalse(is_transient(ValueError()))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
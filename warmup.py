@@ -0,0 +1,65 @@
+import threading, time, traceback
+
+# ================= Warmup =================
+# The model client and the connection pool are built on first use, which
+# keeps imports fast but puts the cost on the first user's request.
+# Warmup runs those steps in a background thread instead, so a readiness
+# probe can hold traffic back until they are done. A failed step is
+# retried by the next start().
+
+class Warmup:
+
+    def __init__(self, steps):
+        self.steps = steps              # [(name, callable)]
+        self._lock = threading.Lock()
+        self._thread = None
+        self.done = {}                  # name -> milliseconds taken
+        self.error = None
+        self.runs = 0
+
+    def start(self):
+        """Start warming in the background unless it is running or finished."""
+        with self._lock:
+            if self.ready() or (self._thread is not None and self._thread.is_alive()):
+                return False
+            self.runs += 1
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+            return True
+
+    def run(self):
+        for name, step in self.steps:
+            if name in self.done:
+                continue
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                traceback.print_exc()
+                with self._lock:
+                    self.error = f"{name}: {e}"
+                return
+            with self._lock:
+                self.done[name] = round((time.perf_counter() - start) * 1000, 1)
+        with self._lock:
+            self.error = None
+
+    def ready(self):
+        return len(self.done) == len(self.steps)
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.ready()
+
+    def state(self):
+        with self._lock:
+            return {
+                "ready": self.ready(),
+                "warming": self._thread is not None and self._thread.is_alive(),
+                "steps_ms": dict(self.done),
+                "pending": [name for name, _ in self.steps if name not in self.done],
+                "error": self.error,
+                "runs": self.runs,
+            }
@@ -0,0 +1,255 @@
+import atexit, os, queue, threading, time, traceback
+
+# ================= Write-Behind Writer =================
+# Requests hand their rows to a bounded queue. One background thread per
+# process drains it and writes whole batches in a single transaction, so a
+# burst of N generations costs one commit instead of N.
+#
+# Durability is chosen per deployment:
+#   commit  - the request waits until the batch holding its rows commits
+#             (concurrent requests share that commit)
+#   enqueue - the request returns as soon as its rows are queued; rows
+#             still queued when the process dies are lost
+#
+# When the queue is full, callers write their own rows inline instead of
+# waiting or dropping them.
+#
+# flush() queues a marker and waits until the writer has committed the
+# batch before it, so it covers rows queued up to the call and is not held
+# up by rows that keep arriving afterwards.
+
+# lock wait timeout, deadlock, server gone away, lost connection, can't connect
+TRANSIENT_ERRNOS = {1205, 1213, 2006, 2013, 2003}
+
+def is_transient(error):
+    if getattr(error, "errno", None) in TRANSIENT_ERRNOS:
+        return True
+    return type(error).__name__ in ("OperationalError", "InterfaceError", "PoolTimeout")
+
+
+FLUSH = object()     # item of a flush() marker
+
+
+class _Pending:
+    __slots__ = ("item", "done", "error")
+
+    def __init__(self, item):
+        self.item = item
+        self.done = threading.Event()
+        self.error = None
+
+
+class WriteBehindWriter:
+
+    def __init__(self, get_connection, write_batch, batch_size=50, flush_interval=0.05,
+                 max_queue=1000, retries=3, retry_backoff=0.2, flush_timeout=10.0):
+        self.get_connection = get_connection
+        self.write_batch = write_batch      # write_batch(cursor, items), no commit
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.max_queue = max_queue
+        self.flush_timeout = flush_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+
+        self.enqueued = 0
+        self.overflow = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.retried = 0
+
+    # ----- request side -----
+
+    def submit(self, item, wait=True, timeout=None):
+        """Queue one item. With wait=True, block until it is committed and
+        re-raise its error if it could not be written."""
+        self.submit_many([item], wait, timeout)
+
+    def submit_many(self, items, wait=True, timeout=None):
+        """Queue several items at once so they can share a commit."""
+
+        pendings = [self._enqueue(item) for item in items]
+
+        for pending in pendings:
+            if wait or pending.done.is_set():
+                if not pending.done.wait(timeout):
+                    raise TimeoutError("Write was not committed in time")
+                if pending.error is not None:
+                    raise pending.error
+
+    def _enqueue(self, item):
+        pending = _Pending(item)
+        if self._stopping:
+            self._write([pending])
+            return pending
+        try:
+            self._queue.put_nowait(pending)
+            with self._lock:
+                self.enqueued += 1
+            self._start()
+        except queue.Full:
+            with self._lock:
+                self.overflow += 1
+            self._write([pending])
+        return pending
+
+    # ----- background side -----
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        rows = [pending for pending in batch if pending.item is not FLUSH]
+        if rows:
+            self._write(rows)
+        for pending in batch:
+            # markers are released once everything queued before them is written
+            pending.done.set()
+        self._done(batch)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+        # group commit: wait briefly for more rows, up to batch_size; a flush
+        # marker ends the batch so rows queued after it do not delay it
+        flush_at = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1].item is not FLUSH:
+            remaining = flush_at - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            self._commit(batch)
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+        except Exception as e:
+            if len(batch) > 1 and not is_transient(e):
+                # one bad row must not take the rest of the batch with it
+                for pending in batch:
+                    self._write([pending])
+                return
+            traceback.print_exc()
+            with self._lock:
+                self.failed += len(batch)
+            for pending in batch:
+                pending.error = e
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def _commit(self, batch):
+        attempt = 0
+        while True:
+            conn = None
+            cursor = None
+            try:
+                conn = self.get_connection()
+                cursor = conn.cursor(dictionary=True)
+                self.write_batch(cursor, [pending.item for pending in batch])
+                conn.commit()
+                return
+            except Exception as e:
+                if conn is not None:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                attempt += 1
+                if attempt > self.retries or not is_transient(e):
+                    raise
+                with self._lock:
+                    self.retried += 1
+                time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+            finally:
+                if cursor is not None:
+                    cursor.close()
+                if conn is not None:
+                    conn.close()
+
+    # ----- lifecycle -----
+
+    def flush(self, timeout=None):
+        """Wait until every row queued before the call, including a batch
+        already being written, is committed. Raises TimeoutError."""
+        timeout = self.flush_timeout if timeout is None else timeout
+        if self._thread is None:
+            return
+        marker = _Pending(FLUSH)
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            raise TimeoutError("Queued writes were not flushed in time")
+        if not marker.done.wait(timeout):
+            raise TimeoutError("Queued writes were not flushed in time")
+
+    def _done(self, batch):
+        for _ in batch:
+            self._queue.task_done()
+
+    def close(self):
+        """Stop queueing, write what is left and wait for an in-flight batch."""
+        self._stopping = True
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._write_batch(batch)
+        # task_done() follows the commit, so join() also waits for the
+        # batch the background thread may be writing
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "enqueued": self.enqueued,
+                "overflow": self.overflow,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "retried": self.retried,
+            }
+
+
+def writer_from_env(get_connection, write_batch):
+    writer = WriteBehindWriter(
+        get_connection,
+        write_batch,
+        batch_size=int(os.getenv("WRITE_BEHIND_BATCH", 50)),
+        flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_MS", 50)) / 1000,
+        max_queue=int(os.getenv("WRITE_BEHIND_MAX_QUEUE", 1000)),
+        retries=int(os.getenv("WRITE_BEHIND_RETRIES", 3)),
+        flush_timeout=float(os.getenv("WRITE_BEHIND_FLUSH_TIMEOUT", 10))
+    )
+    atexit.register(writer.close)
+    return writer